@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Blob Checksum Check
+Converts a small dump with binary data (_binary strings with every escape
+mysqldump writes, hex literals, NULLs and a blob large enough for the
+streaming conversion) and a text table with the same escapes with
+--copy-dir, then runs verify_postgresql.py's verify_copy_dir against a stub
+pool that answers its queries the way PostgreSQL would for the loaded COPY
+data. Every table must verify, the loaded bytes must be the original blobs
+and the loaded text the original strings (without NULs, which PostgreSQL
+text cannot hold). Needs no database.
+
+    python scripts/check_blob_checksums.py
+    python scripts/check_blob_checksums.py --large-mb 4 --jobs 4
+"""
+
+import os
+import re
+import sys
+import json
+import random
+import hashlib
+import argparse
+import tempfile
+import subprocess
+from contextlib import asynccontextmanager
+
+COLUMN_TYPES = {
+    'm_image': {'id': 'integer', 'data': 'bytea'},
+    'm_document': {'id': 'integer', 'data': 'bytea'},
+    'm_note': {'id': 'integer', 'data': 'text'},
+}
+
+# COPY text escapes, as PostgreSQL reads them and as verify_postgresql writes them back
+COPY_UNESCAPES = {'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t', 'v': '\v'}
+COPY_ESCAPES = {'\\': '\\\\', '\n': '\\n', '\r': '\\r', '\t': '\\t', '\b': '\\b'}
+
+def mysql_literal(value, introducer=b''):
+    """
+    '...' literal of value (bytes), escaped like mysqldump does
+    """
+    escapes = {0: b'\\0', 0x27: b"\\'", 0x22: b'\\"', 0x5c: b'\\\\', 0x0a: b'\\n', 0x0d: b'\\r', 0x1a: b'\\Z'}
+    return introducer + b"'" + b''.join(escapes.get(byte, bytes([byte])) for byte in value) + b"'"
+
+def sample_rows(large_bytes):
+    """
+    {table: [(id, value or None, as hex literal)]}: m_document holds one blob
+    past the converter's streaming threshold, m_image only small ones, and
+    m_note strings
+    """
+    generator = random.Random(42)
+    every_escape = b"a\x00b'c\"d\\e\nf\rg\x1ah\tI\xff\x80"
+    return {
+        'm_image': [
+            (1, every_escape, False),
+            (2, b'', False),
+            (3, None, False),
+            (4, bytes(range(256)), True),
+            (5, bytes(range(256)), False),
+        ],
+        'm_document': [
+            (1, generator.randbytes(large_bytes), False),
+            (2, every_escape * 3, False),
+            (3, every_escape, True),
+        ],
+        'm_note': [
+            (1, 'John\x00Doe', False),
+            (2, every_escape.decode('latin-1'), False),
+            (3, 'tab\there, back\\slash, \\0 and \\N as text', False),
+            (4, None, False),
+        ],
+    }
+
+def sample_dump(tables):
+    parts = []
+    for table, rows in tables.items():
+        data_type = 'longtext' if COLUMN_TYPES[table]['data'] == 'text' else 'longblob'
+        parts.append(f"CREATE TABLE `{table}` (\n  `id` int NOT NULL,\n  `data` {data_type},\n  PRIMARY KEY (`id`)\n);\n".encode())
+        values = []
+        for row_id, value, hex_literal in rows:
+            if value is None:
+                literal = b'NULL'
+            elif isinstance(value, str):
+                literal = mysql_literal(value.encode())
+            elif hex_literal:
+                literal = b'0x' + value.hex().upper().encode()
+            else:
+                literal = mysql_literal(value, b'_binary ')
+            values.append(b'(%d,' % row_id + literal + b')')
+        parts.append(f"INSERT INTO `{table}` VALUES ".encode() + b','.join(values) + b';\n')
+    return b''.join(parts)
+
+def copy_unescape(field):
+    return re.sub(r'\\(.)', lambda m: COPY_UNESCAPES.get(m.group(1), m.group(1)), field)
+
+def copy_escape(value):
+    return re.sub(r'[\\\n\r\t\b]', lambda m: COPY_ESCAPES[m.group(0)], value)
+
+def load_rows(copy_dir, table, entry):
+    """
+    Rows of a table as PostgreSQL stores them after COPY: (id, bytes, str or None)
+    """
+    rows = []
+    for chunk in entry['chunks']:
+        with open(os.path.join(copy_dir, chunk['file']), 'r', encoding='utf-8', errors='surrogateescape') as f:
+            for line in f:
+                row_id, data = line.rstrip('\n').split('\t')
+                data = None if data == '\\N' else copy_unescape(data)
+                if data is not None and COLUMN_TYPES[table]['data'] == 'bytea':
+                    if not data.startswith('\\x'):
+                        raise ValueError(f'bytea field not in hex format: {data[:20]!r}')
+                    data = bytes.fromhex(data[2:])
+                rows.append((int(row_id), data))
+    return rows
+
+class StubConnection:
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def fetch(self, sql):
+        if 'information_schema.columns' in sql:
+            table = re.search(r"table_name = '(\w+)'", sql).group(1)
+            return list(COLUMN_TYPES[table].items()) if table in self.pool.rows else []
+        table = re.search(r'FROM (?:\w+\.)?(\w+)$', sql).group(1)
+        rows = self.pool.rows[table]
+        if 'md5(' not in sql:
+            return [(len(rows), None)]
+        # The checksum_query expression: bytea as \\x plus upper-case hex, text COPY-escaped
+        total = None
+        for row_id, data in rows:
+            if data is None:
+                field = '\\N'
+            elif isinstance(data, str):
+                field = copy_escape(data)
+            else:
+                field = '\\\\x' + data.hex().upper()
+            text = f'{row_id}\t' + field
+            value = int.from_bytes(hashlib.md5(text.encode()).digest()[:8], 'big', signed=True)
+            total = value if total is None else total + value
+        return [(len(rows), total)]
+
+class StubPool:
+    """
+    Pool for verify_copy_dir holding the loaded rows of every table
+    """
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield StubConnection(self)
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that converted binary data verifies against its checksums')
+    parser.add_argument('--large-mb', type=float, default=1.5, help='Size of the streamed blob in MB (default: 1.5)')
+    parser.add_argument('--jobs', type=int, default=1, help='Worker processes for the conversion (default: 1)')
+
+    args = parser.parse_args()
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, script_dir)
+    import asyncio
+    from verify_postgresql import verify_copy_dir
+
+    tables = sample_rows(int(args.large_mb * 1024 * 1024))
+    failures = []
+    with tempfile.TemporaryDirectory(prefix='blob-checksums-') as work_dir:
+        dump_file = os.path.join(work_dir, 'dump.sql')
+        with open(dump_file, 'wb') as f:
+            f.write(sample_dump(tables))
+        copy_dir = os.path.join(work_dir, 'copy')
+        subprocess.run([sys.executable, os.path.join(script_dir, 'convert_mysql_to_postgresql.py'), dump_file,
+                        '-o', os.path.join(work_dir, 'schema.sql'), '--copy-dir', copy_dir,
+                        '--jobs', str(args.jobs), '--no-progress'], stdout=subprocess.DEVNULL, check=True)
+        with open(os.path.join(copy_dir, 'manifest.json'), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+
+        loaded = {table: load_rows(copy_dir, table, entry) for table, entry in manifest['tables'].items()}
+        for table, rows in tables.items():
+            # PostgreSQL text cannot hold NUL: the converter drops it
+            expected = [(row_id, value.replace('\x00', '') if isinstance(value, str) else value)
+                        for row_id, value, _ in rows]
+            if sorted(loaded.get(table, []), key=lambda row: row[0]) != expected:
+                failures.append(f'{table}: loaded data differs from the dump')
+        results = asyncio.run(verify_copy_dir(copy_dir, StubPool(loaded), log=lambda message: None))
+
+    for table, result in sorted(results.items()):
+        print(f"  {table:<34} {result['status']:<16} {result['actual_checksum']} "
+              f"(manifest {result['expected_checksum']})")
+        if result['status'] != 'ok':
+            failures.append(f"{table}: {result['status']}")
+
+    if failures:
+        print()
+        for failure in failures:
+            print(f"  {failure}")
+        print(f"\n[FAILED] {len(failures)} problem(s) with binary or text data")
+        sys.exit(1)
+    print(f"\n[OK] Binary and text data load unchanged and verify")
+
+if __name__ == '__main__':
+    main()
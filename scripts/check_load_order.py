@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Load Order Check
+Converts a small dump with foreign keys (child tables larger than their
+parents, so largest-first alone would COPY them first) with --copy-dir and
+loads it with load_postgresql.load_copy_dir through a stub pool that fails
+a COPY like PostgreSQL would when a referenced table is not loaded yet.
+Also checks that --max-tables holds, that a failed parent keeps its
+children from loading, and that a table whose rows reference rows in its
+other chunks loads. Needs no database.
+
+    python scripts/check_load_order.py
+    python scripts/check_load_order.py --max-tables 1 2 8
+"""
+
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+from contextlib import asynccontextmanager
+
+REFERENCES = {'m_client': ['m_office'], 'm_loan': ['m_client', 'm_office'], 'm_note': []}
+
+# Self-referencing tables of self_reference_dump: (id column, referencing column)
+SELF_REFERENCES = {'m_group': (0, 1)}
+
+def sample_dump(rows):
+    """
+    MySQL dump: m_office <- m_client <- m_loan, m_loan also references
+    m_office and itself, m_note stands alone. Each child has more rows than
+    its parent.
+    """
+    return (
+        "CREATE TABLE `m_office` (\n  `id` bigint NOT NULL,\n  `name` varchar(50),\n  PRIMARY KEY (`id`)\n);\n"
+        "CREATE TABLE `m_client` (\n  `id` bigint NOT NULL,\n  `office_id` bigint NOT NULL,\n  PRIMARY KEY (`id`),\n"
+        "  CONSTRAINT `fk_client_office` FOREIGN KEY (`office_id`) REFERENCES `m_office` (`id`)\n);\n"
+        "CREATE TABLE `m_loan` (\n  `id` bigint NOT NULL,\n  `client_id` bigint NOT NULL,\n"
+        "  `office_id` bigint NOT NULL,\n  `topup_of` bigint DEFAULT NULL,\n  PRIMARY KEY (`id`),\n"
+        "  CONSTRAINT `fk_loan_client` FOREIGN KEY (`client_id`) REFERENCES `m_client` (`id`),\n"
+        "  CONSTRAINT `fk_loan_office` FOREIGN KEY (`office_id`) REFERENCES `m_office` (`id`),\n"
+        "  CONSTRAINT `fk_loan_topup` FOREIGN KEY (`topup_of`) REFERENCES `m_loan` (`id`)\n);\n"
+        "CREATE TABLE `m_note` (\n  `id` bigint NOT NULL,\n  `note` varchar(50),\n  PRIMARY KEY (`id`)\n);\n"
+        "INSERT INTO `m_office` VALUES (1,'Head Office');\n"
+        "INSERT INTO `m_client` VALUES " + ','.join(f"({i},1)" for i in range(rows)) + ";\n"
+        "INSERT INTO `m_loan` VALUES " + ','.join(f"({i},{i % rows},1,NULL)" for i in range(rows * 3)) + ";\n"
+        "INSERT INTO `m_note` VALUES " + ','.join(f"({i},'note')" for i in range(rows * 2)) + ";\n"
+    )
+
+def self_reference_dump(statements, rows_per_statement=1000):
+    """
+    MySQL dump of m_group, whose parent_id references m_group itself, in
+    enough INSERTs for several 1 MB chunks: the rows of the first INSERT
+    reference rows of the last one, the rows of the rest of the first half
+    rows of the first INSERT
+    """
+    padding = 'x' * 100
+    inserts = []
+    for number in range(statements):
+        ids = range(number * rows_per_statement, (number + 1) * rows_per_statement)
+        if number == 0:
+            parents = [i + (statements - 1) * rows_per_statement for i in ids]
+        elif number < statements // 2:
+            parents = [i % rows_per_statement for i in ids]
+        else:
+            parents = ['NULL'] * rows_per_statement
+        inserts.append("INSERT INTO `m_group` VALUES "
+                       + ','.join(f"({i},{parent},'{padding}')" for i, parent in zip(ids, parents)) + ";\n")
+    return (
+        "CREATE TABLE `m_group` (\n  `id` bigint NOT NULL,\n  `parent_id` bigint DEFAULT NULL,\n"
+        "  `name` varchar(200),\n  PRIMARY KEY (`id`),\n"
+        "  CONSTRAINT `fk_group_parent` FOREIGN KEY (`parent_id`) REFERENCES `m_group` (`id`)\n);\n"
+        + ''.join(inserts)
+    )
+
+class StubConnection:
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def execute(self, sql):
+        pass
+
+    async def copy_file(self, schema, table, columns, path):
+        import asyncio
+        pool = self.pool
+        if table in pool.failing:
+            raise RuntimeError(f'stub failure for {table}')
+        missing = [parent for parent in pool.references.get(table, []) if parent not in pool.loaded]
+        if missing:
+            pool.violations.append(f'{table} copied before {", ".join(missing)}')
+            raise RuntimeError(f'insert or update on table "{table}" violates foreign key constraint')
+        pool.copying.setdefault(table, 0)
+        pool.copying[table] += 1
+        pool.max_in_flight = max(pool.max_in_flight, len(pool.copying))
+        pool.max_chunks_in_flight[table] = max(pool.max_chunks_in_flight.get(table, 0), pool.copying[table])
+        await asyncio.sleep(0.01)
+        if table in SELF_REFERENCES:
+            # Checked at the end of the COPY, against the committed rows and its own
+            id_column, reference_column = SELF_REFERENCES[table]
+            with open(path, 'r', encoding='utf-8') as f:
+                rows = [line.rstrip('\n').split('\t') for line in f]
+            ids = pool.ids.setdefault(table, set()) | {row[id_column] for row in rows}
+            if any(row[reference_column] not in ids for row in rows if row[reference_column] != '\\N'):
+                pool.copying[table] -= 1
+                if not pool.copying[table]:
+                    del pool.copying[table]
+                raise RuntimeError(f'insert or update on table "{table}" violates foreign key constraint')
+            pool.ids[table] = ids
+        pool.copying[table] -= 1
+        if not pool.copying[table]:
+            del pool.copying[table]
+        pool.chunks_left[table] -= 1
+        if not pool.chunks_left[table]:
+            pool.loaded.add(table)
+
+class StubPool:
+    """
+    Pool for load_copy_dir that keeps track of the tables in flight and
+    rejects a COPY whose referenced tables are not completely loaded
+    """
+
+    def __init__(self, manifest, failing=()):
+        self.references = {name: entry.get('references', []) for name, entry in manifest['tables'].items()}
+        self.chunks_left = {name: len(entry['chunks']) for name, entry in manifest['tables'].items()}
+        self.failing = set(failing)
+        self.loaded = set()
+        self.copying = {}
+        self.max_in_flight = 0
+        self.max_chunks_in_flight = {}
+        self.ids = {}
+        self.violations = []
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield StubConnection(self)
+
+def run_load(copy_dir, manifest, max_tables, failing=()):
+    import asyncio
+    from load_postgresql import load_copy_dir
+    pool = StubPool(manifest, failing)
+    timings = asyncio.run(load_copy_dir(copy_dir, pool, max_tables=max_tables, retries=0, log=lambda message: None))
+    return pool, timings
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that load_postgresql.py loads referenced tables first')
+    parser.add_argument('--max-tables', type=int, nargs='+', default=[1, 2, 4],
+                        help='Table limits to check (default: 1 2 4)')
+    parser.add_argument('--rows', type=int, default=1000, help='Rows in m_client (default: 1000)')
+
+    args = parser.parse_args()
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, script_dir)
+    converter = os.path.join(script_dir, 'convert_mysql_to_postgresql.py')
+    failures = []
+    with tempfile.TemporaryDirectory(prefix='load-order-') as work_dir:
+        dump_file = os.path.join(work_dir, 'dump.sql')
+        with open(dump_file, 'w', encoding='utf-8') as f:
+            f.write(sample_dump(args.rows))
+        copy_dir = os.path.join(work_dir, 'copy')
+        subprocess.run([sys.executable, converter, dump_file, '-o', os.path.join(work_dir, 'schema.sql'),
+                        '--copy-dir', copy_dir, '--no-progress'], stdout=subprocess.DEVNULL, check=True)
+        with open(os.path.join(copy_dir, 'manifest.json'), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+
+        recorded = {name: entry.get('references', []) for name, entry in manifest['tables'].items()}
+        recorded.pop('m_office', None)
+        if recorded != REFERENCES:
+            failures.append(f'manifest references {recorded}, expected {REFERENCES}')
+        print(f"  {'manifest references':<34} {'OK' if recorded == REFERENCES else 'WRONG'}")
+
+        for max_tables in args.max_tables:
+            pool, timings = run_load(copy_dir, manifest, max_tables)
+            problems = list(pool.violations)
+            problems += [f'{table} {timing["status"]}' for table, timing in timings.items() if timing['status'] != 'loaded']
+            if pool.max_in_flight > max_tables:
+                problems.append(f'{pool.max_in_flight} tables in flight')
+            failures += [f'--max-tables {max_tables}: {problem}' for problem in problems]
+            print(f"  {f'--max-tables {max_tables}':<34} {'OK' if not problems else 'FAILED'}"
+                  f"  ({pool.max_in_flight} in flight at most)")
+
+        pool, timings = run_load(copy_dir, manifest, 4, failing=['m_client'])
+        statuses = {table: timing['status'] for table, timing in timings.items()}
+        expected = {'m_office': 'loaded', 'm_client': 'failed', 'm_loan': 'failed', 'm_note': 'loaded'}
+        skipped = 'm_client' in (timings['m_loan']['error'] or '')
+        ok = statuses == expected and skipped and not pool.violations
+        if not ok:
+            failures.append(f'failed parent: {statuses}, m_loan error {timings["m_loan"]["error"]!r}')
+        print(f"  {'failed parent skips its children':<34} {'OK' if ok else 'FAILED'}")
+
+        dump_file = os.path.join(work_dir, 'groups.sql')
+        with open(dump_file, 'w', encoding='utf-8') as f:
+            f.write(self_reference_dump(30))
+        copy_dir = os.path.join(work_dir, 'groups')
+        subprocess.run([sys.executable, converter, dump_file, '-o', os.path.join(work_dir, 'groups_schema.sql'),
+                        '--copy-dir', copy_dir, '--chunk-size', '1', '--no-progress'],
+                       stdout=subprocess.DEVNULL, check=True)
+        with open(os.path.join(copy_dir, 'manifest.json'), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        entry = manifest['tables']['m_group']
+        pool, timings = run_load(copy_dir, manifest, 4)
+        ok = (entry.get('self_reference') and len(entry['chunks']) > 2 and timings['m_group']['status'] == 'loaded'
+              and pool.max_chunks_in_flight['m_group'] == 1)
+        if not ok:
+            failures.append(f"self-reference: {len(entry['chunks'])} chunks, {timings['m_group']['status']}, "
+                            f"{pool.max_chunks_in_flight.get('m_group')} in flight, "
+                            f"self_reference {entry.get('self_reference')}")
+        print(f"  {'self-reference across chunks':<34} {'OK' if ok else 'FAILED'}"
+              f"  ({len(entry['chunks'])} chunks)")
+
+    if failures:
+        print()
+        for failure in failures:
+            print(f"  {failure}")
+        print(f"\n[FAILED] {len(failures)} problem(s) with the load order")
+        sys.exit(1)
+    print(f"\n[OK] Referenced tables load first")
+
+if __name__ == '__main__':
+    main()
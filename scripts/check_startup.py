@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Startup Time Check
+Runs every migration script with --help in a fresh interpreter and fails if
+the median of several cold starts is over budget (default 50 ms). The
+scripts take turns, so a busy spell on the machine slows each of them a
+little instead of one of them a lot. The budget is for a machine where
+`python -c pass` starts in --reference-ms; when the interpreter itself
+starts slower (a slow or busy machine), the times are scaled down by as
+much before they are compared. The scripts run from shell loops and cron, so optional backends (compression, database
+drivers, re2, multiprocessing, asyncio) must be imported only when the flag
+that needs them is used, and regexes compiled on first use. A script's own
+source is compiled on every run (only imported modules are cached), so
+large features belong in a module the script imports when they are used.
+
+    python scripts/check_startup.py
+    python scripts/check_startup.py -v        # slowest imports per script
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+import compileall
+import subprocess
+
+SCRIPTS = (
+    'convert_mysql_to_postgresql.py',
+    'convert_tenants.py',
+    'extract_schema.py',
+    'diff_schema.py',
+    'dump_index.py',
+    'fix_postgres_schema.py',
+    'fix_foreign_keys_order.py',
+    'load_postgresql.py',
+    'sql_splitter.py',
+    'regex_backend.py',
+    'validate_schema.py',
+    'verify_postgresql.py',
+)
+
+def time_commands(commands, runs):
+    """
+    Median wall time of each command over runs rounds, in seconds; every
+    round runs each command once
+    """
+    times = [[] for _ in commands]
+    for _ in range(runs):
+        for command, elapsed in zip(commands, times):
+            started = time.perf_counter()
+            subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+            elapsed.append(time.perf_counter() - started)
+    return [statistics.median(elapsed) for elapsed in times]
+
+def slowest_imports(script, limit):
+    """
+    Top-level imports of a script by cumulative time, from python -X importtime
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', script, '--help'],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+    )
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line.split('|')
+        if not cumulative.strip().isdigit() or name.startswith('  '):
+            continue  # header line, or a nested import already counted in its parent
+        imports.append((int(cumulative), name.strip()))
+    imports.sort(reverse=True)
+    return imports[:limit]
+
+def main():
+    parser = argparse.ArgumentParser(description='Check cold-start time of the migration scripts (--help)')
+    parser.add_argument('--budget-ms', type=float, default=50.0, help='Maximum startup time per script (default: 50)')
+    parser.add_argument('--runs', type=int, default=9, help='Runs per script; the median is reported (default: 9)')
+    parser.add_argument('--reference-ms', type=float, default=12.0,
+                        help='Interpreter start the budget is meant for; slower starts scale the times down (default: 12)')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Show the slowest imports of each script')
+
+    args = parser.parse_args()
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    # Measure with cached bytecode, as in a deployed checkout, even when
+    # PYTHONDONTWRITEBYTECODE stops imports from writing it
+    compileall.compile_dir(script_dir, maxlevels=0, quiet=1)
+    paths = [os.path.join(script_dir, script) for script in SCRIPTS]
+    baseline, *timings = time_commands(
+        [[sys.executable, '-c', 'pass']] + [[sys.executable, path, '--help'] for path in paths], max(1, args.runs)
+    )
+    # Never scaled up: on a fast machine the budget holds as it is
+    scale = min(1.0, args.reference_ms / (baseline * 1000))
+    scaled_note = f'; times below scaled by {scale:.2f}' if scale < 1 else ''
+    print(f"  {'python -c pass':<34} {baseline * 1000:>6.1f} ms (interpreter baseline{scaled_note})")
+
+    over_budget = []
+    for script, path, elapsed in zip(SCRIPTS, paths, timings):
+        elapsed_ms = elapsed * 1000 * scale
+        status = 'OK' if elapsed_ms <= args.budget_ms else 'SLOW'
+        print(f"  {script:<34} {elapsed_ms:>6.1f} ms  {status}")
+        if status != 'OK':
+            over_budget.append(script)
+        if args.verbose or status != 'OK':
+            for cumulative, name in slowest_imports(path, 5):
+                print(f"      {name:<30} {cumulative / 1000:>6.1f} ms")
+
+    if over_budget:
+        print(f"\n[FAILED] {len(over_budget)} script(s) over the {args.budget_ms:.0f} ms budget")
+        sys.exit(1)
+    print(f"\n[OK] All scripts start within {args.budget_ms:.0f} ms")
+
+if __name__ == '__main__':
+    main()
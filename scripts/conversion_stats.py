@@ -0,0 +1,180 @@
+"""
+Conversion Statistics
+Collects per-table counts, timings and rule hits for the migration scripts
+and prints them as a table or writes them as JSON (--stats-json)
+"""
+
+import sys
+import time
+from collections import Counter
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+TABLE_FIELDS = ('statements', 'rows', 'bytes_in', 'bytes_out', 'seconds')
+
+def peak_rss_bytes():
+    """
+    Peak resident set size of this process and its (finished) workers
+    """
+    if resource is None:
+        return None
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    )
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def new_table_stats():
+    return dict.fromkeys(TABLE_FIELDS, 0)
+
+class ConversionStats:
+    """
+    Run report for one conversion: per-table statement, row and byte counts,
+    time spent per table, how many times each rewrite rule fired, the row
+    padding saved by column reordering and the indexes added for foreign keys
+    """
+
+    def __init__(self, input_file=None):
+        self.input_file = input_file
+        self.tables = {}
+        self.rules = Counter()
+        self.layouts = {}
+        self.foreign_key_indexes = []
+        self.input_bytes = 0
+        self.output_bytes = 0
+        self.started = time.perf_counter()
+        self.elapsed = None
+
+    def add_table(self, table, statements=0, rows=0, bytes_in=0, bytes_out=0, seconds=0.0):
+        entry = self.tables.setdefault(table, new_table_stats())
+        entry['statements'] += statements
+        entry['rows'] += rows
+        entry['bytes_in'] += bytes_in
+        entry['bytes_out'] += bytes_out
+        entry['seconds'] += seconds
+
+    def count_rule(self, rule, count=1):
+        self.rules[rule] += count
+
+    def add_layout(self, table, padding_before, padding_after):
+        """
+        Estimated padding bytes per row before and after reordering a table's columns
+        """
+        self.layouts[table] = {
+            'padding_before': round(padding_before, 1),
+            'padding_after': round(padding_after, 1),
+            'bytes_saved_per_row': round(padding_before - padding_after, 1),
+        }
+
+    def add_foreign_key_index(self, table, index, columns, references, constraint=None):
+        """
+        An index created because no existing index covered a foreign key's columns
+        """
+        self.foreign_key_indexes.append({
+            'table': table,
+            'index': index,
+            'columns': list(columns),
+            'references': references,
+            'constraint': constraint or None,
+        })
+
+    def merge(self, tables=None, rules=None):
+        """
+        Merge plain-dict results returned by a worker process
+        """
+        for table, entry in (tables or {}).items():
+            self.add_table(table, **entry)
+        self.rules.update(rules or {})
+
+    def finish(self, input_bytes=None, output_bytes=None):
+        if input_bytes is not None:
+            self.input_bytes = input_bytes
+        if output_bytes is not None:
+            self.output_bytes = output_bytes
+        self.elapsed = time.perf_counter() - self.started
+
+    def as_dict(self):
+        elapsed = self.elapsed if self.elapsed is not None else time.perf_counter() - self.started
+        tables = {}
+        for table, entry in sorted(self.tables.items()):
+            tables[table] = dict(entry, seconds=round(entry['seconds'], 3),
+                                 mb_per_sec=_mb_per_sec(entry['bytes_in'], entry['seconds']))
+        return {
+            'input_file': self.input_file,
+            'input_bytes': self.input_bytes,
+            'output_bytes': self.output_bytes,
+            'elapsed_seconds': round(elapsed, 3),
+            'mb_per_sec': _mb_per_sec(self.input_bytes, elapsed),
+            'peak_rss_bytes': peak_rss_bytes(),
+            'tables': tables,
+            'rules': dict(self.rules.most_common()),
+            'layouts': dict(sorted(self.layouts.items())),
+            'foreign_key_indexes': list(self.foreign_key_indexes),
+        }
+
+    def format_report(self, limit=None):
+        """
+        Render the report as a plain-text table, largest tables first
+        """
+        report = self.as_dict()
+        lines = [
+            f"  {'Table':<40} {'Stmts':>8} {'Rows':>12} {'Bytes in':>14} {'Seconds':>9} {'MB/s':>8}",
+            '  ' + '-' * 96,
+        ]
+        tables = sorted(report['tables'].items(), key=lambda item: item[1]['bytes_in'], reverse=True)
+        for table, entry in tables[:limit]:
+            lines.append(
+                f"  {table:<40} {entry['statements']:>8,} {entry['rows']:>12,} {entry['bytes_in']:>14,} "
+                f"{entry['seconds']:>9.2f} {entry['mb_per_sec']:>8.1f}"
+            )
+        if limit and len(tables) > limit:
+            lines.append(f"  ... {len(tables) - limit} more tables")
+
+        lines.append('')
+        lines.append(f"  Total: {report['input_bytes']:,} bytes in {report['elapsed_seconds']:.2f}s "
+                     f"({report['mb_per_sec']:.1f} MB/s)")
+        if report['peak_rss_bytes'] is not None:
+            lines.append(f"  Peak RSS: {report['peak_rss_bytes'] / (1024 * 1024):.1f} MB")
+
+        if report['layouts']:
+            layouts = sorted(report['layouts'].items(), key=lambda item: item[1]['bytes_saved_per_row'], reverse=True)
+            saved_total = sum(entry['bytes_saved_per_row'] * report['tables'].get(table, {}).get('rows', 0)
+                              for table, entry in layouts)
+            lines.append('')
+            lines.append(f"  Column layout: {len(layouts)} tables reordered (estimated padding saved per row):")
+            for table, entry in layouts[:limit]:
+                rows = report['tables'].get(table, {}).get('rows', 0)
+                data_saved = f" ({entry['bytes_saved_per_row'] * rows / (1024 * 1024):,.1f} MB over {rows:,} rows)" if rows else ''
+                lines.append(f"    {table:<38} {entry['bytes_saved_per_row']:>6.1f} bytes{data_saved}")
+            if saved_total:
+                lines.append(f"    Total: about {saved_total / (1024 * 1024):,.1f} MB less table data")
+
+        if report['foreign_key_indexes']:
+            lines.append('')
+            lines.append(f"  Foreign key indexes added: {len(report['foreign_key_indexes'])}")
+            for entry in report['foreign_key_indexes'][:limit]:
+                key = f"{entry['table']}({', '.join(entry['columns'])}) -> {entry['references']}"
+                lines.append(f"    {key:<54} {entry['index']}")
+            if limit and len(report['foreign_key_indexes']) > limit:
+                lines.append(f"    ... {len(report['foreign_key_indexes']) - limit} more")
+
+        if report['rules']:
+            lines.append('')
+            lines.append('  Rules fired:')
+            for rule, count in report['rules'].items():
+                lines.append(f"    {rule:<38} {count:>10,}")
+        return '\n'.join(lines)
+
+    def write_json(self, path):
+        import json
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.as_dict(), f, indent=2)
+
+def _mb_per_sec(byte_count, seconds):
+    if not seconds:
+        return 0.0
+    return round(byte_count / (1024 * 1024) / seconds, 2)
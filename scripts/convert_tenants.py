@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Multi-Tenant Batch Converter
+Converts the dumps of several Mifos tenants that share (nearly) the same
+schema in one run. The data of every tenant goes through a single worker
+pool into COPY chunks. Each tenant's DDL is normalized (host comments and
+AUTO_INCREMENT counters dropped) and hashed, each distinct schema is
+converted once, and the result is bound to every tenant's PostgreSQL
+schema. Each tenant gets its own directory with schema.sql and the
+manifest and chunks for load_postgresql.py.
+
+    python scripts/convert_tenants.py kulman=dumps/kulman.sql mifos=dumps/main.sql -o tenants -j 8
+"""
+
+import re
+import os
+import sys
+import time
+import argparse
+
+from conversion_stats import ConversionStats
+from mysql_to_postgresql import (
+    DEFAULT_CHUNK_SIZE, DEFAULT_MAINTENANCE_WORK_MEM, CopyManifest, _init_worker, build_postgresql_schema,
+    convert_data_range, copy_tasks, memory_shares, table_references, write_copy_manifest
+)
+from output_writer import COMPRESSION_SUFFIXES, OutputWriter, with_suffix
+from progress import ProgressReporter, SharedProgress
+from reorder_buffer import ReorderBuffer
+
+# Per-dump lines and counters that do not change the schema
+DUMP_NOISE = re.compile(r'^-- (?:Host|Server version|Dump completed on)\b.*\n|\s*AUTO_INCREMENT=\d+', re.MULTILINE)
+
+# Schema name the shared conversion is made with, replaced by each tenant's
+SCHEMA_PLACEHOLDER = 'tenant_schema_placeholder'
+
+def parse_tenant(spec):
+    """
+    'SCHEMA=DUMP', or a dump path whose file name gives the schema
+    """
+    schema, separator, path = spec.partition('=')
+    if not separator:
+        path = spec
+        name = os.path.basename(spec).split('.')[0]
+        schema = re.sub(r'\W+', '_', name).strip('_').lower()
+    if not schema or not re.match(r'^\w+$', schema):
+        raise ValueError(f"Tenant '{spec}' needs a schema name: SCHEMA=DUMP")
+    return schema, path
+
+def schema_key(mysql_sql, options):
+    """
+    Hash of the normalized DDL and the conversion options
+    """
+    from hashlib import sha256
+    digest = sha256(repr(sorted(options.items())).encode())
+    digest.update(mysql_sql.encode('utf-8', errors='surrogateescape'))
+    return digest.hexdigest()[:16]
+
+def convert_shared_schema(mysql_sql, options):
+    """
+    Convert one tenant schema with SCHEMA_PLACEHOLDER as the schema name.
+    Returns (schema_sql, post_data or None, layouts or None).
+    """
+    layouts = {} if options['optimize_layout'] else None
+    post_data = [] if options['fast_load'] else None
+    schema_sql = build_postgresql_schema(
+        mysql_sql, SCHEMA_PLACEHOLDER, stats=None, layouts=layouts, fast_load=options['fast_load'],
+        maintenance_work_mem=options['maintenance_work_mem'], post_data=post_data
+    )
+    return schema_sql, post_data, layouts
+
+def bind_schema(sql, schema):
+    return sql.replace(SCHEMA_PLACEHOLDER, schema)
+
+def convert_tenant_range(item):
+    """
+    Worker: one byte range of one tenant's dump (see convert_data_range)
+    """
+    schema, task = item
+    return schema, convert_data_range(task)
+
+class TenantBatch:
+    """
+    Collects the worker results of each tenant in chunk order; when a
+    tenant's last chunk is in, converts its schema (or reuses the
+    conversion of an identical one) and writes its directory
+    """
+
+    def __init__(self, tenants, output_dir, options, reorder_memory, compression=None, verbose=False):
+        self.output_dir = output_dir
+        self.options = options
+        self.compression = compression
+        self.verbose = verbose
+        self.shared = {}          # schema key -> (schema_sql, post_data, layouts, first tenant)
+        self.results = {}
+        self.pending = {}
+        self.merged = {}
+        self.reorder = {}
+        for schema, path in tenants:
+            self.merged[schema] = CopyManifest(path, stats=ConversionStats(path))
+            self.reorder[schema] = ReorderBuffer(self.merged[schema].add, reorder_memory,
+                                                 size_of=lambda result: len(result[1]))
+
+    def tenant_dir(self, schema):
+        return os.path.join(self.output_dir, schema)
+
+    def expect(self, schema, task_count):
+        self.pending[schema] = task_count
+        if not task_count:
+            self.finish_tenant(schema)
+
+    def add(self, schema, result):
+        self.reorder[schema].add(result[0], result)
+        self.pending[schema] -= 1
+        if not self.pending[schema]:
+            self.finish_tenant(schema)
+
+    def finish_tenant(self, schema):
+        self.reorder.pop(schema).close()
+        mysql_sql, manifest = self.merged.pop(schema).finish()
+        mysql_sql = DUMP_NOISE.sub('', mysql_sql)
+        key = schema_key(mysql_sql, self.options)
+        if key in self.shared:
+            reused = True
+        else:
+            reused = False
+            started = time.perf_counter()
+            self.shared[key] = (*convert_shared_schema(mysql_sql, self.options), schema)
+            if self.verbose:
+                print(f"  Schema {key} converted for {schema} in {time.perf_counter() - started:.2f}s")
+        schema_sql, post_data, layouts, first = self.shared[key]
+
+        tenant_dir = self.tenant_dir(schema)
+        output_file = with_suffix(os.path.join(tenant_dir, 'schema.sql'), self.compression)
+        with OutputWriter(output_file, self.compression) as f:
+            f.write(bind_schema(schema_sql, schema))
+        write_copy_manifest(
+            tenant_dir, manifest, schema, layouts,
+            [bind_schema(statement, schema) for statement in post_data] if post_data is not None else None,
+            self.options['maintenance_streams'], table_references(mysql_sql)
+        )
+        self.results[schema] = {
+            'directory': tenant_dir,
+            'schema_key': key,
+            'shared_with': first if reused else None,
+            'tables': len(manifest['tables']),
+            'rows': sum(table['rows'] for table in manifest['tables'].values()),
+            'chunks': sum(len(table['chunks']) for table in manifest['tables'].values()),
+        }
+
+def convert_tenants(tenants, output_dir, options, jobs=1, chunk_size=DEFAULT_CHUNK_SIZE, compression=None,
+                    checksums=True, max_memory=None, progress=False, verbose=False):
+    """
+    Convert every (schema, dump path) in tenants into output_dir/<schema>/.
+    All chunks of all tenants share one pool of jobs workers, largest dump
+    first, so a small tenant never waits for a big one to finish.
+    Returns {schema: summary}.
+    """
+    from dump_index import load_index
+    reorder_memory, row_group_size = memory_shares(max_memory and max_memory // len(tenants), jobs)
+    tenants = sorted(tenants, key=lambda tenant: -os.path.getsize(tenant[1]))
+    batch = TenantBatch(tenants, output_dir, options, reorder_memory, compression, verbose)
+    items = []
+    for schema, path in tenants:
+        tasks = copy_tasks(path, batch.tenant_dir(schema), chunk_size, compression, checksums,
+                           row_group_size=row_group_size, index=load_index(path, verbose))
+        items.extend((schema, task) for task in tasks)
+        batch.expect(schema, len(tasks))
+
+    if verbose:
+        print(f"Converting {len(tenants)} tenants in {len(items)} chunks with {min(jobs, len(items))} worker(s)...")
+
+    reporter = ProgressReporter(sum(os.path.getsize(path) for _, path in tenants), 'Converting tenants',
+                                enabled=progress)
+    if jobs > 1 and len(items) > 1:
+        # Imported here: multiprocessing costs more at startup than the rest of the script
+        from multiprocessing import Pool, TimeoutError
+        shared = SharedProgress() if progress else None
+        with Pool(min(jobs, len(items)), initializer=_init_worker, initargs=(shared,)) as pool:
+            results = pool.imap_unordered(convert_tenant_range, items)
+            for _ in items:
+                while True:
+                    try:
+                        schema, result = results.next(reporter.interval)
+                        break
+                    except TimeoutError:
+                        if shared is not None:
+                            reporter.set(*shared.snapshot(), table=f'{len(tenants)} tenants')
+                batch.add(schema, result)
+    else:
+        _init_worker(reporter if progress else None)
+        try:
+            for item in items:
+                batch.add(*convert_tenant_range(item))
+        finally:
+            _init_worker(None)
+    reporter.finish()
+    return batch.results
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Convert several tenant dumps that share a schema: data over one worker pool, '
+                    'each distinct schema converted once'
+    )
+    parser.add_argument('tenants', nargs='+', metavar='SCHEMA=DUMP',
+                        help='Tenant dump and the PostgreSQL schema it goes to (a bare path takes the schema '
+                             'from the file name)')
+    parser.add_argument('-o', '--output-dir', required=True,
+                        help='Directory for the tenants; each gets OUTPUT_DIR/SCHEMA with schema.sql and its COPY data')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Verbose output')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='Worker processes shared by all tenants (default: 1)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE // (1024 * 1024),
+                        help='Target data chunk size in MB (default: 64)')
+    parser.add_argument('--compress', choices=sorted(COMPRESSION_SUFFIXES),
+                        help='Compress schema.sql and the COPY chunks (zstd needs zstandard)')
+    parser.add_argument('--optimize-layout', action='store_true',
+                        help='Order columns of new tables by alignment (see convert_mysql_to_postgresql.py)')
+    parser.add_argument('--fast-load', action='store_true',
+                        help='INITIAL LOAD INTO EMPTY DATABASES ONLY: UNLOGGED tables, indexes and SET LOGGED '
+                             'in each tenant\'s post_load.sql (see convert_mysql_to_postgresql.py)')
+    parser.add_argument('--maintenance-work-mem', default=DEFAULT_MAINTENANCE_WORK_MEM,
+                        help=f'With --fast-load: maintenance_work_mem for the index build '
+                             f'(default: {DEFAULT_MAINTENANCE_WORK_MEM})')
+    parser.add_argument('--maintenance-streams', type=int, default=4,
+                        help='Parallel VACUUM (ANALYZE) scripts per tenant for after the load (default: 4, 0 to skip)')
+    parser.add_argument('--checksums', action=argparse.BooleanOptionalAction, default=True,
+                        help='Record per-table row checksums for verify_postgresql.py (default: on)')
+    parser.add_argument('--max-memory', type=int, metavar='MB',
+                        help='Memory budget in MB for the whole batch (see convert_mysql_to_postgresql.py)')
+    parser.add_argument('--progress', action=argparse.BooleanOptionalAction, default=None,
+                        help='Show progress with ETA on stderr (default: when stderr is a terminal)')
+
+    args = parser.parse_args()
+
+    try:
+        tenants = [parse_tenant(spec) for spec in args.tenants]
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    schemas = [schema for schema, _ in tenants]
+    duplicates = sorted({schema for schema in schemas if schemas.count(schema) > 1})
+    if duplicates:
+        print(f"Error: schema {', '.join(duplicates)} is given to more than one tenant")
+        sys.exit(1)
+    for _, path in tenants:
+        if not os.path.isfile(path):
+            print(f"Error: File '{path}' not found")
+            sys.exit(1)
+    if args.progress is None:
+        args.progress = sys.stderr.isatty()
+
+    options = {
+        'optimize_layout': args.optimize_layout,
+        'fast_load': args.fast_load,
+        'maintenance_work_mem': args.maintenance_work_mem,
+        'maintenance_streams': args.maintenance_streams,
+    }
+    started = time.perf_counter()
+    try:
+        results = convert_tenants(
+            tenants, args.output_dir, options, max(1, args.jobs), max(1, args.chunk_size) * 1024 * 1024,
+            args.compress, args.checksums, args.max_memory and max(1, args.max_memory) * 1024 * 1024,
+            args.progress, args.verbose
+        )
+    except (ValueError, OSError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    elapsed = time.perf_counter() - started
+
+    keys = {result['schema_key'] for result in results.values()}
+    print(f"✓ Converted {len(results)} tenant(s) with {len(keys)} distinct schema(s) in {elapsed:.1f}s")
+    print(f"  {'Schema':<24} {'Tables':>7} {'Rows':>14} {'Chunks':>7}  Schema key")
+    for schema in schemas:
+        result = results[schema]
+        shared = f" (same as {result['shared_with']})" if result['shared_with'] else ''
+        print(f"  {schema:<24} {result['tables']:>7,} {result['rows']:>14,} {result['chunks']:>7,}  "
+              f"{result['schema_key']}{shared}")
+    print(f"\n  Output: {args.output_dir}/<schema>/ (schema.sql, manifest.json; load each with load_postgresql.py)")
+
+if __name__ == '__main__':
+    main()
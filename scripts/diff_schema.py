@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Schema Diff
+Compares two MySQL schema dumps (or a MySQL dump against an already converted
+PostgreSQL file) through the convert/fix pipeline and outputs only the DDL
+needed to bring the old PostgreSQL schema up to date:
+ALTER TABLE ... ADD COLUMN, CREATE INDEX (DROP INDEX first for an index whose
+definition changed) and foreign key constraints
+"""
+
+import re
+import sys
+import argparse
+
+CREATE_TABLE_PATTERN = re.compile(
+    r'CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?((?:[\w"]+\.)?(?:"[^"]+"|\w+))\s*\((.*?)\n\s*\)[^;]*;',
+    re.IGNORECASE | re.DOTALL
+)
+CREATE_INDEX_PATTERN = re.compile(
+    r'CREATE\s+(?:UNIQUE\s+)?INDEX\s+(?:IF\s+NOT\s+EXISTS\s+)?("[^"]+"|\w+)\s+ON\s+([\w".]+)[^;]*;',
+    re.IGNORECASE
+)
+ALTER_FK_PATTERN = re.compile(
+    r'ALTER\s+TABLE\s+([\w".]+)\s+ADD\s+CONSTRAINT\s+("[^"]+"|\w+)\s+(FOREIGN\s+KEY[^;]*);',
+    re.IGNORECASE
+)
+INLINE_FK_PATTERN = re.compile(
+    r'CONSTRAINT\s+("[^"]+"|\w+)\s+(FOREIGN\s+KEY\s*\([^)]*\)\s*REFERENCES[^,\n]*)',
+    re.IGNORECASE
+)
+# Enum type, bare or in the DO block the converter wraps it in
+ENUM_TYPE_PATTERN = re.compile(
+    r"(?:DO\s+\$\$\s*BEGIN\s+)?CREATE\s+TYPE\s+([\w\".]+)\s+AS\s+ENUM\s*\(((?:[^')]|'(?:[^']|'')*')*)\)\s*;"
+    r"(?:\s*EXCEPTION\s+WHEN\s+duplicate_object\s+THEN\s+NULL\s*;\s*END\s*\$\$\s*;)?",
+    re.IGNORECASE
+)
+ENUM_LABEL = re.compile(r"'((?:[^']|'')*)'")
+NON_COLUMN_PREFIXES = ('PRIMARY', 'CONSTRAINT', 'UNIQUE', 'KEY', 'INDEX', 'FULLTEXT', 'CHECK', 'FOREIGN', '--')
+# Schema a converted file creates or selects, for the --schema default
+SCHEMA_NAME_PATTERN = re.compile(
+    r'^\s*(?:CREATE\s+SCHEMA\s+(?:IF\s+NOT\s+EXISTS\s+)?|SET\s+search_path\s+(?:TO|=)\s*)"?(\w+)"?',
+    re.IGNORECASE | re.MULTILINE
+)
+DEFAULT_SCHEMA = 'mifos'
+
+def looks_like_mysql(sql):
+    """
+    Guess whether a file is a MySQL dump rather than converted PostgreSQL
+    """
+    return '`' in sql or re.search(r'\)\s*ENGINE\s*=', sql, re.IGNORECASE) is not None
+
+def bare_name(name):
+    """
+    Strip schema qualifier and quotes: kulman."Table" -> Table, kulman.m_loan -> m_loan
+    """
+    name = name.strip()
+    match = re.match(r'^(?:(?:"[^"]+"|\w+)\.)?("([^"]+)"|(\w+))$', name)
+    if not match:
+        return name
+    return match.group(2) or match.group(3).lower()
+
+def parse_postgresql_schema(sql):
+    """
+    Parse converted PostgreSQL DDL into tables (ordered column definitions),
+    indexes, foreign keys and enum types, keyed by unqualified names
+    """
+    schema = {'tables': {}, 'indexes': {}, 'foreign_keys': {}, 'types': {}}
+    
+    for match in ENUM_TYPE_PATTERN.finditer(sql):
+        labels = [label.replace("''", "'") for label in ENUM_LABEL.findall(match.group(2))]
+        schema['types'][bare_name(match.group(1))] = (labels, match.group(0))
+    
+    for match in CREATE_TABLE_PATTERN.finditer(sql):
+        table = bare_name(match.group(1))
+        columns = {}
+        for line in match.group(2).split('\n'):
+            line = line.strip().rstrip(',').strip()
+            if not line or line.upper().startswith(NON_COLUMN_PREFIXES):
+                continue
+            column_match = re.match(r'^("[^"]+"|\S+)\s+(.*)$', line)
+            if column_match:
+                columns[column_match.group(1)] = column_match.group(2).strip()
+        schema['tables'][table] = {'statement': match.group(0), 'columns': columns}
+        
+        for fk_match in INLINE_FK_PATTERN.finditer(match.group(2)):
+            schema['foreign_keys'][fk_match.group(1)] = (table, fk_match.group(2).strip().rstrip(','))
+    
+    for match in CREATE_INDEX_PATTERN.finditer(sql):
+        schema['indexes'][match.group(1)] = (bare_name(match.group(2)), match.group(0))
+    
+    for match in ALTER_FK_PATTERN.finditer(sql):
+        schema['foreign_keys'][match.group(2)] = (bare_name(match.group(1)), match.group(3).strip())
+    
+    return schema
+
+def detect_schema(*sqls):
+    """
+    The schema the first input creates or sets as its search_path (a
+    converted file), or the converter's default when there is none
+    """
+    for sql in sqls:
+        match = SCHEMA_NAME_PATTERN.search(sql)
+        if match and match.group(1).lower() != 'public':
+            return match.group(1)
+    return DEFAULT_SCHEMA
+
+def normalize_index(statement):
+    """
+    An index definition in a form that compares equal across the convert/fix
+    pipeline and hand edits: no IF NOT EXISTS, schema qualifier, case or
+    spacing differences
+    """
+    statement = re.sub(r'\s+', ' ', statement.strip().rstrip(';')).lower()
+    statement = re.sub(r'\bif not exists ', '', statement)
+    statement = re.sub(r' on (?:(?:"[^"]+"|\w+)\.)?("[^"]+"|\w+)', r' on \1', statement)
+    statement = re.sub(r'"(\w+)"', r'\1', statement)
+    return re.sub(r'\s*([(),])\s*', r'\1', statement)
+
+def load_schema(sql, schema_name, verbose=False):
+    """
+    Run MySQL input through the convert/fix pipeline and PostgreSQL input
+    through the fix step, so both sides are compared in the same form (a
+    converted file that was never fixed still says SERIAL where the fixed
+    side says BIGSERIAL)
+    """
+    # Imported here: the converter is most of the time --help would take
+    from mysql_to_postgresql import build_postgresql_schema
+    from fix_postgres_schema import fix_schema_issues
+    if looks_like_mysql(sql):
+        if verbose:
+            print("  Converting MySQL schema through the convert/fix pipeline...", file=sys.stderr)
+        sql = build_postgresql_schema(sql, schema_name)
+    return parse_postgresql_schema(fix_schema_issues(sql, schema_name))
+
+def qualify(table, schema_name):
+    if not re.match(r'^\w+$', table):
+        table = f'"{table}"'
+    return f'{schema_name}.{table}' if schema_name else table
+
+def diff_schemas(old, new, schema_name=DEFAULT_SCHEMA):
+    """
+    Build the DDL that upgrades the old schema to the new one.
+    Returns (sql, summary) where summary counts each kind of change.
+    """
+    added_types = []
+    added_tables = []
+    added_columns = []
+    added_indexes = []
+    changed_indexes = []
+    added_fks = []
+    review = []
+    
+    # Enum labels can be added in place; removing one needs the data checked first
+    for name, (labels, statement) in new['types'].items():
+        old_type = old['types'].get(name)
+        if old_type is None:
+            added_types.append(statement)
+            continue
+        for label in labels:
+            if label not in old_type[0]:
+                literal = "'" + label.replace("'", "''") + "'"
+                added_types.append(f'ALTER TYPE {qualify(name, schema_name)} ADD VALUE IF NOT EXISTS {literal};')
+        removed = [label for label in old_type[0] if label not in labels]
+        if removed:
+            review.append(f"-- removed enum values from {name}: {', '.join(removed)} (left in place)")
+    
+    for table, definition in new['tables'].items():
+        old_table = old['tables'].get(table)
+        if old_table is None:
+            statement = re.sub(r',(\s*\n\s*\))', r'\1', definition['statement'])
+            statement = CREATE_TABLE_PATTERN.sub(
+                lambda m: m.group(0).replace(m.group(1), qualify(table, schema_name), 1), statement
+            )
+            added_tables.append(statement)
+            continue
+        
+        old_columns = {name.strip('"').lower(): (name, col_def) for name, col_def in old_table['columns'].items()}
+        for name, col_def in definition['columns'].items():
+            existing = old_columns.get(name.strip('"').lower())
+            if existing is None:
+                added_columns.append(f'ALTER TABLE {qualify(table, schema_name)} ADD COLUMN IF NOT EXISTS {name} {col_def};')
+            elif existing[1].lower() != col_def.lower():
+                review.append(f'-- changed column {table}.{name}: {existing[1]} -> {col_def}')
+        
+        new_column_names = {name.strip('"').lower() for name in definition['columns']}
+        for key, (name, col_def) in old_columns.items():
+            if key not in new_column_names:
+                review.append(f'-- dropped column {table}.{name} (left in place)')
+    
+    for table in old['tables']:
+        if table not in new['tables']:
+            review.append(f'-- dropped table {table} (left in place)')
+    
+    for name, (table, statement) in new['indexes'].items():
+        if name not in old['indexes']:
+            added_indexes.append(statement)
+        elif normalize_index(old['indexes'][name][1]) != normalize_index(statement):
+            # Same name, different columns, uniqueness or method: rebuild it
+            index_name = f'{schema_name}.{name}' if schema_name else name
+            changed_indexes.append(f'DROP INDEX IF EXISTS {index_name};\n{statement}')
+    for name, (table, statement) in old['indexes'].items():
+        if name not in new['indexes']:
+            review.append(f'-- dropped index {name} on {table} (left in place)')
+    
+    for name, (table, constraint) in new['foreign_keys'].items():
+        if name not in old['foreign_keys']:
+            added_fks.append(f'ALTER TABLE {qualify(table, schema_name)} ADD CONSTRAINT {name} {constraint};')
+        elif old['foreign_keys'][name][1].lower() != constraint.lower():
+            review.append(f'-- changed foreign key {name} on {table}: {constraint}')
+    
+    sections = [
+        ('Enum types', added_types),
+        ('New tables', added_tables),
+        ('New columns', added_columns),
+        ('New indexes', added_indexes),
+        ('Changed indexes (dropped and recreated)', changed_indexes),
+        ('New foreign keys', added_fks),
+        ('Needs manual review (not applied)', review),
+    ]
+    output_lines = ['-- PostgreSQL schema diff', f'SET search_path TO {schema_name}, public;' if schema_name else '']
+    for title, statements in sections:
+        if statements:
+            output_lines.append('')
+            output_lines.append(f'-- {title}')
+            output_lines.extend(statements)
+    
+    summary = {title: len(statements) for title, statements in sections}
+    return '\n'.join(output_lines) + '\n', summary
+
+def read_sql(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except UnicodeDecodeError:
+        with open(path, 'r', encoding='latin-1') as f:
+            return f.read()
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Output only the DDL changes between two schema versions (ADD COLUMN, CREATE INDEX, FKs)'
+    )
+    parser.add_argument('old_file', help='Old MySQL schema dump, or the existing converted PostgreSQL schema')
+    parser.add_argument('new_file', help='New MySQL schema dump')
+    parser.add_argument('-o', '--output', help='Output SQL file (default: stdout)')
+    parser.add_argument('--schema', help='PostgreSQL schema name (default: the schema the converted old file '
+                                         'creates or sets in search_path, else mifos)')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Verbose output')
+    
+    args = parser.parse_args()
+    
+    # Read input files
+    try:
+        old_sql = read_sql(args.old_file)
+        new_sql = read_sql(args.new_file)
+    except FileNotFoundError as e:
+        print(f"Error: File '{e.filename}' not found", file=sys.stderr)
+        sys.exit(1)
+    except Exception as e:
+        print(f"Error reading file: {e}", file=sys.stderr)
+        sys.exit(1)
+    
+    if args.schema is None:
+        args.schema = detect_schema(old_sql, new_sql)
+        if args.verbose:
+            print(f"  Using schema {args.schema}", file=sys.stderr)
+    
+    old_schema = load_schema(old_sql, args.schema, args.verbose)
+    new_schema = load_schema(new_sql, args.schema, args.verbose)
+    diff_sql, summary = diff_schemas(old_schema, new_schema, args.schema)
+    
+    if not args.output:
+        sys.stdout.write(diff_sql)
+    else:
+        try:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                f.write(diff_sql)
+        except Exception as e:
+            print(f"Error writing output file: {e}", file=sys.stderr)
+            sys.exit(1)
+    
+    # Summary goes to stderr so stdout stays valid SQL
+    print(f"\n[OK] Schema diff complete!", file=sys.stderr)
+    print(f"  Old: {args.old_file} ({len(old_schema['tables'])} tables)", file=sys.stderr)
+    print(f"  New: {args.new_file} ({len(new_schema['tables'])} tables)", file=sys.stderr)
+    for title, count in summary.items():
+        print(f"  {title}: {count}", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
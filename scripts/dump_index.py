@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Dump Index
+One pass over a MySQL dump records, per table, the byte ranges of its DDL
+and of its INSERT data, its row count and a CRC-32 of the data, in a small
+JSON sidecar next to the dump (dump.sql.index.json). extract_schema.py and
+convert_mysql_to_postgresql.py --copy-dir pick the sidecar up when it is
+there and still matches the dump (size and mtime): extract reads only the
+DDL, the converter cuts its chunks at table boundaries and hands the
+largest chunks out first. With --tables this script is also a filter that
+copies single tables out of a dump without reading the rest.
+
+    python scripts/dump_index.py mifos.sql
+    python scripts/dump_index.py mifos.sql --tables m_client m_loan -o clients_and_loans.sql
+"""
+
+import os
+import re
+import sys
+import json
+import argparse
+
+from progress import ProgressReporter
+from sql_splitter import split_leading
+
+INDEX_SUFFIX = '.index.json'
+
+# Bumped when the sidecar gains fields; older sidecars are rebuilt
+INDEX_VERSION = 2
+
+# Statements that belong to one table: data, and the DDL mysqldump writes
+TABLE_STATEMENT = re.compile(
+    r'(?:(INSERT|REPLACE)\s+(?:IGNORE\s+)?INTO|(?:CREATE|DROP|ALTER)\s+TABLE(?:\s+IF\s+(?:NOT\s+)?EXISTS)?)'
+    r'\s+(?:`?\w+`?\.)?`?(\w+)`?',
+    re.IGNORECASE
+)
+
+CRC_READ_SIZE = 4 * 1024 * 1024
+
+def index_path(input_file):
+    return input_file + INDEX_SUFFIX
+
+def statement_table(statement_text):
+    """
+    ('data' or 'ddl', table name) for an INSERT or a CREATE/DROP/ALTER TABLE
+    statement, None for anything else
+    """
+    _, body = split_leading(statement_text[:4096])
+    match = TABLE_STATEMENT.match(body)
+    if not match:
+        return None
+    return ('data' if match.group(1) else 'ddl'), match.group(2)
+
+def add_range(ranges, start, end):
+    if ranges and ranges[-1][1] >= start:
+        ranges[-1][1] = max(ranges[-1][1], end)
+    else:
+        ranges.append([start, end])
+
+def read_ranges(input_file, ranges):
+    """
+    Yield the bytes of each (start, end) range of the file, from a
+    read-only memory map
+    """
+    import mmap
+    if not ranges:
+        return
+    with open(input_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        for start, end in ranges:
+            yield data[start:end]
+
+def ranges_crc32(input_file, ranges):
+    from zlib import crc32
+    pieces = [(position, min(end, position + CRC_READ_SIZE))
+              for start, end in ranges for position in range(start, end, CRC_READ_SIZE)]
+    crc = 0
+    for data in read_ranges(input_file, pieces):
+        crc = crc32(data, crc)
+    return f'{crc:08x}'
+
+def build_index(input_file, progress=False):
+    """
+    Index of a dump: {'version', 'source', 'size', 'mtime_ns', 'header':
+    [0, end], 'tables': {table: {'ddl': [[start, end], ...], 'data': [...],
+    'statements', 'rows', 'bytes', 'crc32'}}}, tables in dump order. Data
+    ranges start and end on line boundaries, like the chunks of
+    find_statement_ranges, so they can be handed to the converter's workers
+    as they are. INSERTs longer than a row group count as one statement per
+    row group, as in the converter's run report.
+    """
+    # Imported here: the converter's regexes cost more at startup than the rest of the script
+    from mysql_to_postgresql import _iter_range_statements, insert_row_count, insert_values_start
+    stat = os.stat(input_file)
+    tables = {}
+    header_end = None
+    open_data = None     # data ranges of the previous statement, if it was an INSERT
+    reporter = ProgressReporter(stat.st_size, 'Indexing', enabled=progress)
+
+    with open(input_file, 'rb') as f:
+        for statement in _iter_range_statements(f, stat.st_size):
+            head = statement.text[:4096].decode('latin-1')
+            if open_data is not None and head.startswith('\n'):
+                # The line break after an INSERT goes with its data
+                open_data[-1][1] += 1
+            open_data = None
+            found = statement_table(head)
+            if found is None:
+                reporter.set(statement.end)
+                continue
+            kind, table_name = found
+            table = tables.setdefault(table_name, {'ddl': [], 'data': [], 'statements': 0, 'rows': 0, 'bytes': 0})
+            if header_end is None:
+                header_end = statement.start
+            if kind == 'ddl':
+                add_range(table['ddl'], statement.start, statement.end)
+            else:
+                leading, _ = split_leading(head)
+                start = statement.start + leading.rfind('\n') + 1
+                add_range(table['data'], start, statement.end)
+                table['statements'] += 1
+                positions = insert_values_start(statement.text)
+                if positions:
+                    table['rows'] += insert_row_count(statement.text, positions[1])
+                open_data = table['data']
+            reporter.set(statement.end, table=table_name)
+    reporter.finish()
+
+    for table in tables.values():
+        table['bytes'] = sum(end - start for start, end in table['data'])
+        table['crc32'] = ranges_crc32(input_file, table['data'])
+    return {
+        'version': INDEX_VERSION,
+        'source': os.path.basename(input_file),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'header': [0, stat.st_size if header_end is None else header_end],
+        'tables': tables,
+    }
+
+def write_index(input_file, index):
+    path = index_path(input_file)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=1)
+    return path
+
+def load_index(input_file, verbose=False):
+    """
+    The sidecar index of input_file, or None if there is none or it no
+    longer matches the dump
+    """
+    path = index_path(input_file)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        stat = os.stat(input_file)
+    except (OSError, ValueError):
+        return None
+    if index.get('size') != stat.st_size or index.get('mtime_ns') != stat.st_mtime_ns:
+        print(f"Warning: {path} is out of date, not using it (rebuild it with dump_index.py)", file=sys.stderr)
+        return None
+    if index.get('version') != INDEX_VERSION:
+        print(f"Warning: {path} was written by an older dump_index.py, not using it (rebuild it with dump_index.py)",
+              file=sys.stderr)
+        return None
+    if verbose:
+        print(f"Using dump index {path}")
+    return index
+
+def data_ranges(index):
+    """
+    All data ranges of the dump, in file order
+    """
+    return sorted(tuple(r) for table in index['tables'].values() for r in table['data'])
+
+def schema_ranges(index, tables=None):
+    """
+    Ranges holding everything but the data (tables=None), or only the DDL
+    of the given tables, in file order
+    """
+    if tables is not None:
+        return sorted(tuple(r) for name in tables for r in index['tables'][name]['ddl'])
+    ranges = []
+    position = 0
+    for start, end in data_ranges(index):
+        if start > position:
+            ranges.append((position, start))
+        position = max(position, end)
+    if position < index['size']:
+        ranges.append((position, index['size']))
+    return ranges
+
+def table_ranges(index, tables):
+    """
+    The dump header and the DDL and data of the given tables, in file order
+    """
+    ranges = [tuple(index['header'])] if index['header'][1] else []
+    ranges.extend(sorted(tuple(r) for name in tables
+                         for kind in ('ddl', 'data') for r in index['tables'][name][kind]))
+    return ranges
+
+def check_tables(index, tables):
+    missing = [name for name in tables if name not in index['tables']]
+    if missing:
+        raise ValueError(f"Table {', '.join(missing)} not in the dump index")
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Index the tables of a MySQL dump in a sidecar file, or copy single tables out of it'
+    )
+    parser.add_argument('input_file', help='MySQL dump file')
+    parser.add_argument('--rebuild', action='store_true', help='Rebuild the index even if it is up to date')
+    parser.add_argument('--verify', action='store_true', help='Check the CRC-32 of every table\'s data against the index')
+    parser.add_argument('--tables', nargs='+', help='Copy the header, DDL and data of these tables to --output')
+    parser.add_argument('-o', '--output', help='Output file for --tables (default: stdout)')
+    parser.add_argument('--progress', action=argparse.BooleanOptionalAction, default=None,
+                        help='Show progress with ETA on stderr (default: when stderr is a terminal)')
+
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.input_file):
+        print(f"Error: File '{args.input_file}' not found")
+        sys.exit(1)
+    if args.progress is None:
+        args.progress = sys.stderr.isatty()
+
+    index = None if args.rebuild else load_index(args.input_file)
+    built = index is None
+    if built:
+        index = build_index(args.input_file, args.progress)
+        path = write_index(args.input_file, index)
+    else:
+        path = index_path(args.input_file)
+
+    if args.tables:
+        try:
+            check_tables(index, args.tables)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+        try:
+            ranges = table_ranges(index, args.tables)
+            previous_end, last = None, b''
+            for (start, end), data in zip(ranges, read_ranges(args.input_file, ranges)):
+                # A DDL range ends at its semicolon: start what follows on a new line
+                if previous_end is not None and start != previous_end and not last.endswith(b'\n'):
+                    out.write(b'\n')
+                out.write(data)
+                previous_end, last = end, data[-1:]
+        finally:
+            if args.output:
+                out.close()
+        if args.output:
+            print(f"✓ Wrote {len(args.tables)} table(s) to {args.output}")
+        return
+
+    failed = []
+    if args.verify:
+        failed = [name for name, table in index['tables'].items()
+                  if ranges_crc32(args.input_file, table['data']) != table['crc32']]
+
+    print(f"✓ Index {'written' if built else 'up to date'}: {path}")
+    print(f"  {'Table':<40} {'Rows':>14} {'Data bytes':>16} {'Ranges':>7}  CRC-32")
+    for name, table in sorted(index['tables'].items(), key=lambda item: -item[1]['bytes']):
+        mark = '  MISMATCH' if name in failed else ''
+        print(f"  {name:<40} {table['rows']:>14,} {table['bytes']:>16,} {len(table['data']):>7}  {table['crc32']}{mark}")
+    if failed:
+        print(f"\n  {len(failed)} table(s) changed since the index was built; rebuild it with --rebuild")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -6,105 +6,95 @@ Removes all data (INSERT statements) and keeps only the database structure (DDL)
 
 import re
 import sys
+import time
 import argparse
 
-def extract_schema(sql_content, verbose=False):
+from conversion_stats import ConversionStats
+from dump_index import check_tables, load_index, read_ranges, schema_ranges, statement_table
+from progress import ProgressReporter
+from sql_splitter import split_statements, split_leading, statement_keyword
+
+# Matched against whole statements (after leading comments), so multi-line
+# INSERTs and semicolons inside strings are handled by the splitter
+SKIP_PATTERNS = [re.compile(pattern, re.IGNORECASE | re.DOTALL) for pattern in [
+    r'^INSERT\s+INTO',          # INSERT INTO statements
+    r'^LOCK\s+TABLES',          # LOCK TABLES
+    r'^UNLOCK\s+TABLES',        # UNLOCK TABLES
+    r'^/\*!\d+.*?\*/',          # MySQL version-specific comments
+    r'^SET\s+@OLD_',            # MySQL session variables
+    r'^SET\s+CHARACTER_SET',    # Character set settings
+    r'^SET\s+NAMES',            # SET NAMES
+    r'^SET\s+SQL_MODE',         # SQL mode settings
+    r'^SET\s+@',                # Other session variables
+    r'^/\*!\d+.*INSERT',        # MySQL versioned INSERT statements
+]]
+
+# Statements kept as they are: DDL and foreign key settings
+KEEP_KEYWORDS = {'CREATE', 'ALTER', 'DROP', 'USE', ''}
+
+def skip_reason(statement_text):
+    """
+    Why a statement is not part of the schema (the skip pattern, 'SET' or
+    'other'), or None if it is kept
+    """
+    keyword = statement_keyword(statement_text)
+    _, body = split_leading(statement_text)
+    skip_pattern = next((pattern for pattern in SKIP_PATTERNS if pattern.match(body)), None)
+    if skip_pattern is None and keyword == 'SET' and not re.match(r'SET\s+foreign_key_checks', body, re.IGNORECASE):
+        skip_pattern = 'SET'
+    elif skip_pattern is None and keyword not in KEEP_KEYWORDS and keyword != 'SET':
+        skip_pattern = 'other'
+    return skip_pattern
+
+def extract_schema(sql_content, verbose=False, stats=None, progress=False, tables=None, encoding='utf-8'):
     """
-    Extract schema (DDL) from SQL dump, removing all data (INSERT statements)
+    Extract schema (DDL) from SQL dump, removing all data (INSERT statements).
+    tables: keep only the DDL of these tables. encoding: the dump's, for the
+    byte counts in stats.
     """
-    lines = sql_content.split('\n')
-    schema_lines = []
-    in_insert_statement = False
-    in_comment_block = False
+    # Imported here: the converter is most of the time --help would take
+    from mysql_to_postgresql import insert_row_count, insert_values_start
+    schema_statements = []
     
     if verbose:
         print("Extracting schema from SQL dump...")
     
-    skip_patterns = [
-        r'^INSERT\s+INTO',          # INSERT INTO statements
-        r'^LOCK\s+TABLES',          # LOCK TABLES
-        r'^UNLOCK\s+TABLES',        # UNLOCK TABLES
-        r'^/\*!\d+.*?\*/',          # MySQL version-specific comments
-        r'^SET\s+@OLD_',            # MySQL session variables
-        r'^SET\s+CHARACTER_SET',    # Character set settings
-        r'^SET\s+NAMES',            # SET NAMES
-        r'^SET\s+SQL_MODE',         # SQL mode settings
-        r'^SET\s+@',                # Other session variables
-        r'^/\*!\d+.*INSERT',        # MySQL versioned INSERT statements
-    ]
-    
-    keep_patterns = [
-        r'^CREATE\s+',              # CREATE statements
-        r'^ALTER\s+',               # ALTER statements
-        r'^DROP\s+',                # DROP statements
-        r'^USE\s+',                 # USE database
-        r'^/\*',                    # Comment blocks (for documentation)
-        r'^\s*\*',                  # Comment continuation
-        r'^--',                     # SQL comments
-        r'^SET\s+foreign_key_checks', # Foreign key settings (important for schema)
-        r'^SET\s+FOREIGN_KEY_CHECKS',
-        r'^\s*$',                   # Empty lines
-        r'^\s*;',                   # Statement terminators
-    ]
-    
-    insert_block_pattern = re.compile(r'INSERT\s+INTO.*?VALUES\s*\(', re.IGNORECASE | re.DOTALL)
-    
     skip_count = 0
     keep_count = 0
-    
-    i = 0
-    while i < len(lines):
-        line = lines[i]
-        original_line = line
-        stripped = line.strip()
-        
-        # Skip empty lines at the end, keep them in the middle
-        if not stripped and not schema_lines:
-            i += 1
-            continue
-        
-        # Check if line should be skipped
-        should_skip = False
-        for pattern in skip_patterns:
-            if re.match(pattern, stripped, re.IGNORECASE):
-                should_skip = True
-                skip_count += 1
-                break
-        
-        if should_skip:
-            # If it's an INSERT statement, skip until we find the semicolon or next statement
-            if re.match(r'^INSERT\s+INTO', stripped, re.IGNORECASE):
-                # Skip multi-line INSERT statements
-                while i < len(lines) and not lines[i].strip().endswith(';'):
-                    i += 1
-                # Skip the line with semicolon too
-                i += 1
-                continue
-            i += 1
-            continue
-        
-        # Check if line should be kept
-        should_keep = False
-        for pattern in keep_patterns:
-            if re.match(pattern, stripped, re.IGNORECASE):
-                should_keep = True
-                keep_count += 1
-                break
-        
-        # Keep DDL statements and comments
-        if should_keep or any(keyword in stripped.upper() for keyword in [
-            'CREATE', 'ALTER', 'DROP', 'INDEX', 'CONSTRAINT', 'PRIMARY KEY',
-            'FOREIGN KEY', 'UNIQUE', 'COMMENT', 'ENGINE', 'CHARSET',
-            'DEFAULT', 'AUTO_INCREMENT', '--', '/*'
-        ]):
-            schema_lines.append(line)
-        elif not stripped:
-            # Keep empty lines for readability
-            schema_lines.append(line)
+    reporter = ProgressReporter(len(sql_content), 'Extracting schema', enabled=progress)
+    
+    for statement in split_statements(sql_content):
+        started = time.perf_counter()
+        skip_pattern = skip_reason(statement.text)
+        if skip_pattern is None and tables is not None:
+            found = statement_table(statement.text)
+            if found is None or found[1] not in tables:
+                skip_pattern = 'table'
+        insert_match = re.match(r'INSERT\s+INTO\s+`?(\w+)`?', split_leading(statement.text)[1], re.IGNORECASE)
+        if skip_pattern is not None:
+            skip_count += 1
+            if stats is not None:
+                stats.count_rule(f'skip:{getattr(skip_pattern, "pattern", skip_pattern)}')
+                if insert_match:
+                    # Rows counted like dump_index.py does
+                    data = statement.text.encode(encoding, errors='surrogateescape')
+                    positions = insert_values_start(data)
+                    stats.add_table(
+                        insert_match.group(1),
+                        statements=1,
+                        rows=insert_row_count(data, positions[1]) if positions else 0,
+                        bytes_in=len(data),
+                        seconds=time.perf_counter() - started
+                    )
+        else:
+            keep_count += 1
+            schema_statements.append(statement.text)
         
-        i += 1
+        if progress:
+            reporter.set(statement.end, table=insert_match.group(1) if insert_match else None)
     
-    schema_content = '\n'.join(schema_lines)
+    reporter.finish()
+    schema_content = ''.join(schema_statements).lstrip('\n')
     
     # Clean up: Remove consecutive empty lines (more than 2)
     schema_content = re.sub(r'\n{3,}', '\n\n', schema_content)
@@ -113,8 +103,8 @@ def extract_schema(sql_content, verbose=False):
     schema_content = re.sub(r'/\*!\d+[^*]*\*+(?:[^*/][^*]*\*+)*/', '', schema_content)
     
     if verbose:
-        print(f"  Skipped {skip_count} data lines")
-        print(f"  Kept {keep_count} schema lines")
+        print(f"  Skipped {skip_count} data statements")
+        print(f"  Kept {keep_count} schema statements")
         print("  Schema extraction complete!")
     
     return schema_content
@@ -127,20 +117,44 @@ def main():
     parser.add_argument('-o', '--output', help='Output schema-only SQL file')
     parser.add_argument('-v', '--verbose', action='store_true', help='Verbose output')
     parser.add_argument('--clean', action='store_true', help='Remove MySQL-specific comments and settings')
+    parser.add_argument('--stats-json', help='Write the run report (per-table counts, timings, rule hits) to this JSON file')
+    parser.add_argument('--progress', action=argparse.BooleanOptionalAction, default=None,
+                        help='Show progress with ETA on stderr (default: when stderr is a terminal)')
+    parser.add_argument('--tables', nargs='+', help='Only extract the DDL of these tables')
+    parser.add_argument('--index', action=argparse.BooleanOptionalAction, default=True,
+                        help='Use the dump index from dump_index.py when it is up to date, reading only the DDL '
+                             '(default: on)')
     
     args = parser.parse_args()
+    stats = ConversionStats(args.input_file)
     
     # Read input file
     try:
+        index = load_index(args.input_file, args.verbose) if args.index else None
         encoding = 'utf-8'
-        try:
-            with open(args.input_file, 'r', encoding='utf-8') as f:
-                sql_content = f.read()
-        except UnicodeDecodeError:
-            # Try with latin-1 if utf-8 fails
-            with open(args.input_file, 'r', encoding='latin-1') as f:
-                sql_content = f.read()
+        if index is not None:
+            # Only the ranges between the data, from a memory map
+            if args.tables:
+                check_tables(index, args.tables)
+            raw_content = b''.join(read_ranges(args.input_file, schema_ranges(index, args.tables)))
+            try:
+                sql_content = raw_content.decode('utf-8')
+            except UnicodeDecodeError:
+                sql_content = raw_content.decode('latin-1')
                 encoding = 'latin-1'
+            # Same line endings as reading in text mode
+            sql_content = sql_content.replace('\r\n', '\n').replace('\r', '\n')
+            for table_name, table in index['tables'].items():
+                stats.add_table(table_name, statements=table['statements'], rows=table['rows'], bytes_in=table['bytes'])
+        else:
+            try:
+                with open(args.input_file, 'r', encoding='utf-8') as f:
+                    sql_content = f.read()
+            except UnicodeDecodeError:
+                # Try with latin-1 if utf-8 fails
+                with open(args.input_file, 'r', encoding='latin-1') as f:
+                    sql_content = f.read()
+                    encoding = 'latin-1'
         
         if args.verbose:
             print(f"Read {len(sql_content)} characters from {args.input_file}")
@@ -149,12 +163,18 @@ def main():
     except FileNotFoundError:
         print(f"Error: File '{args.input_file}' not found")
         sys.exit(1)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
     except Exception as e:
         print(f"Error reading file: {e}")
         sys.exit(1)
     
     # Extract schema
-    schema_content = extract_schema(sql_content, args.verbose)
+    if args.progress is None:
+        args.progress = sys.stderr.isatty()
+    schema_content = extract_schema(sql_content, args.verbose, stats, args.progress,
+                                    set(args.tables) if args.tables else None, encoding)
     
     if args.clean:
         if args.verbose:
@@ -191,6 +211,13 @@ def main():
         print(f"  Input:  {args.input_file} ({input_size:,} bytes)")
         print(f"  Output: {output_file} ({output_size:,} bytes)")
         print(f"  Size reduction: {size_reduction:.1f}%")
+        
+        stats.finish(input_size, output_size)
+        print(f"\n  Run report (skipped data):")
+        print(stats.format_report(limit=25))
+        if args.stats_json:
+            stats.write_json(args.stats_json)
+            print(f"  Stats:  {args.stats_json}")
         print(f"\n  The output file contains only the database structure (DDL)")
         print(f"  All INSERT statements and data have been removed.")
         
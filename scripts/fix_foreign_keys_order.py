@@ -4,108 +4,101 @@ Fix foreign key order issues in PostgreSQL schema
 Removes foreign key constraints from CREATE TABLE and adds them separately at the end
 """
 
+import os
 import re
 import sys
 import argparse
 
-def fix_foreign_key_order(sql_content):
+from spill_buffer import DEFAULT_MAX_MEMORY, SpillBuffer, megabytes
+from sql_splitter import split_statements, statement_keyword
+
+HEADER_LINE = re.compile(r'^CREATE SCHEMA|^SET search_path', re.IGNORECASE)
+
+def header_lines(lines, table_structure):
     """
-    Extract foreign key constraints from CREATE TABLE statements
-    and add them separately at the end after all tables are created
+    Schema creation, search_path and (unless the file has 'Table structure'
+    comments) comment lines at the start of the file
+    """
+    header = []
+    for line in lines:
+        if HEADER_LINE.match(line) or (line.strip().startswith('--') and not table_structure):
+            header.append(line)
+        else:
+            break
+    return header
+
+def iter_foreign_key_order(source, max_memory=None):
+    """
+    Yield the output lines of fix_foreign_key_order for source (SQL text, a
+    path or a text file object). The CREATE TABLE lines and the foreign keys
+    are collected in spill buffers, so max_memory (bytes) bounds the memory
+    used whatever the size of the schema.
     """
-    lines = sql_content.split('\n')
-    create_table_blocks = []
-    foreign_key_constraints = []
-    current_table = None
-    current_table_lines = []
-    in_create_table = False
+    head = ''
+    head_open = True
+    table_structure = False
     
-    i = 0
-    while i < len(lines):
-        line = lines[i]
-        
-        # Detect CREATE TABLE start
-        create_match = re.search(r'CREATE TABLE IF NOT EXISTS\s+([\w"\.]+)', line, re.IGNORECASE)
-        if create_match:
-            if current_table:
-                # Save previous table
-                create_table_blocks.append((current_table, current_table_lines))
+    with SpillBuffer(max_memory) as create_table_lines, SpillBuffer(max_memory) as foreign_key_constraints:
+        for statement in split_statements(source, dialect='postgresql'):
+            # Keep the start of the file until it stops looking like a header
+            if head_open:
+                head += statement.text
+                head_open = all(HEADER_LINE.match(line) or line.strip().startswith('--')
+                                for line in head.split('\n')[:-1])
+            if 'Table structure' in statement.text:
+                table_structure = True
             
-            current_table = create_match.group(1)
-            current_table_lines = [line]
-            in_create_table = True
-            i += 1
-            continue
-        
-        if in_create_table:
-            current_table_lines.append(line)
-            
-            # Check if line has foreign key constraint
-            fk_match = re.search(r'CONSTRAINT\s+(\w+)\s+FOREIGN\s+KEY\s*\(([^)]+)\)\s+REFERENCES\s+([\w"\.]+)\s*\(([^)]+)\)', line, re.IGNORECASE)
-            if fk_match:
-                constraint_name = fk_match.group(1)
-                fk_columns = fk_match.group(2)
-                ref_table = fk_match.group(3)
-                ref_columns = fk_match.group(4)
-                
-                # Store the FK constraint to add later
-                fk_sql = f'ALTER TABLE {current_table} ADD CONSTRAINT {constraint_name} FOREIGN KEY ({fk_columns}) REFERENCES {ref_table} ({ref_columns});'
-                foreign_key_constraints.append(fk_sql)
-                
-                # Remove the constraint line from CREATE TABLE
-                # Just skip adding this line to current_table_lines
-                i += 1
+            # Detect CREATE TABLE statements; the splitter finds where each one
+            # ends, even with ';' or ');' inside defaults and comments
+            create_match = re.search(r'^CREATE TABLE IF NOT EXISTS\s+([\w"\.]+)', statement.text, re.IGNORECASE | re.MULTILINE)
+            if not create_match or statement_keyword(statement.text) != 'CREATE':
                 continue
             
-            # Check if table ends
-            if line.strip() == ');' or line.strip() == ')':
-                in_create_table = False
-                create_table_blocks.append((current_table, current_table_lines))
-                current_table = None
-                current_table_lines = []
+            current_table = create_match.group(1)
+            for line in statement.text[create_match.start():].split('\n'):
+                # Check if line has foreign key constraint
+                fk_match = re.search(r'CONSTRAINT\s+(\w+)\s+FOREIGN\s+KEY\s*\(([^)]+)\)\s+REFERENCES\s+([\w"\.]+)\s*\(([^)]+)\)', line, re.IGNORECASE)
+                if fk_match:
+                    constraint_name = fk_match.group(1)
+                    fk_columns = fk_match.group(2)
+                    ref_table = fk_match.group(3)
+                    ref_columns = fk_match.group(4)
+                    
+                    # Store the FK constraint to add later
+                    fk_sql = f'ALTER TABLE {current_table} ADD CONSTRAINT {constraint_name} FOREIGN KEY ({fk_columns}) REFERENCES {ref_table} ({ref_columns});'
+                    foreign_key_constraints.append(fk_sql)
+                    
+                    # Remove the constraint line from CREATE TABLE
+                    continue
+                if 'FOREIGN KEY' in line or 'REFERENCES' in line:
+                    # Remove this line (FK constraint)
+                    continue
+                create_table_lines.append(line)
+            create_table_lines.append('')
         
-        i += 1
-    
-    # Rebuild SQL
-    output_lines = []
-    
-    # Add schema creation
-    if sql_content.startswith('CREATE SCHEMA'):
-        # Extract header (schema creation, comments, etc.)
-        header_lines = []
-        for line in lines:
-            if re.match(r'^CREATE SCHEMA|^SET search_path', line, re.IGNORECASE):
-                header_lines.append(line)
-            elif line.strip().startswith('--') and not any('Table structure' in l for l in lines[lines.index(line):]):
-                header_lines.append(line)
-            else:
-                break
-        output_lines.extend(header_lines)
-        output_lines.append('')
-    
-    # Add all CREATE TABLE statements (without foreign keys)
-    for table_name, table_lines in create_table_blocks:
-        # Remove foreign key constraint lines from table definition
-        cleaned_lines = []
-        for line in table_lines:
-            if 'FOREIGN KEY' in line or 'REFERENCES' in line:
-                # Remove this line (FK constraint)
-                continue
-            cleaned_lines.append(line)
+        # Add schema creation
+        if head.startswith('CREATE SCHEMA'):
+            # Extract header (schema creation, comments, etc.)
+            yield from header_lines(head.split('\n'), table_structure)
+            yield ''
         
-        # Join and add to output
-        output_lines.extend(cleaned_lines)
-        output_lines.append('')
-    
-    # Add all ALTER TABLE statements for foreign keys at the end
-    if foreign_key_constraints:
-        output_lines.append('')
-        output_lines.append('-- Add Foreign Key Constraints')
-        output_lines.append('-- Foreign keys are added after all tables are created')
-        output_lines.append('')
-        output_lines.extend(foreign_key_constraints)
-    
-    return '\n'.join(output_lines)
+        # Add all CREATE TABLE statements (without foreign keys)
+        yield from create_table_lines
+        
+        # Add all ALTER TABLE statements for foreign keys at the end
+        if foreign_key_constraints:
+            yield ''
+            yield '-- Add Foreign Key Constraints'
+            yield '-- Foreign keys are added after all tables are created'
+            yield ''
+            yield from foreign_key_constraints
+
+def fix_foreign_key_order(sql_content, max_memory=None):
+    """
+    Extract foreign key constraints from CREATE TABLE statements
+    and add them separately at the end after all tables are created
+    """
+    return '\n'.join(iter_foreign_key_order(sql_content, max_memory))
 
 def main():
     parser = argparse.ArgumentParser(
@@ -114,29 +107,15 @@ def main():
     parser.add_argument('input_file', help='Input SQL schema file')
     parser.add_argument('-o', '--output', help='Output fixed SQL file')
     parser.add_argument('-v', '--verbose', action='store_true', help='Verbose output')
+    parser.add_argument('--max-memory', type=int, default=DEFAULT_MAX_MEMORY // (1024 * 1024),
+                        help='MB of table lines and foreign keys held in memory before they spill to a '
+                             'temporary file in $TMPDIR (default: 64)')
     
     args = parser.parse_args()
     
-    # Read input file
-    try:
-        with open(args.input_file, 'r', encoding='utf-8') as f:
-            sql_content = f.read()
-        
-        if args.verbose:
-            print(f"Read {len(sql_content)} characters from {args.input_file}")
-            
-    except FileNotFoundError:
+    if not os.path.exists(args.input_file):
         print(f"Error: File '{args.input_file}' not found")
         sys.exit(1)
-    except Exception as e:
-        print(f"Error reading file: {e}")
-        sys.exit(1)
-    
-    # Fix foreign key order
-    if args.verbose:
-        print("Extracting foreign key constraints...")
-    
-    fixed_content = fix_foreign_key_order(sql_content)
     
     # Determine output file
     if args.output:
@@ -147,12 +126,17 @@ def main():
         else:
             output_file = args.input_file + '_ordered.sql'
     
-    # Write output
+    # Fix foreign key order, reading the input a statement at a time
+    if args.verbose:
+        print(f"Reading {os.path.getsize(args.input_file):,} bytes from {args.input_file}")
+        print("Extracting foreign key constraints...")
+    
     try:
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(fixed_content)
+        with open(args.input_file, 'r', encoding='utf-8') as source, \
+                open(output_file, 'w', encoding='utf-8') as f:
+            for number, line in enumerate(iter_foreign_key_order(source, megabytes(args.max_memory))):
+                f.write(line if number == 0 else '\n' + line)
         
-        import os
         input_size = os.path.getsize(args.input_file)
         output_size = os.path.getsize(output_file)
         
@@ -4,16 +4,19 @@ Fix common PostgreSQL schema conversion issues
 Fixes SERIAL, bit types, foreign keys, DROP statements, etc.
 """
 
+import os
 import re
 import sys
 import argparse
 
-def fix_schema_issues(sql_content, schema_name='kulman'):
+from spill_buffer import DEFAULT_MAX_MEMORY, SpillBuffer, megabytes
+from sql_splitter import split_statements, statement_keyword
+
+def fix_statement_issues(content, schema_name='kulman'):
     """
-    Fix common MySQL to PostgreSQL conversion issues
+    Fix common MySQL to PostgreSQL conversion issues in one statement (the
+    fixes never look past the end of a statement)
     """
-    content = sql_content
-    
     # 1. Fix SERIAL syntax issues: bigint(20) NOT NULL SERIAL -> BIGSERIAL
     # Pattern: bigint(20) NOT NULL  SERIAL or bigint(20) NOT NULL SERIAL
     content = re.sub(
@@ -266,8 +269,11 @@ def fix_schema_issues(sql_content, schema_name='kulman'):
         flags=re.MULTILINE
     )
     
-    # 15. Fix trailing semicolons after closing parens
-    content = re.sub(r'\)\s*;', ');', content)
+    # 15. Fix trailing semicolons after closing parens (at statement ends only,
+    # not inside string defaults or comments)
+    content = ''.join(
+        re.sub(r'\)\s*;$', ');', statement.text) for statement in split_statements(content)
+    )
     
     # 16. Fix standalone UNIQUE keywords (invalid syntax)
     # Remove lines that contain only UNIQUE (possibly with trailing space)
@@ -314,109 +320,67 @@ def fix_schema_issues(sql_content, schema_name='kulman'):
         flags=re.IGNORECASE
     )
     
-    # 17. Remove foreign key constraints from CREATE TABLE and prepare for ALTER TABLE
-    # We'll comment them out and add them at the end
-    # Store FK constraints for later
-    fk_constraints = []
-    
-    def extract_fk(match):
-        full_match = match.group(0)
-        # Extract constraint name, columns, and referenced table
-        constraint_match = re.search(
-            r'CONSTRAINT\s+(\w+)\s+FOREIGN\s+KEY\s*\(([^)]+)\)\s+REFERENCES\s+([\w"\.]+)\s*\(([^)]+)\)',
-            full_match,
-            re.IGNORECASE
-        )
-        if constraint_match:
-            constraint_name = constraint_match.group(1)
-            fk_columns = constraint_match.group(2)
-            ref_table = constraint_match.group(3)
-            ref_columns = constraint_match.group(4)
-            
-            # Store for later (we'll need to find the table name)
-            fk_constraints.append({
-                'constraint': full_match,
-                'name': constraint_name,
-                'columns': fk_columns,
-                'ref_table': ref_table,
-                'ref_columns': ref_columns
-            })
-        return ''  # Remove from CREATE TABLE
-    
-    # Extract FKs - we'll handle this more carefully
-    # For now, just replace with comment that we'll add them later
-    # Pattern: CONSTRAINT name FOREIGN KEY (...) REFERENCES table (...)
-    lines = content.split('\n')
-    output_lines = []
-    current_table = None
-    in_create_table = False
-    
-    for i, line in enumerate(lines):
-        # Detect CREATE TABLE - handle quoted table names with spaces
-        # Match: CREATE TABLE IF NOT EXISTS kulman."Table Name" or kulman.table_name
-        create_match = re.search(r'CREATE TABLE IF NOT EXISTS\s+([\w\.]+\.)?("?[^"]+"?|[\w]+)', line, re.IGNORECASE)
-        if create_match:
-            schema_part = create_match.group(1) or ''
-            table_name = create_match.group(2)
-            current_table = f"{schema_part}{table_name}" if schema_part else table_name
-            in_create_table = True
-            output_lines.append(line)
-            continue
-        
-        if in_create_table:
-            # Track column definitions
-            # Check if this is a column definition (not PRIMARY KEY or CONSTRAINT)
-            if not line.strip().startswith('PRIMARY KEY') and not line.strip().startswith('CONSTRAINT') and not line.strip().startswith('UNIQUE'):
-                # Extract column name if it's a column definition
-                col_match = re.match(r'^\s+(?:"?([^"\s]+)"?|([^"\s]+))\s+(\w+)', line)
-                if col_match:
-                    # It's a column definition - we can track these later if needed
-                    pass
-            
-            # Check if this is a foreign key constraint line
-            if 'CONSTRAINT' in line and 'FOREIGN KEY' in line and 'REFERENCES' in line:
-                # Extract FK info - handle quoted column names
-                fk_match = re.search(
-                    r'CONSTRAINT\s+(\w+)\s+FOREIGN\s+KEY\s*\(([^)]+)\)\s+REFERENCES\s+([\w"\.]+)\s*\(([^)]+)\)',
-                    line,
-                    re.IGNORECASE
-                )
-                if fk_match and current_table:
-                    constraint_name = fk_match.group(1)
-                    fk_columns = fk_match.group(2)
-                    ref_table = fk_match.group(3)
-                    ref_columns = fk_match.group(4)
-                    # Store for adding at end
-                    fk_constraints.append({
-                        'table': current_table,
-                        'name': constraint_name,
-                        'columns': fk_columns,
-                        'ref_table': ref_table,
-                        'ref_columns': ref_columns
-                    })
-                    # Skip this line (don't add FK to CREATE TABLE)
+    return content
+
+def iter_fixed_schema(source, schema_name='kulman', max_memory=None):
+    """
+    Yield the fixed schema for source (SQL text, a path or a text file
+    object) a statement at a time. Foreign key constraints are moved out of
+    CREATE TABLE into ALTER TABLE statements at the end; they are collected
+    in a spill buffer, so max_memory (bytes) bounds the memory used whatever
+    the size of the schema.
+    """
+    with SpillBuffer(max_memory) as fk_constraints:
+        for original in split_statements(source):
+            # 1-16. Fix the statement, then
+            # 17. Remove foreign key constraints from CREATE TABLE; they are added at the end
+            for statement in split_statements(fix_statement_issues(original.text, schema_name)):
+                # Detect CREATE TABLE - handle quoted table names with spaces
+                # Match: CREATE TABLE IF NOT EXISTS kulman."Table Name" or kulman.table_name
+                create_match = re.search(r'CREATE TABLE IF NOT EXISTS\s+([\w\.]+\.)?("[^"]+"|[\w]+)', statement.text, re.IGNORECASE)
+                if not create_match or statement_keyword(statement.text) != 'CREATE':
+                    yield statement.text
                     continue
-            
-            # Check if table ends
-            if line.strip() == ');' or line.strip() == ')':
-                in_create_table = False
-                current_table = None
+                schema_part = create_match.group(1) or ''
+                table_name = create_match.group(2)
+                current_table = f"{schema_part}{table_name}" if schema_part else table_name
+                
+                table_lines = []
+                for line in statement.text.split('\n'):
+                    # Check if this is a foreign key constraint line
+                    if 'CONSTRAINT' in line and 'FOREIGN KEY' in line and 'REFERENCES' in line:
+                        # Extract FK info - handle quoted column names
+                        fk_match = re.search(
+                            r'CONSTRAINT\s+(\w+)\s+FOREIGN\s+KEY\s*\(([^)]+)\)\s+REFERENCES\s+([\w"\.]+)\s*\(([^)]+)\)',
+                            line,
+                            re.IGNORECASE
+                        )
+                        if fk_match:
+                            constraint_name = fk_match.group(1)
+                            fk_columns = fk_match.group(2)
+                            ref_table = fk_match.group(3)
+                            ref_columns = fk_match.group(4)
+                            # Store for adding at end
+                            fk_constraints.append(
+                                f"ALTER TABLE {current_table} ADD CONSTRAINT {constraint_name} FOREIGN KEY ({fk_columns}) "
+                                f"REFERENCES {ref_table} ({ref_columns});"
+                            )
+                            # Skip this line (don't add FK to CREATE TABLE)
+                            continue
+                    table_lines.append(line)
+                yield '\n'.join(table_lines)
         
-        output_lines.append(line)
-    
-    # Add FK constraints at the end
-    if fk_constraints:
-        output_lines.append('')
-        output_lines.append('-- Add Foreign Key Constraints')
-        output_lines.append('-- Foreign keys are added after all tables are created')
-        output_lines.append('')
-        for fk in fk_constraints:
-            alter_sql = f"ALTER TABLE {fk['table']} ADD CONSTRAINT {fk['name']} FOREIGN KEY ({fk['columns']}) REFERENCES {fk['ref_table']} ({fk['ref_columns']});"
-            output_lines.append(alter_sql)
-    
-    content = '\n'.join(output_lines)
-    
-    return content
+        # Add FK constraints at the end
+        if fk_constraints:
+            yield '\n\n-- Add Foreign Key Constraints\n-- Foreign keys are added after all tables are created\n'
+            for alter_sql in fk_constraints:
+                yield '\n' + alter_sql
+
+def fix_schema_issues(sql_content, schema_name='kulman', max_memory=None):
+    """
+    Fix common MySQL to PostgreSQL conversion issues
+    """
+    return ''.join(iter_fixed_schema(sql_content, schema_name, max_memory))
 
 def main():
     parser = argparse.ArgumentParser(
@@ -426,30 +390,15 @@ def main():
     parser.add_argument('-o', '--output', help='Output fixed schema file')
     parser.add_argument('--schema', default='kulman', help='Schema name (default: kulman)')
     parser.add_argument('-v', '--verbose', action='store_true', help='Verbose output')
+    parser.add_argument('--max-memory', type=int, default=DEFAULT_MAX_MEMORY // (1024 * 1024),
+                        help='MB of foreign key constraints held in memory before they spill to a '
+                             'temporary file in $TMPDIR (default: 64)')
     
     args = parser.parse_args()
     
-    # Read input file
-    try:
-        with open(args.input_file, 'r', encoding='utf-8') as f:
-            sql_content = f.read()
-        
-        if args.verbose:
-            print(f"Read {len(sql_content)} characters from {args.input_file}")
-            
-    except FileNotFoundError:
+    if not os.path.exists(args.input_file):
         print(f"Error: File '{args.input_file}' not found")
         sys.exit(1)
-    except Exception as e:
-        print(f"Error reading file: {e}")
-        sys.exit(1)
-    
-    # Fix issues
-    if args.verbose:
-        print(f"Fixing schema issues...")
-        print(f"  Schema: {args.schema}")
-    
-    fixed_content = fix_schema_issues(sql_content, args.schema)
     
     # Determine output file
     if args.output:
@@ -460,12 +409,17 @@ def main():
         else:
             output_file = args.input_file + '_fixed.sql'
     
-    # Write output
+    # Fix issues, reading the input a statement at a time
+    if args.verbose:
+        print(f"Reading {os.path.getsize(args.input_file):,} bytes from {args.input_file}")
+        print(f"Fixing schema issues...")
+        print(f"  Schema: {args.schema}")
+    
     try:
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(fixed_content)
+        with open(args.input_file, 'r', encoding='utf-8') as source, \
+                open(output_file, 'w', encoding='utf-8') as f:
+            f.writelines(iter_fixed_schema(source, args.schema, megabytes(args.max_memory)))
         
-        import os
         input_size = os.path.getsize(args.input_file)
         output_size = os.path.getsize(output_file)
         
@@ -0,0 +1,467 @@
+#!/usr/bin/env python3
+"""
+Parallel PostgreSQL Loader
+Loads the COPY chunk files written by convert_mysql_to_postgresql.py --copy-dir
+over a pool of connections, largest tables first, with a limit on tables in
+flight, per-table retries and a timing report. A table waits (without
+taking a slot) until the tables its foreign keys reference have loaded. Session settings recorded in
+the manifest (--fast-load) are applied to every connection, and its
+post-load scripts (index build, SET LOGGED) run once all tables loaded,
+followed by the VACUUM (ANALYZE) streams, in parallel, and the final
+ANALYZE of partitioned tables.
+
+Uses asyncpg if installed, otherwise psycopg (3.x) async. Chunks written
+with --compress (.gz, .zst) are decompressed while they are sent.
+
+asyncio, the drivers and the converter are imported inside the functions
+that use them; importing asyncio alone would triple the time --help takes.
+"""
+
+import os
+import sys
+import time
+import argparse
+from contextlib import asynccontextmanager
+
+from output_writer import open_compressed
+
+COPY_READ_SIZE = 1024 * 1024
+
+class AsyncpgConnection:
+    """
+    asyncpg connection wrapped to the small interface the loader needs
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    async def execute(self, sql):
+        await self.conn.execute(sql)
+
+    async def fetch(self, sql):
+        return [tuple(record) for record in await self.conn.fetch(sql)]
+
+    async def execute_autocommit(self, sql):
+        # asyncpg runs statements outside a transaction unless asked otherwise
+        await self.conn.execute(sql)
+
+    async def copy_file(self, schema, table, columns, path):
+        # Chunks written with --compress are read through a decompressing file object
+        with open_compressed(path) as f:
+            async with self.conn.transaction():
+                await self.conn.copy_to_table(
+                    table, source=f, columns=columns, schema_name=schema or None, format='text'
+                )
+
+class AsyncpgPool:
+    def __init__(self, dsn, size):
+        self.dsn = dsn
+        self.size = size
+        self.pool = None
+
+    async def open(self):
+        import asyncpg
+        self.pool = await asyncpg.create_pool(self.dsn, min_size=1, max_size=self.size)
+
+    @asynccontextmanager
+    async def acquire(self):
+        async with self.pool.acquire() as conn:
+            yield AsyncpgConnection(conn)
+
+    async def close(self):
+        await self.pool.close()
+
+class PsycopgConnection:
+    """
+    psycopg async connection wrapped to the small interface the loader needs
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    async def execute(self, sql):
+        try:
+            await self.conn.execute(sql)
+            await self.conn.commit()
+        except BaseException:
+            # Leave the connection usable for the next statement
+            await self.conn.rollback()
+            raise
+
+    async def fetch(self, sql):
+        try:
+            cursor = await self.conn.execute(sql)
+            rows = await cursor.fetchall()
+            await self.conn.commit()
+        except BaseException:
+            await self.conn.rollback()
+            raise
+        return rows
+
+    async def execute_autocommit(self, sql):
+        """
+        Run a statement that cannot run in a transaction block (VACUUM)
+        """
+        await self.conn.set_autocommit(True)
+        try:
+            await self.conn.execute(sql)
+        finally:
+            await self.conn.set_autocommit(False)
+
+    async def copy_file(self, schema, table, columns, path):
+        import asyncio
+        from mysql_to_postgresql import quote_identifier
+        target = f'{quote_identifier(schema)}.{quote_identifier(table)}' if schema else quote_identifier(table)
+        column_list = f' ({", ".join(quote_identifier(c) for c in columns)})' if columns else ''
+        try:
+            async with self.conn.cursor() as cur:
+                async with cur.copy(f'COPY {target}{column_list} FROM STDIN') as copy:
+                    with open_compressed(path) as f:
+                        while True:
+                            data = await asyncio.to_thread(f.read, COPY_READ_SIZE)
+                            if not data:
+                                break
+                            await copy.write(data)
+            await self.conn.commit()
+        except BaseException:
+            await self.conn.rollback()
+            raise
+
+class PsycopgPool:
+    """
+    Fixed-size pool of psycopg async connections
+    """
+
+    def __init__(self, dsn, size):
+        import asyncio
+        self.dsn = dsn
+        self.size = size
+        self.idle = asyncio.Queue()
+        self.connections = []
+
+    async def open(self):
+        import psycopg
+        for _ in range(self.size):
+            conn = await psycopg.AsyncConnection.connect(self.dsn)
+            self.connections.append(conn)
+            self.idle.put_nowait(conn)
+
+    @asynccontextmanager
+    async def acquire(self):
+        conn = await self.idle.get()
+        try:
+            yield PsycopgConnection(conn)
+        finally:
+            self.idle.put_nowait(conn)
+
+    async def close(self):
+        for conn in self.connections:
+            await conn.close()
+
+def create_pool(dsn, size):
+    """
+    Pick the installed driver; imported lazily so --help works without either
+    """
+    try:
+        import asyncpg  # noqa: F401
+        return AsyncpgPool(dsn, size)
+    except ImportError:
+        pass
+    try:
+        import psycopg  # noqa: F401
+        return PsycopgPool(dsn, size)
+    except ImportError:
+        raise RuntimeError('Install asyncpg or psycopg (3.x) to load into PostgreSQL')
+
+def plan_tables(manifest, only=None):
+    """
+    Order tables largest first so the longest load starts immediately
+    """
+    tables = []
+    for table, entry in manifest['tables'].items():
+        if only and table not in only:
+            continue
+        size = sum(chunk['bytes'] for chunk in entry['chunks'])
+        tables.append((table, entry, size))
+    tables.sort(key=lambda item: item[2], reverse=True)
+    return tables
+
+def table_dependencies(manifest, tables):
+    """
+    {table: manifest tables it must wait for} among the tables being loaded:
+    the tables (or partitions of the tables) its foreign keys reference, as
+    recorded in the manifest. Tables in a foreign key cycle cannot wait for
+    each other and are returned as the second value.
+    """
+    members = {}
+    for name in tables:
+        members.setdefault(manifest['tables'][name].get('partition_of', name), []).append(name)
+    waits = {
+        name: {member for referenced in manifest['tables'][name].get('references', [])
+               for member in members.get(referenced, [])}
+        for name in tables
+    }
+
+    remaining = dict(waits)
+    done = set()
+    while True:
+        ready = [name for name, parents in remaining.items() if parents <= done]
+        if not ready:
+            break
+        done.update(ready)
+        for name in ready:
+            del remaining[name]
+    for name in remaining:
+        waits[name] -= set(remaining)
+    return waits, sorted(remaining)
+
+def session_statements(manifest):
+    """
+    SET statements for the session settings recorded in the manifest
+    """
+    return [f"SET {name} = '{value}'" for name, value in manifest.get('session', {}).items()]
+
+def table_timing(entry):
+    return {
+        'rows': sum(c['rows'] for c in entry['chunks']),
+        'bytes': sum(c['bytes'] for c in entry['chunks']),
+        'chunks': len(entry['chunks']),
+        'attempts': 0,
+        'seconds': 0.0,
+        'status': 'pending',
+        'error': None,
+    }
+
+async def load_table(pool, schema, copy_dir, table, entry, retries, table_slots, log, session=()):
+    """
+    Load every chunk of one table concurrently, one transaction per chunk.
+    Committed chunks are remembered, so a retry only reloads failed chunks.
+    A table whose foreign keys reference itself loads one chunk at a time
+    (see copy_in_order).
+    """
+    import asyncio
+    timing = table_timing(entry)
+    pending = list(entry['chunks'])
+
+    async def copy_chunk(chunk):
+        async with pool.acquire() as conn:
+            for statement in session:
+                await conn.execute(statement)
+            await conn.copy_file(schema, table, entry.get('columns'), os.path.join(copy_dir, chunk['file']))
+
+    async def copy_in_order(chunks):
+        # Rows can reference rows of another chunk, before or after their own:
+        # one chunk at a time in dump order, then the chunks that failed
+        # again, as long as a pass loads any
+        results = {}
+        remaining = chunks
+        while remaining:
+            for chunk in remaining:
+                try:
+                    await copy_chunk(chunk)
+                    results[chunk['file']] = None
+                except Exception as e:
+                    results[chunk['file']] = e
+            failed = [chunk for chunk in remaining if results[chunk['file']] is not None]
+            if len(failed) == len(remaining):
+                break
+            remaining = failed
+        return [results[chunk['file']] for chunk in chunks]
+
+    async with table_slots:
+        started = time.perf_counter()
+        while pending and timing['attempts'] <= retries:
+            if timing['attempts']:
+                await asyncio.sleep(min(2 ** timing['attempts'], 30))
+                log(f"  Retrying {table} ({len(pending)} chunk(s), attempt {timing['attempts'] + 1})")
+            timing['attempts'] += 1
+            if entry.get('self_reference'):
+                results = await copy_in_order(pending)
+            else:
+                results = await asyncio.gather(*(copy_chunk(chunk) for chunk in pending), return_exceptions=True)
+            failed = []
+            for chunk, result in zip(pending, results):
+                if isinstance(result, BaseException):
+                    failed.append(chunk)
+                    timing['error'] = f'{chunk["file"]}: {result}'
+            pending = failed
+        timing['seconds'] = round(time.perf_counter() - started, 3)
+        timing['status'] = 'failed' if pending else 'loaded'
+
+    log(f"  {timing['status']:<7} {table} ({timing['rows']:,} rows, {timing['seconds']:.2f}s)")
+    return table, timing
+
+async def load_copy_dir(copy_dir, pool, schema=None, max_tables=4, retries=2, only=None, log=print):
+    """
+    Load all tables from a --copy-dir manifest through the given pool.
+    A table starts once the tables it references are loaded; if one of them
+    fails, the table is not loaded and fails too.
+    The pool only needs acquire() yielding an object with copy_file() and
+    execute(), so a stub can stand in for PostgreSQL.
+    Returns {table: timing}.
+    """
+    import asyncio
+    import json
+    with open(os.path.join(copy_dir, 'manifest.json'), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    schema = schema or manifest.get('schema')
+    table_slots = asyncio.Semaphore(max(1, max_tables))
+    session = session_statements(manifest)
+    plan = plan_tables(manifest, only)
+    waits, cycle = table_dependencies(manifest, [table for table, _, _ in plan])
+    if cycle:
+        log(f"  Warning: foreign keys form a cycle between {', '.join(cycle)}; they load without waiting for each other")
+    finished = {table: asyncio.Event() for table, _, _ in plan}
+    statuses = {}
+
+    async def load_after_references(table, entry):
+        try:
+            for parent in waits[table]:
+                await finished[parent].wait()
+            failed = sorted(parent for parent in waits[table] if statuses[parent] != 'loaded')
+            if failed:
+                timing = table_timing(entry)
+                timing['status'] = 'failed'
+                timing['error'] = f"not loaded: referenced table {', '.join(failed)} did not load"
+                log(f"  skipped {table} ({', '.join(failed)} did not load)")
+                result = table, timing
+            else:
+                result = await load_table(pool, schema, copy_dir, table, entry, retries, table_slots, log, session)
+            statuses[table] = result[1]['status']
+            return result
+        finally:
+            finished[table].set()
+
+    return dict(await asyncio.gather(*(load_after_references(table, entry) for table, entry, _ in plan)))
+
+async def run_post_load(copy_dir, pool, log=print):
+    """
+    Run the manifest's post-load scripts statement by statement on one
+    connection, in order. Returns {script: seconds}; stops at the first
+    failing statement.
+    """
+    from sql_splitter import split_statements
+    import json
+    with open(os.path.join(copy_dir, 'manifest.json'), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    timings = {}
+    async with pool.acquire() as conn:
+        for statement in session_statements(manifest):
+            await conn.execute(statement)
+        for script in manifest.get('post_load', []):
+            started = time.perf_counter()
+            with open(os.path.join(copy_dir, script), 'r', encoding='utf-8') as f:
+                sql = f.read()
+            for statement in split_statements(sql, dialect='postgresql'):
+                text = statement.text.strip()
+                if text and not all(line.lstrip().startswith('--') or not line.strip() for line in text.split('\n')):
+                    await conn.execute(text)
+            timings[script] = round(time.perf_counter() - started, 3)
+            log(f"  ran     {script} ({timings[script]:.2f}s)")
+    return timings
+
+async def run_maintenance(copy_dir, pool, log=print):
+    """
+    Run the manifest's maintenance streams (VACUUM (ANALYZE) per table,
+    largest first) in parallel, one connection per stream, then its final
+    script.
+    Returns {script: seconds}.
+    """
+    import asyncio
+    import json
+    with open(os.path.join(copy_dir, 'manifest.json'), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    async def run_stream(script):
+        with open(os.path.join(copy_dir, script), 'r', encoding='utf-8') as f:
+            statements = [line.strip() for line in f if line.strip() and not line.startswith('--')]
+        async with pool.acquire() as conn:
+            started = time.perf_counter()
+            for statement in statements:
+                await conn.execute_autocommit(statement)
+            seconds = round(time.perf_counter() - started, 3)
+        log(f"  ran     {script} ({len(statements)} statements, {seconds:.2f}s)")
+        return script, seconds
+
+    timings = dict(await asyncio.gather(*(run_stream(script) for script in manifest.get('maintenance', []))))
+    if manifest.get('maintenance_final'):
+        # ANALYZE of partitioned tables, once their partitions are vacuumed
+        script, seconds = await run_stream(manifest['maintenance_final'])
+        timings[script] = seconds
+    return timings
+
+async def run(args):
+    pool = create_pool(args.dsn, args.connections)
+    await pool.open()
+    try:
+        timings = await load_copy_dir(
+            args.copy_dir, pool, args.schema, args.max_tables, args.retries,
+            set(args.tables) if args.tables else None
+        )
+        # Post-load work needs every table, so it waits for a complete load
+        if not args.tables and all(t['status'] == 'loaded' for t in timings.values()):
+            if args.post_load:
+                await run_post_load(args.copy_dir, pool)
+            if args.maintenance:
+                await run_maintenance(args.copy_dir, pool)
+        return timings
+    finally:
+        await pool.close()
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Load COPY chunk files from convert_mysql_to_postgresql.py --copy-dir into PostgreSQL in parallel'
+    )
+    parser.add_argument('copy_dir', help='Directory with manifest.json and COPY chunk files')
+    parser.add_argument('--dsn', default=os.environ.get('DATABASE_URL'),
+                        help='PostgreSQL connection string (default: $DATABASE_URL)')
+    parser.add_argument('--schema', help='Target schema (default: the schema recorded in the manifest)')
+    parser.add_argument('-c', '--connections', type=int, default=8, help='Connection pool size (default: 8)')
+    parser.add_argument('--max-tables', type=int, default=4, help='Tables loading at the same time (default: 4)')
+    parser.add_argument('--retries', type=int, default=2, help='Retries per table for failed chunks (default: 2)')
+    parser.add_argument('--tables', nargs='+', help='Only load these tables')
+    parser.add_argument('--post-load', action=argparse.BooleanOptionalAction, default=True,
+                        help="Run the manifest's post-load scripts after a complete load (default: on)")
+    parser.add_argument('--maintenance', action=argparse.BooleanOptionalAction, default=True,
+                        help="Run the manifest's VACUUM (ANALYZE) streams after a complete load (default: on)")
+    parser.add_argument('--timings-json', help='Write per-table timings to this JSON file')
+
+    args = parser.parse_args()
+
+    if not args.dsn:
+        print("Error: no connection string (use --dsn or set DATABASE_URL)")
+        sys.exit(1)
+    if not os.path.exists(os.path.join(args.copy_dir, 'manifest.json')):
+        print(f"Error: '{args.copy_dir}' has no manifest.json (run convert_mysql_to_postgresql.py --copy-dir first)")
+        sys.exit(1)
+
+    import asyncio
+    started = time.perf_counter()
+    try:
+        timings = asyncio.run(run(args))
+    except Exception as e:
+        print(f"Error loading data: {e}")
+        sys.exit(1)
+    elapsed = time.perf_counter() - started
+
+    failed = [table for table, timing in timings.items() if timing['status'] != 'loaded']
+    total_rows = sum(timing['rows'] for timing in timings.values())
+    total_bytes = sum(timing['bytes'] for timing in timings.values())
+
+    print(f"\n[OK] Load complete!" if not failed else f"\n[FAILED] {len(failed)} table(s) did not load")
+    print(f"  Tables: {len(timings)}  Rows: {total_rows:,}  Time: {elapsed:.1f}s "
+          f"({total_bytes / (1024 * 1024) / max(elapsed, 1e-6):.1f} MB/s)")
+    for table in failed:
+        print(f"  {table}: {timings[table]['error']}")
+
+    if args.timings_json:
+        import json
+        with open(args.timings_json, 'w', encoding='utf-8') as f:
+            json.dump({'elapsed_seconds': round(elapsed, 3), 'tables': timings}, f, indent=2)
+        print(f"  Timings: {args.timings_json}")
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
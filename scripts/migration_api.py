@@ -0,0 +1,186 @@
+"""
+Migration API
+Importable, streaming interface to the MySQL to PostgreSQL conversion for
+jobs that embed it. Every step takes an iterable and returns a generator,
+so a dump flows through one statement at a time, without temporary files
+and without loading the whole dump:
+
+    import sys
+    sys.path.insert(0, 'scripts')
+    from migration_api import iter_statements, convert
+
+    with open('mifos_postgresql.sql', 'w', encoding='utf-8') as out:
+        out.writelines(convert(iter_statements('mifos.sql'), schema='mifos'))
+
+Sources are paths, binary or text file objects, bytes or str, or any
+iterable of bytes/str chunks (a decompressor, an HTTP response, a socket).
+The steps chain:
+
+    iter_statements(source)          MySQL statements (str)
+    extract_schema(statements)       only the DDL
+    convert(statements, schema)      PostgreSQL DDL, data as COPY blocks
+    to_copy(statements, schema)      only the data, as COPY blocks
+    fix_schema(statements, schema)   fix_postgres_schema.py fixes
+    order_foreign_keys(statements)   fix_foreign_keys_order.py reordering
+
+The CLI scripts use the same functions. Whole-schema options of
+convert_mysql_to_postgresql.py (--optimize-layout, --partition,
+--fast-load) and the parallel --copy-dir conversion need the complete
+schema or random access to the file, so they stay in that script.
+"""
+
+from itertools import groupby
+
+from sql_splitter import iter_chunks, split_leading, split_statements, statement_keyword
+
+DATA_KEYWORDS = ('INSERT', 'REPLACE')
+
+def iter_statements(source, dialect='mysql', encoding='utf-8', row_group_size=None):
+    """
+    Yield the statements of source as str, each with the comments and
+    whitespace in front of it, so joining them gives back the input.
+    Bytes are decoded with errors='surrogateescape', so invalid bytes pass
+    through unchanged when the output is encoded the same way.
+    row_group_size (bytes, MySQL only): an INSERT longer than this comes out
+    as several INSERTs of whole rows with the same header (see
+    mysql_to_postgresql.iter_row_groups), so no statement is held
+    whole; joining them no longer gives back the input.
+    """
+    if row_group_size:
+        from mysql_to_postgresql import iter_row_groups
+        chunks = (chunk.encode(encoding, errors='surrogateescape') if isinstance(chunk, str) else chunk
+                  for chunk in iter_chunks(source))
+        statements = iter_row_groups(chunks, row_group_size)
+    else:
+        statements = split_statements(source, dialect=dialect)
+    for statement in statements:
+        text = statement.text
+        if isinstance(text, bytes):
+            text = text.decode(encoding, errors='surrogateescape')
+        yield text
+
+def is_data_statement(statement):
+    return statement_keyword(statement) in DATA_KEYWORDS
+
+def extract_schema(statements, stats=None):
+    """
+    Keep the DDL statements (see extract_schema.py), dropping data, LOCK
+    TABLES and session settings
+    """
+    from extract_schema import skip_reason
+    for statement in statements:
+        reason = skip_reason(statement)
+        if reason is None:
+            yield statement
+        elif stats is not None:
+            stats.count_rule(f'skip:{getattr(reason, "pattern", reason)}')
+
+def to_copy(statements, schema=None, stats=None):
+    """
+    COPY ... FROM stdin blocks (psql input format) for the INSERT statements;
+    consecutive INSERTs into the same table and columns share one block.
+    Other statements are skipped. Rows are converted from bytes as in the
+    --copy-dir workers (see stream_insert_to_copy), so an INSERT costs about
+    twice its size in memory.
+    """
+    import time
+    from io import BytesIO
+    from mysql_to_postgresql import (
+        INSERT_HEADER, insert_columns, insert_values_start, quote_identifier, stream_insert_to_copy
+    )
+    open_block = None
+    for statement in statements:
+        started = time.perf_counter()
+        if isinstance(statement, str):
+            statement = statement.encode('utf-8', errors='surrogateescape')
+        positions = insert_values_start(statement)
+        if positions is None:
+            continue
+        header = INSERT_HEADER.match(statement[positions[0]:positions[1]].decode('utf-8', errors='surrogateescape'))
+        table_name, columns = header.group(1), insert_columns(header)
+        block = (table_name, tuple(columns) if columns else None)
+        if block != open_block:
+            if open_block is not None:
+                yield '\\.\n\n'
+            target = f'{schema}.{quote_identifier(table_name)}' if schema else quote_identifier(table_name)
+            column_list = f" ({', '.join(quote_identifier(column) for column in columns)})" if columns else ''
+            yield f'COPY {target}{column_list} FROM stdin;\n'
+            open_block = block
+        lines = BytesIO()
+        rows, _, bytes_out = stream_insert_to_copy(statement, positions[1], lines.write, checksums=False)
+        yield lines.getvalue().decode('utf-8', errors='surrogateescape')
+        if stats is not None:
+            stats.add_table(table_name, statements=1, rows=rows, bytes_in=len(statement), bytes_out=bytes_out,
+                            seconds=time.perf_counter() - started)
+    if open_block is not None:
+        yield '\\.\n\n'
+
+def convert(statements, schema='mifos', rules=None, data='copy', stats=None):
+    """
+    Convert MySQL statements to PostgreSQL, yielding the output in pieces.
+    DDL goes through the converter's rules one statement at a time; each
+    enum type is created just before the first table that uses it, and the
+    CREATE INDEX statements come last, after the data.
+    rules: extra (name, pattern, replacement[, flags]) rewrites applied to
+    every converted statement after the built-in ones, counted in stats
+    like those.
+    data: 'copy' (COPY blocks, see to_copy), 'insert' (INSERT statements
+    converted by the same rules as the DDL) or 'skip'.
+    """
+    from mysql_to_postgresql import (
+        apply_rule, convert_mysql_to_postgresql, enum_type_statements, index_statements, qualify_tables,
+        schema_header
+    )
+    if data not in ('copy', 'insert', 'skip'):
+        raise ValueError(f"data must be 'copy', 'insert' or 'skip', not {data!r}")
+    rules = list(rules or [])
+    enum_types = {}
+    indexes = []
+    index_names = set()      # index names are unique per schema, not per table
+
+    def convert_statement(statement):
+        known = len(enum_types)
+        sql = convert_mysql_to_postgresql(statement, stats=stats, enum_types=enum_types, indexes=indexes,
+                                          index_names=index_names)
+        for rule, pattern, replacement, *flags in rules:
+            sql = apply_rule(rule, pattern, replacement, sql, flags[0] if flags else 0, stats)
+        if schema:
+            sql = qualify_tables(sql, schema)
+        if len(enum_types) > known:
+            leading, body = split_leading(sql)
+            new_types = dict(list(enum_types.items())[known:])
+            sql = leading + ''.join(enum_type_statements(new_types, schema)) + body
+        return sql
+
+    if schema:
+        yield schema_header(schema)
+    for is_data, group in groupby(statements, key=is_data_statement):
+        if not is_data:
+            for statement in group:
+                yield convert_statement(statement)
+        elif data == 'copy':
+            yield '\n'
+            yield from to_copy(group, schema, stats)
+        elif data == 'insert':
+            for statement in group:
+                yield convert_statement(statement)
+    if indexes:
+        yield "\n-- Indexes\n"
+        yield from index_statements(indexes, schema)
+
+def fix_schema(statements, schema='kulman', max_memory=None):
+    """
+    fix_postgres_schema.py fixes for converted statements (foreign keys
+    move to ALTER TABLE statements at the end)
+    """
+    from fix_postgres_schema import iter_fixed_schema
+    return iter_fixed_schema(statements, schema, max_memory)
+
+def order_foreign_keys(statements, max_memory=None):
+    """
+    fix_foreign_keys_order.py: CREATE TABLE statements without their
+    foreign keys, then the foreign keys as ALTER TABLE statements. Yields
+    lines without their line breaks.
+    """
+    from fix_foreign_keys_order import iter_foreign_key_order
+    return iter_foreign_key_order(statements, max_memory)
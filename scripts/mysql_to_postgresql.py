@@ -0,0 +1,2219 @@
+"""
+MySQL to PostgreSQL Conversion
+The conversion behind convert_mysql_to_postgresql.py, which holds only the
+command line, and the helpers the other migration scripts import from it
+"""
+
+import re
+import os
+import sys
+import time
+import binascii
+
+from conversion_stats import ConversionStats, new_table_stats
+from progress import ProgressReporter, SharedProgress
+from output_writer import COMPRESSION_SUFFIXES, OutputWriter, with_suffix
+from reorder_buffer import DEFAULT_MAX_MEMORY, ReorderBuffer
+from sql_splitter import (
+    DEFAULT_READ_SIZE, POSSESSIVE, Statement, StatementSplitter, split_leading, split_statements, statement_keyword
+)
+
+class LazyPattern:
+    """
+    re.compile() arguments, compiled on first use: --help and the scripts
+    that import a helper or two from here never compile the conversion's
+    patterns (see check_startup.py). Attributes are kept once looked up, so
+    later calls cost what they cost on the compiled pattern.
+    """
+    
+    def __init__(self, pattern, flags=0):
+        self.args = (pattern, flags)
+    
+    def __getattr__(self, name):
+        if 'compiled' not in self.__dict__:
+            self.compiled = re.compile(*self.args)
+        value = getattr(self.compiled, name)
+        setattr(self, name, value)
+        return value
+
+# INSERT statement header: table name and optional column list
+INSERT_HEADER = LazyPattern(
+    r'(?:INSERT|REPLACE)\s+(?:IGNORE\s+)?INTO\s+`?(\w+)`?\s*(?:\(([^)]*)\)\s*)?VALUES\s*',
+    re.IGNORECASE
+)
+
+# Tokens inside a VALUES list: quoted string (with its _binary introducer),
+# bit literal, bare literal or punctuation
+ROW_TOKEN = LazyPattern(
+    r"""(_binary\s*)?'((?:[^'\\]|\\.|'')*)'|[bB]'([01]*)'|([^,()\s']+)|([(),])""",
+    re.DOTALL
+)
+# The same on bytes, with the string unrolled so a long one matches quickly
+ROW_TOKEN_BYTES = LazyPattern((
+    r"""(_binary\s*)?'([^'\\]*{p}(?:(?:\\[\s\S]|'')[^'\\]*{p})*{p})'|[bB]'([01]*)'|([^,()\s']+)|([(),])"""
+).format(p=POSSESSIVE).encode())
+
+# MySQL string escapes mapped to PostgreSQL COPY text escapes
+MYSQL_TO_COPY_ESCAPES = {
+    '\\0': '',          # PostgreSQL text cannot hold NUL
+    "\\'": "'",
+    '\\"': '"',
+    '\\b': '\\b',
+    '\\n': '\\n',
+    '\\r': '\\r',
+    '\\t': '\\t',
+    '\\Z': '\x1a',
+    '\\\\': '\\\\',
+    '\\%': '\\\\%',    # MySQL keeps the backslash for LIKE escapes
+    '\\_': '\\\\_',
+    "''": "'",
+    '\t': '\\t',
+    '\n': '\\n',
+    '\r': '\\r',
+}
+MYSQL_ESCAPE_PATTERN = LazyPattern(r"\\.|''|[\t\n\r]", re.DOTALL)
+
+# MySQL string escapes mapped to the plain characters they stand for
+MYSQL_TO_TEXT_ESCAPES = {
+    '\\0': '',          # PostgreSQL text cannot hold NUL
+    '\\b': '\b',
+    '\\n': '\n',
+    '\\r': '\r',
+    '\\t': '\t',
+    '\\Z': '\x1a',
+    '\\%': '\\%',
+    '\\_': '\\_',
+    "''": "'",
+}
+MYSQL_TEXT_ESCAPE_PATTERN = LazyPattern(r"\\.|''", re.DOTALL)
+
+# MySQL string escapes in binary strings mapped to the bytes they stand for
+# (any other escaped byte stands for itself)
+MYSQL_TO_BINARY_ESCAPES = {
+    b'0': b'\x00',
+    b'b': b'\x08',
+    b'n': b'\n',
+    b'r': b'\r',
+    b't': b'\t',
+    b'Z': b'\x1a',
+    b'%': b'\\%',
+    b'_': b'\\_',
+}
+MYSQL_BINARY_ESCAPE_PATTERN = LazyPattern(rb"\\([\s\S])|''")
+
+# INSERTs at least this big that hold hex or _binary literals (documents and
+# images) are converted from bytes with the literals streamed in pieces of
+# BLOB_CHUNK_SIZE, see stream_insert_to_copy
+BLOB_STREAM_MIN = 1024 * 1024
+BLOB_CHUNK_SIZE = 256 * 1024
+BINARY_LITERAL = LazyPattern(rb"[(,]\s*(?:0[xX][0-9A-Fa-f]|_binary\s*')")
+# Whole escapes and doubled quotes of a binary string, up to the endpos given
+BINARY_STRING_RUN = LazyPattern(r"(?:[^\\']+{p}|\\[\s\S]|'')*{p}".format(p=POSSESSIVE).encode())
+
+# CREATE TABLE statement in a MySQL dump: table name and body
+CREATE_TABLE_BLOCK = LazyPattern(
+    r'CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?`?(\w+)`?\s*\((.*?)\n\)[^;]*;',
+    re.IGNORECASE | re.DOTALL
+)
+
+# ENUM column in a CREATE TABLE body: name and value list. The column's
+# character set and collation go with it; native enums have neither.
+ENUM_COLUMN = LazyPattern(
+    r"^([ \t]*)(`[^`]+`|\w+)\s+enum\s*\((\s*'(?:[^'\\]|\\.|'')*'(?:\s*,\s*'(?:[^'\\]|\\.|'')*')*\s*)\)"
+    r"(?:\s+CHARACTER\s+SET\s+\w+)?(?:\s+COLLATE\s+\w+)?",
+    re.IGNORECASE | re.MULTILINE
+)
+ENUM_VALUE = LazyPattern(r"'((?:[^'\\]|\\.|'')*)'", re.DOTALL)
+
+# (size, alignment) in PostgreSQL of MySQL column types once converted;
+# types not listed are variable length. tinyint(1) and bit(1) become boolean.
+FIXED_WIDTH_TYPES = {
+    'bigint': (8, 8), 'double': (8, 8), 'real': (8, 8), 'float': (8, 8),
+    'datetime': (8, 8), 'timestamp': (8, 8), 'time': (8, 8),
+    'int': (4, 4), 'integer': (4, 4), 'mediumint': (4, 4), 'date': (4, 4), 'enum': (4, 4),
+    'smallint': (2, 2), 'year': (2, 2), 'tinyint': (2, 2),
+    'bool': (1, 1), 'boolean': (1, 1),
+}
+COLUMN_LINE = LazyPattern(r'^\s*(`[^`]+`|\w+)\s+(\w+)\s*(?:\(\s*(\d+))?')
+NON_COLUMN_KEYWORDS = {'PRIMARY', 'KEY', 'INDEX', 'UNIQUE', 'FULLTEXT', 'SPATIAL', 'CONSTRAINT', 'FOREIGN', 'CHECK'}
+
+# Secondary index in a CREATE TABLE body, up to the key part list
+INDEX_DEFINITION = LazyPattern(
+    r'(?:(UNIQUE|FULLTEXT|SPATIAL)\s+(?:(?:KEY|INDEX)\b\s*)?|(?:KEY|INDEX)\b\s*)'
+    r'(?!USING\b)(`[^`]+`|\w+)?\s*(?:USING\s+\w+\s*)?\(',
+    re.IGNORECASE
+)
+KEY_PART = LazyPattern(r'^(`[^`]+`|\w+)\s*(?:\(\s*(\d+)\s*\))?\s*(ASC|DESC)?$', re.IGNORECASE)
+FOREIGN_KEY_DEFINITION = LazyPattern(
+    r'(?:CONSTRAINT\s+(`[^`]+`|\w+)\s+)?FOREIGN\s+KEY\s*(?:`[^`]+`\s*|\w+\s*)?\(([^)]*)\)\s*REFERENCES\s+(`[^`]+`|\w+)',
+    re.IGNORECASE
+)
+BINARY_TYPES = {'binary', 'varbinary', 'tinyblob', 'blob', 'mediumblob', 'longblob'}
+
+# Text search configuration of FULLTEXT indexes. MySQL does not stem words,
+# nor does 'simple'. Queries must use the same to_tsvector expression to
+# use the index.
+FULLTEXT_CONFIG = 'simple'
+
+# Row events in `mysqlbinlog --base64-output=DECODE-ROWS -v` output
+BINLOG_EVENT = LazyPattern(r'^### (INSERT INTO|UPDATE|DELETE FROM) (?:`?\w+`?\.)?`?(\w+)`?\s*$')
+BINLOG_VALUE = LazyPattern(r'^###\s+@(\d+)=(.*?)(?:\s*/\*.*\*/)?\s*$')
+
+DEFAULT_SYNC_BATCH_SIZE = 500
+
+DEFAULT_CHUNK_SIZE = 64 * 1024 * 1024
+
+# Write buffer per open COPY chunk file (a worker has one per table in its range)
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# An INSERT still open after this many bytes is converted in groups of whole
+# rows rather than held until its end (a dump's INSERT lines can be GBs long)
+DEFAULT_ROW_GROUP_SIZE = 16 * 1024 * 1024
+
+# One complete row of a VALUES list and the comma after it. Unrolled so a row
+# cut off at the end of the buffer fails in linear time, and possessive so it
+# fails without giving back a (blob-sized) literal one byte at a time; ''
+# inside a string matches as two adjacent strings.
+VALUES_ROW = LazyPattern((
+    r"""\s*\([^'"()]*{p}(?:(?:'[^'\\]*{p}(?:\\[\s\S][^'\\]*{p})*{p}'|"[^"\\]*{p}(?:\\[\s\S][^"\\]*{p})*{p}")"""
+    r"""[^'"()]*{p})*{p}\)\s*,"""
+).format(p=POSSESSIVE).encode())
+
+# Row checksums are summed modulo 2**64
+CHECKSUM_MASK = (1 << 64) - 1
+
+# --fast-load: settings for the session that loads the data, and for the index phase
+FAST_LOAD_SETTINGS = {'synchronous_commit': 'off'}
+DEFAULT_MAINTENANCE_WORK_MEM = '512MB'
+
+# --partition: range partition width, as the length of the 'YYYY-MM-DD' prefix
+# that names a partition
+PARTITION_INTERVALS = {'daily': 10, 'monthly': 7, 'yearly': 4}
+PARTITION_DATE = LazyPattern(r'(\d{4})-(\d{2})-(\d{2})')
+
+# Progress sink for the current process (ProgressReporter inline, SharedProgress in workers)
+_progress = None
+
+def apply_rule(rule, pattern, replacement, sql, flags=0, stats=None):
+    """
+    Apply one regex rewrite rule, counting how often it fired
+    """
+    sql, count = re.subn(pattern, replacement, sql, flags=flags)
+    if stats is not None and count:
+        stats.count_rule(rule, count)
+    return sql
+
+def convert_mysql_to_postgresql(mysql_sql, verbose=False, stats=None, enum_types=None, indexes=None,
+                                index_names=None):
+    """
+    Convert MySQL schema SQL to PostgreSQL-compatible SQL.
+    ENUM columns get named enum types, recorded in enum_types (value tuple ->
+    type name) if given; otherwise their CREATE TYPE statements are prepended.
+    Secondary indexes are taken out of the tables and recorded in indexes (a
+    list) if given; otherwise their CREATE INDEX statements are appended.
+    index_names (a set) keeps index names unique across calls.
+    """
+    sql = mysql_sql
+    
+    if verbose:
+        print("Converting MySQL schema to PostgreSQL...")
+    
+    # Remove MySQL-specific SET commands
+    sql = apply_rule('versioned_comment', r'/\*!.*?\*/', '', sql, re.DOTALL, stats)
+    sql = apply_rule('set_old_vars', r'SET\s+@OLD.*?;', '', sql, re.IGNORECASE | re.DOTALL, stats)
+    sql = apply_rule('set_character_set', r'SET\s+CHARACTER_SET_CLIENT.*?;', '', sql, re.IGNORECASE, stats)
+    sql = apply_rule('set_names', r'SET\s+NAMES.*?;', '', sql, re.IGNORECASE, stats)
+    
+    # ENUM columns -> named enum types, before the type rewrites below can
+    # touch the value lists
+    own_enum_types = enum_types is None
+    if own_enum_types:
+        enum_types = {}
+    sql = convert_enum_columns(sql, enum_types, stats)
+    
+    # Secondary indexes -> CREATE INDEX statements, per table
+    own_indexes = indexes is None
+    if own_indexes:
+        indexes = []
+    sql = extract_table_indexes(sql, indexes, stats, index_names)
+    
+    # Remove backticks (MySQL) - PostgreSQL uses double quotes or no quotes
+    sql = apply_rule('backticks', r'`([^`]+)`', r'\1', sql, 0, stats)
+    
+    # Replace AUTO_INCREMENT with SERIAL/BIGSERIAL
+    # This is a basic replacement - may need adjustment based on column type
+    def replace_auto_increment(match):
+        col_def = match.group(0)
+        if 'BIGINT' in col_def.upper():
+            return re.sub(r'AUTO_INCREMENT', '', col_def) + ' SERIAL' if 'SERIAL' not in col_def.upper() else col_def.replace('AUTO_INCREMENT', '')
+        return col_def.replace('AUTO_INCREMENT', 'SERIAL')
+    
+    sql = apply_rule('auto_increment', r'[A-Za-z_]+\s+.*?AUTO_INCREMENT', replace_auto_increment, sql, re.IGNORECASE, stats)
+    
+    # Replace data types
+    replacements = [
+        # TINYINT(1) -> BOOLEAN
+        ('tinyint_boolean', r'TINYINT\s*\(\s*1\s*\)', 'BOOLEAN'),
+        ('tinyint_boolean', r'TINYINT\s*\(\s*1\s*\)', 'BOOLEAN'),
+        
+        # DATETIME -> TIMESTAMP
+        ('datetime', r'DATETIME', 'TIMESTAMP'),
+        
+        # LONGTEXT -> TEXT
+        ('longtext', r'LONGTEXT', 'TEXT'),
+        
+        # Remove length from VARCHAR (PostgreSQL doesn't require it for TEXT)
+        # Keep VARCHAR(n) as is for compatibility
+        
+        # Remove unsigned
+        ('unsigned', r'\s+UNSIGNED', '', re.IGNORECASE),
+        
+        # YEAR -> SMALLINT
+        ('year', r'YEAR', 'SMALLINT'),
+        
+        # Remove DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        ('on_update_timestamp', r'ON\s+UPDATE\s+CURRENT_TIMESTAMP', '', re.IGNORECASE),
+    ]
+    
+    for rule, pattern, replacement, *flags in replacements:
+        flag = flags[0] if flags else 0
+        sql = apply_rule(rule, pattern, replacement, sql, flag, stats)
+    
+    # Replace ENGINE and charset declarations
+    sql = apply_rule('engine', r'ENGINE\s*=\s*\w+[^;]*', '', sql, re.IGNORECASE, stats)
+    sql = apply_rule('default_charset', r'DEFAULT\s+CHARSET\s*=\s*\w+[^;]*', '', sql, re.IGNORECASE, stats)
+    sql = apply_rule('collate', r'COLLATE\s*=\s*\w+[^;]*', '', sql, re.IGNORECASE, stats)
+    
+    # Remove MySQL-specific syntax
+    sql = apply_rule('auto_increment_option', r'AUTO_INCREMENT\s*=\s*\d+', '', sql, re.IGNORECASE, stats)
+    
+    # Remove table options
+    sql = apply_rule('table_comment', r'COMMENT\s*=\s*\'[^\']*\'', '', sql, re.IGNORECASE, stats)
+    
+    # Fix CURRENT_TIMESTAMP
+    sql = apply_rule('current_timestamp', r'CURRENT_TIMESTAMP\s*\(\)', 'CURRENT_TIMESTAMP', sql, re.IGNORECASE, stats)
+    
+    if own_enum_types and enum_types:
+        sql = ''.join(enum_type_statements(enum_types)) + sql
+    if own_indexes and indexes:
+        sql += '\n' + ''.join(index_statements(indexes))
+    
+    if verbose:
+        print("Conversion complete!")
+    
+    return sql
+
+def enum_type_name(table, column, taken):
+    """
+    Type name for an enum first seen on table.column, unique among taken names
+    """
+    base = re.sub(r'\W+', '_', f'{table}_{column}').strip('_').lower()[:59]
+    name = base
+    suffix = 1
+    while name in taken:
+        suffix += 1
+        name = f'{base}_{suffix}'
+    return name
+
+def convert_enum_columns(mysql_sql, enum_types, stats=None):
+    """
+    Replace ENUM column types in CREATE TABLE statements with named enum
+    types. enum_types maps value tuples to type names and is shared across
+    tables, so every column with the same value set uses one type.
+    """
+    # Every table is also a composite type, so type names must not clash with tables
+    table_names = {match.group(1).lower() for match in CREATE_TABLE_BLOCK.finditer(mysql_sql)}
+    
+    def convert_table(table_match):
+        table = table_match.group(1)
+        
+        def convert_column(match):
+            indent, column, value_list = match.groups()
+            values = tuple(mysql_string_to_text(value) for value in ENUM_VALUE.findall(value_list))
+            name = enum_types.get(values)
+            if name is None:
+                name = enum_type_name(table, column.strip('`'), set(enum_types.values()) | table_names)
+                enum_types[values] = name
+            if stats is not None:
+                stats.count_rule('enum_type')
+            return f'{indent}{column} {name}'
+        
+        statement = table_match.group(0)
+        body_start = table_match.start(2) - table_match.start()
+        body_end = table_match.end(2) - table_match.start()
+        body = ENUM_COLUMN.sub(convert_column, statement[body_start:body_end])
+        return statement[:body_start] + body + statement[body_end:]
+    
+    return CREATE_TABLE_BLOCK.sub(convert_table, mysql_sql)
+
+def enum_type_statements(enum_types, schema=None):
+    """
+    CREATE TYPE ... AS ENUM for every type in enum_types. CREATE TYPE has no
+    IF NOT EXISTS, so each is wrapped to skip types that already exist and
+    keep the schema script re-runnable.
+    """
+    statements = []
+    for values, name in enum_types.items():
+        qualified = f'{schema}.{name}' if schema else name
+        labels = ', '.join(sql_literal(value) for value in values)
+        statements.append(
+            f"DO $$ BEGIN CREATE TYPE {qualified} AS ENUM ({labels}); "
+            f"EXCEPTION WHEN duplicate_object THEN NULL; END $$;\n"
+        )
+    return statements
+
+def split_key_parts(text, start):
+    """
+    Split the key part list that opens at text[start] ('(') at top-level
+    commas. Returns (parts, end) with end just past the closing parenthesis.
+    """
+    parts = []
+    depth = 0
+    quote = None
+    part_start = start + 1
+    i = start
+    while i < len(text):
+        char = text[i]
+        if quote:
+            if char == '\\':
+                i += 1
+            elif char == quote:
+                quote = None
+        elif char in "'\"`":
+            quote = char
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+            if depth == 0:
+                parts.append(text[part_start:i].strip())
+                return parts, i + 1
+        elif char == ',' and depth == 1:
+            parts.append(text[part_start:i].strip())
+            part_start = i + 1
+        i += 1
+    raise ValueError(f'Unbalanced key part list: {text[start:start + 80]}')
+
+def parse_key_part(part):
+    """
+    (column, prefix length, direction, expression) of one MySQL key part.
+    Functional key parts ((expr)) have no column.
+    """
+    match = KEY_PART.match(part)
+    if match:
+        column, prefix, direction = match.groups()
+        return (column.strip('`'), int(prefix) if prefix else None, (direction or '').upper(), None)
+    expression = re.match(r'^\((.*)\)\s*(ASC|DESC)?$', part, re.IGNORECASE | re.DOTALL)
+    if expression:
+        return (None, None, (expression.group(2) or '').upper(), re.sub(r'`([^`]+)`', r'\1', expression.group(1)))
+    raise ValueError(f'Unsupported key part: {part}')
+
+def redundant_index(index, others):
+    """
+    The index in others that makes a btree index unnecessary, or None.
+    A non-unique index is covered by any index it is a left prefix of, a
+    unique one only by an earlier unique index on the same key.
+    """
+    for other in others:
+        if other is index or other['kind'] not in (None, 'unique', 'primary') or other.get('redundant_of'):
+            continue
+        if index['kind'] == 'unique':
+            if other['kind'] in ('unique', 'primary') and other['parts'] == index['parts'] \
+                    and other['position'] < index['position']:
+                return other
+        elif other['parts'][:len(index['parts'])] == index['parts']:
+            # Of two identical indexes the first one stays
+            if len(other['parts']) > len(index['parts']) or other['kind'] is not None or other['position'] < index['position']:
+                return other
+    return None
+
+def extract_table_indexes(mysql_sql, indexes, stats=None, taken=None):
+    """
+    Take the secondary index definitions (KEY, INDEX, UNIQUE KEY, FULLTEXT,
+    SPATIAL) out of each CREATE TABLE and record them in indexes, one dict
+    per index in dump order. Indexes that are left prefixes of another index
+    on the same table are marked with 'redundant_of'. Foreign keys whose
+    columns no index leads with get an index of their own ('foreign_key'),
+    as InnoDB would have created one. Index names are made unique across
+    the schema, as PostgreSQL requires. Prefix lengths are dropped from the
+    PRIMARY KEY, which has to cover the whole column. taken (a set) carries
+    the names in use from one call to the next when a schema is converted a
+    statement at a time.
+    """
+    table_names = {match.group(1).lower() for match in CREATE_TABLE_BLOCK.finditer(mysql_sql)}
+    if taken is None:
+        taken = set()
+    taken |= table_names | {f'{name}_pkey' for name in table_names}
+    
+    def extract_table(table_match):
+        table = table_match.group(1)
+        lines = table_match.group(2).split('\n')
+        binary_columns = set()
+        table_indexes = []
+        foreign_keys = []
+        kept = []
+        for line in lines[1:]:
+            stripped = line.strip().rstrip(',')
+            if not stripped:
+                continue
+            definition = INDEX_DEFINITION.match(stripped)
+            primary = re.match(r'PRIMARY\s+KEY\s*(?:USING\s+\w+\s*)?\(', stripped, re.IGNORECASE)
+            if not definition and not primary:
+                foreign_key = FOREIGN_KEY_DEFINITION.match(stripped)
+                if foreign_key:
+                    constraint, columns, references = foreign_key.groups()
+                    foreign_keys.append((
+                        (constraint or '').strip('`'),
+                        [column.strip().strip('`') for column in columns.split(',')],
+                        references.strip('`'),
+                    ))
+                column = COLUMN_LINE.match(stripped)
+                if column and column.group(1).upper() not in NON_COLUMN_KEYWORDS and column.group(2).lower() in BINARY_TYPES:
+                    binary_columns.add(column.group(1).strip('`'))
+                kept.append(line.rstrip().rstrip(','))
+                continue
+            parts, _ = split_key_parts(stripped, (definition or primary).end() - 1)
+            parts = [parse_key_part(part) for part in parts]
+            if primary:
+                table_indexes.append({'table': table, 'name': None, 'kind': 'primary', 'parts': parts, 'position': -1})
+                columns = ', '.join(f'`{column}`' for column, _, _, _ in parts)
+                kept.append(line[:len(line) - len(line.lstrip())] + f'PRIMARY KEY ({columns})')
+                continue
+            kind = definition.group(1).lower() if definition.group(1) else None
+            table_indexes.append({
+                'table': table,
+                'name': (definition.group(2) or '').strip('`'),
+                'kind': kind,
+                'parts': parts,
+                'position': len(table_indexes),
+                'binary_columns': binary_columns,
+            })
+        
+        secondary = [index for index in table_indexes if index['kind'] != 'primary']
+        for index in secondary:
+            index['name'] = unique_index_name(table, index, taken)
+        for index in secondary:
+            if index['kind'] in (None, 'unique'):
+                covering = redundant_index(index, table_indexes)
+            else:
+                covering = next((other for other in table_indexes
+                                 if other['kind'] == index['kind'] and other['parts'] == index['parts']
+                                 and other['position'] < index['position']), None)
+            if covering is not None:
+                index['redundant_of'] = covering['name'] or 'PRIMARY KEY'
+            if stats is not None:
+                stats.count_rule('redundant_index' if covering is not None else f"{index['kind'] or 'btree'}_index")
+            indexes.append(index)
+        
+        for constraint, columns, references in foreign_keys:
+            if any(leading_columns(index)[:len(columns)] == columns for index in table_indexes
+                   if index['kind'] in (None, 'unique', 'primary') and not index.get('redundant_of')):
+                continue
+            index = {
+                'table': table,
+                'name': None,
+                'kind': None,
+                'parts': [(column, None, '', None) for column in columns],
+                'position': len(table_indexes),
+                'binary_columns': binary_columns,
+                'foreign_key': constraint or f"({', '.join(columns)}) -> {references}",
+            }
+            index['name'] = unique_index_name(table, index, taken)
+            table_indexes.append(index)
+            indexes.append(index)
+            if stats is not None:
+                stats.count_rule('foreign_key_index')
+                stats.add_foreign_key_index(table, index['name'], columns, references, constraint)
+        
+        if not table_indexes:
+            return table_match.group(0)
+        body = lines[0] + '\n' + ',\n'.join(kept)
+        statement = table_match.group(0)
+        body_start = table_match.start(2) - table_match.start()
+        body_end = table_match.end(2) - table_match.start()
+        return statement[:body_start] + body + statement[body_end:]
+    
+    return CREATE_TABLE_BLOCK.sub(extract_table, mysql_sql)
+
+def leading_columns(index):
+    """
+    Columns an index can look up by, in order: whole-column key parts up to
+    the first prefix or expression part
+    """
+    columns = []
+    for column, prefix, _, expression in index['parts']:
+        if prefix or expression is not None:
+            break
+        columns.append(column)
+    return columns
+
+def unique_index_name(table, index, taken):
+    """
+    PostgreSQL name for an index: the MySQL name if it is free in the
+    schema, else prefixed with the table name (and numbered if need be)
+    """
+    if index['name']:
+        base = index['name'].lower()
+    else:
+        base = '_'.join([table] + [column or 'expr' for column, _, _, _ in index['parts']] + ['idx']).lower()
+    name = base[:63]
+    if name in taken:
+        base = f"{table.lower()}_{base}"[:59]
+        name = base
+        suffix = 1
+        while name in taken:
+            suffix += 1
+            name = f'{base}_{suffix}'
+    taken.add(name)
+    return name
+
+def index_statements(indexes, schema=None):
+    """
+    CREATE INDEX statements for the indexes recorded by
+    extract_table_indexes. Prefix key parts become expression indexes on
+    the prefix, FULLTEXT becomes a GIN index on to_tsvector and SPATIAL a
+    GiST index. Redundant indexes are listed as comments instead, and
+    indexes added for foreign keys say which one.
+    """
+    statements = []
+    for index in indexes:
+        target = f"{schema}.{quote_identifier(index['table'])}" if schema else quote_identifier(index['table'])
+        name = quote_identifier(index['name'])
+        if index.get('redundant_of'):
+            statements.append(f"-- {name} on {index['table']} skipped: covered by {index['redundant_of']}\n")
+            continue
+        if index['kind'] == 'fulltext':
+            columns = [quote_identifier(column) for column, _, _, _ in index['parts']]
+            document = columns[0] if len(columns) == 1 else " || ' ' || ".join(f"coalesce({c}, '')" for c in columns)
+            statements.append(
+                f"CREATE INDEX IF NOT EXISTS {name} ON {target} USING gin "
+                f"(to_tsvector('{FULLTEXT_CONFIG}', {document}));\n"
+            )
+            continue
+        parts = []
+        for column, prefix, direction, expression in index['parts']:
+            if expression is not None:
+                part = f'({expression})'
+            elif prefix:
+                function = 'substring' if column in index['binary_columns'] else 'left'
+                arguments = f'1, {prefix}' if function == 'substring' else str(prefix)
+                part = f'({function}({quote_identifier(column)}, {arguments}))'
+            else:
+                part = quote_identifier(column)
+            parts.append(f'{part} {direction}' if direction else part)
+        if index.get('foreign_key'):
+            statements.append(f"-- supports foreign key {index['foreign_key']} (InnoDB indexes foreign keys itself)\n")
+        unique = 'UNIQUE ' if index['kind'] == 'unique' else ''
+        method = ' USING gist' if index['kind'] == 'spatial' else ''
+        statements.append(f"CREATE {unique}INDEX IF NOT EXISTS {name} ON {target}{method}({', '.join(parts)});\n")
+    return statements
+
+def column_storage(type_name, length):
+    """
+    (size, alignment) of a MySQL column type after conversion, or None for
+    variable-length types
+    """
+    type_name = type_name.lower()
+    if (type_name == 'tinyint' and length == '1') or (type_name == 'bit' and length in (None, '1')):
+        return (1, 1)
+    return FIXED_WIDTH_TYPES.get(type_name)
+
+def row_padding(storages):
+    """
+    Expected alignment padding in bytes of a row whose columns have these
+    storages, in order, with no NULLs. The length of a variable-length value
+    is unknown, so padding after one is averaged over the possible offsets.
+    """
+    known = 8            # the offset is known modulo this (row data starts 8-aligned)
+    offset = 0
+    padding = 0.0
+    for storage in storages:
+        if storage is None:
+            known, offset = 1, 0
+            continue
+        size, align = storage
+        if align <= known:
+            padding += -offset % align
+            offset = (offset + (-offset % align) + size) % known
+        else:
+            candidates = [offset + known * i for i in range(align // known)]
+            padding += sum(-c % align for c in candidates) / len(candidates)
+            known, offset = align, size % align
+    return padding
+
+def optimize_column_layout(mysql_sql, layouts, stats=None):
+    """
+    Reorder the columns of each CREATE TABLE by alignment: 8-byte types
+    first, then 4, 2 and 1 byte, then variable-length types, keeping the
+    dump order within each group. Fixed-width columns then need no padding.
+    The original column order of every reordered table is recorded in
+    layouts, and INSERTs without a column list get one, so data still lands
+    in the right columns.
+    """
+    def reorder_table(table_match):
+        table = table_match.group(1)
+        lines = table_match.group(2).split('\n')
+        columns = []
+        others = []
+        for line in lines[1:]:
+            column = COLUMN_LINE.match(line)
+            if column and column.group(1).upper() not in NON_COLUMN_KEYWORDS:
+                columns.append((line.rstrip().rstrip(','), column.group(1).strip('`'), column_storage(*column.group(2, 3))))
+            elif line.strip():
+                others.append(line.rstrip().rstrip(','))
+        ordered = sorted(columns, key=lambda column: -column[2][1] if column[2] else 0)
+        if ordered == columns:
+            return table_match.group(0)
+        
+        layouts[table] = [name for _, name, _ in columns]
+        if stats is not None:
+            stats.count_rule('column_layout')
+            stats.add_layout(table, row_padding([c[2] for c in columns]), row_padding([c[2] for c in ordered]))
+        body = lines[0] + '\n' + ',\n'.join([line for line, _, _ in ordered] + others)
+        statement = table_match.group(0)
+        body_start = table_match.start(2) - table_match.start()
+        body_end = table_match.end(2) - table_match.start()
+        return statement[:body_start] + body + statement[body_end:]
+    
+    sql = CREATE_TABLE_BLOCK.sub(reorder_table, mysql_sql)
+    if not layouts:
+        return sql
+    
+    def add_column_list(match):
+        columns = layouts.get(match.group(2))
+        if columns is None:
+            return match.group(0)
+        return f"{match.group(1)} ({', '.join('`' + column + '`' for column in columns)}) VALUES"
+    
+    return re.sub(r'^((?:INSERT|REPLACE)\s+(?:IGNORE\s+)?INTO\s+`?(\w+)`?)\s*VALUES', add_column_list, sql,
+                  flags=re.IGNORECASE | re.MULTILINE)
+
+def partition_table_keys(mysql_sql, partitions):
+    """
+    Add the partition column to the PRIMARY KEY and UNIQUE keys of the
+    partitioned tables: PostgreSQL requires it in every unique constraint of
+    a partitioned table. The other key columns are then only unique within a
+    partition.
+    """
+    def extend_keys(table_match):
+        table = table_match.group(1)
+        if table not in partitions:
+            return table_match.group(0)
+        column = partitions[table]['column']
+        lines = table_match.group(2).split('\n')
+        for i, line in enumerate(lines):
+            stripped = line.lstrip()
+            key = re.match(r'PRIMARY\s+KEY\s*(?:USING\s+\w+\s*)?\(', stripped, re.IGNORECASE)
+            if not key:
+                key = INDEX_DEFINITION.match(stripped)
+                if not key or (key.group(1) or '').upper() != 'UNIQUE':
+                    continue
+            indent = len(line) - len(stripped)
+            parts, end = split_key_parts(line, indent + key.end() - 1)
+            if column not in [parse_key_part(part)[0] for part in parts]:
+                lines[i] = f'{line[:end - 1]},`{column}`{line[end - 1:]}'
+        statement = table_match.group(0)
+        body_start = table_match.start(2) - table_match.start()
+        body_end = table_match.end(2) - table_match.start()
+        return statement[:body_start] + '\n'.join(lines) + statement[body_end:]
+    
+    return CREATE_TABLE_BLOCK.sub(extend_keys, mysql_sql)
+
+def detach_partition_references(mysql_sql, partitions):
+    """
+    Take the foreign keys that reference a partitioned table out of the
+    CREATE TABLE statements: the referenced key of a partitioned table
+    includes the partition column, so REFERENCES t (id) has no unique key to
+    point at and would fail. Returns (sql, [(table, definition)]).
+    """
+    detached = []
+    
+    def detach(table_match):
+        lines = table_match.group(2).split('\n')
+        kept = []
+        for line in lines:
+            foreign_key = FOREIGN_KEY_DEFINITION.search(line)
+            if foreign_key and foreign_key.group(3).strip('`') in partitions:
+                detached.append((table_match.group(1), line.strip().rstrip(',').replace('`', '')))
+                continue
+            kept.append(line)
+        if len(kept) == len(lines):
+            return table_match.group(0)
+        # The last definition has no comma of its own
+        kept[-1] = kept[-1].rstrip().rstrip(',')
+        statement = table_match.group(0)
+        body_start = table_match.start(2) - table_match.start()
+        body_end = table_match.end(2) - table_match.start()
+        return statement[:body_start] + '\n'.join(kept) + statement[body_end:]
+    
+    return CREATE_TABLE_BLOCK.sub(detach, mysql_sql), detached
+
+def partition_ranges(first, last, interval):
+    """
+    (key, from, to) of every partition from the one holding key first to the
+    one holding key last, gaps included
+    """
+    from datetime import date, timedelta
+    
+    def start_of(key):
+        return date(*map(int, (key + '-01-01')[:10].split('-')))
+    
+    current = start_of(first)
+    final = start_of(last)
+    while current <= final:
+        if interval == 'daily':
+            following = current + timedelta(days=1)
+        elif interval == 'monthly':
+            following = date(current.year + current.month // 12, current.month % 12 + 1, 1)
+        else:
+            following = date(current.year + 1, 1, 1)
+        yield current.isoformat()[:PARTITION_INTERVALS[interval]], current.isoformat(), following.isoformat()
+        current = following
+
+def partition_statements(table, spec, schema=None):
+    """
+    CREATE TABLE ... PARTITION OF for one partitioned table: a range
+    partition for every interval from the first to the last key seen in the
+    data, and a default partition for rows outside them
+    """
+    target = f'{schema}.{table}' if schema else table
+    statements = []
+    if spec['first']:
+        for key, start, end in partition_ranges(spec['first'], spec['last'], spec['interval']):
+            name = f'{schema}.{partition_name(table, key)}' if schema else partition_name(table, key)
+            statements.append(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {target} FOR VALUES FROM ('{start}') TO ('{end}');\n"
+            )
+    name = f'{schema}.{partition_name(table, None)}' if schema else partition_name(table, None)
+    statements.append(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {target} DEFAULT;\n")
+    return statements
+
+def table_references(mysql_sql):
+    """
+    {table: [referenced tables]} from the FOREIGN KEY definitions, in dump order
+    """
+    references = {}
+    for match in CREATE_TABLE_BLOCK.finditer(mysql_sql):
+        references[match.group(1)] = [
+            foreign_key.group(3).strip('`')
+            for foreign_key in FOREIGN_KEY_DEFINITION.finditer(match.group(2))
+        ]
+    return references
+
+def fast_load_tables(postgresql_sql, references, partitions):
+    """
+    --fast-load: create tables UNLOGGED. A permanent table cannot reference
+    an unlogged one, so partitioned tables (which cannot be unlogged) and
+    every table they reference, directly or not, stay logged.
+    Returns (sql, unlogged tables in SET LOGGED order, tables left in a
+    foreign key cycle).
+    """
+    logged = set()
+    pending = list(partitions)
+    while pending:
+        table = pending.pop()
+        if table not in logged:
+            logged.add(table)
+            pending.extend(references.get(table, []))
+    
+    unlogged = []
+    
+    def make_unlogged(match):
+        table = match.group(2)
+        if table in logged:
+            return match.group(0)
+        unlogged.append(table)
+        return f'CREATE UNLOGGED TABLE {match.group(1)}{table}'
+    
+    postgresql_sql = re.sub(
+        r'CREATE\s+TABLE\s+(IF\s+NOT\s+EXISTS\s+(?:\w+\.)?)(\w+)', make_unlogged, postgresql_sql, flags=re.IGNORECASE
+    )
+    
+    # SET LOGGED referenced tables first; partitions have their parent's foreign keys
+    parents = {}
+    for table, spec in partitions.items():
+        parents[partition_name(table, None)] = table
+        if spec['first']:
+            for key, _, _ in partition_ranges(spec['first'], spec['last'], spec['interval']):
+                parents[partition_name(table, key)] = table
+    
+    def depends_on(table):
+        return set(references.get(parents.get(table, table), [])) & set(unlogged) - {table}
+    
+    ordered = []
+    remaining = list(dict.fromkeys(unlogged))
+    while remaining:
+        ready = [table for table in remaining if not depends_on(table) - set(ordered)]
+        if not ready:
+            break
+        ordered.extend(ready)
+        remaining = [table for table in remaining if table not in ready]
+    return postgresql_sql, ordered, remaining
+
+def schema_header(schema):
+    """
+    CREATE SCHEMA IF NOT EXISTS and search_path at the top of a converted schema
+    """
+    return (f"-- PostgreSQL Schema Conversion\n"
+            f"CREATE SCHEMA IF NOT EXISTS {schema};\n"
+            f"SET search_path TO {schema}, public;\n\n")
+
+def qualify_tables(postgresql_sql, schema):
+    """
+    CREATE TABLE IF NOT EXISTS with the schema prefix
+    """
+    return re.sub(
+        r'CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)',
+        f'CREATE TABLE IF NOT EXISTS {schema}.\\1',
+        postgresql_sql,
+        flags=re.IGNORECASE
+    )
+
+def build_postgresql_schema(mysql_sql, schema='mifos', verbose=False, stats=None, layouts=None, partitions=None,
+                            fast_load=False, maintenance_work_mem=DEFAULT_MAINTENANCE_WORK_MEM, post_data=None):
+    """
+    Full schema conversion: convert the DDL, create the enum types ahead of
+    the tables, qualify tables with the PostgreSQL schema and append the
+    CREATE INDEX statements, built per table (see extract_table_indexes).
+    If layouts (a dict) is given, columns are reordered for alignment (see
+    optimize_column_layout) and the original column order of each reordered
+    table is recorded in it.
+    partitions (the manifest's 'partitions' entry from convert_dump_to_copy)
+    makes those tables PARTITION BY RANGE with partitions for the data seen.
+    fast_load creates the tables UNLOGGED, turns synchronous_commit off,
+    builds the indexes with maintenance_work_mem and ends with ALTER TABLE
+    ... SET LOGGED. If post_data (a list) is given, the index and SET LOGGED
+    statements go there instead of the output, to run after a --copy-dir load.
+    """
+    partitions = partitions or {}
+    references = table_references(mysql_sql)
+    if layouts is not None:
+        mysql_sql = optimize_column_layout(mysql_sql, layouts, stats)
+    detached = []
+    if partitions:
+        # FKs pointing at a partitioned table lose the unique key they need
+        mysql_sql, detached = detach_partition_references(mysql_sql, partitions)
+        mysql_sql = partition_table_keys(mysql_sql, partitions)
+    
+    # Convert schema
+    enum_types = {}
+    indexes = []
+    postgresql_sql = convert_mysql_to_postgresql(mysql_sql, verbose, stats, enum_types, indexes)
+    
+    # Enum types go before the tables that use them
+    if enum_types:
+        postgresql_sql = "-- Enum types\n" + "".join(enum_type_statements(enum_types, schema)) + "\n" + postgresql_sql
+    
+    # Add schema prefix
+    if schema:
+        postgresql_sql = schema_header(schema) + qualify_tables(postgresql_sql, schema)
+    
+    # Partitioned tables: PARTITION BY after the table body, partitions right after the table
+    for table, spec in partitions.items():
+        column = spec['column']
+        notes = [f"-- {table}: partitioned by {column} ({spec['interval']}); its primary key and unique indexes "
+                 f"include {column}, so their other columns are unique per partition only\n"]
+        if spec['default_rows']:
+            notes.append(f"-- WARNING: {spec['default_rows']:,} {table} rows have an invalid {column} and go to "
+                         f"{partition_name(table, None)}\n")
+        table_pattern = re.compile(
+            rf'(CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?(?:\w+\.)?{re.escape(table)}\s*\(.*?\n\))[^;]*;',
+            re.IGNORECASE | re.DOTALL
+        )
+        statements = partition_statements(table, spec, schema)
+        postgresql_sql = table_pattern.sub(
+            lambda match: ''.join(notes) + f"{match.group(1)} PARTITION BY RANGE ({column});\n" + ''.join(statements),
+            postgresql_sql, count=1
+        )
+        if stats is not None:
+            stats.count_rule('partition', len(statements))
+    
+    post_statements = []
+    if fast_load:
+        postgresql_sql, unlogged, cycle = fast_load_tables(postgresql_sql, references, partitions)
+        settings = ''.join(f"SET {name} = '{value}';\n" for name, value in FAST_LOAD_SETTINGS.items())
+        postgresql_sql = (
+            "-- FAST LOAD: for the initial load into an empty database only.\n"
+            "-- Tables are UNLOGGED (no WAL) until the SET LOGGED section at the end;\n"
+            "-- a crash or failover before then leaves them empty. Never run this on a live database.\n"
+            + settings + "\n" + postgresql_sql
+        )
+        if stats is not None:
+            stats.count_rule('unlogged_table', len(unlogged) + len(cycle))
+    
+    # Indexes at the end, after the data
+    if indexes:
+        if fast_load:
+            post_statements.append(f"\n-- Index build (fast load)\nSET maintenance_work_mem = '{maintenance_work_mem}';\n")
+        post_statements.append("\n-- Indexes\n")
+        post_statements.extend(index_statements(indexes, schema))
+    
+    if detached:
+        post_statements.append("\n-- Foreign keys NOT created: they reference a partitioned table, whose unique keys "
+                               "include the partition column\n")
+        for table, definition in detached:
+            post_statements.append(f"-- ERROR: {table}: {definition}\n")
+        if stats is not None:
+            stats.count_rule('partition_foreign_key_dropped', len(detached))
+    
+    if fast_load and (unlogged or cycle):
+        post_statements.append("\n-- Make the tables crash-safe again, referenced tables first\n")
+        for table in unlogged:
+            target = f'{schema}.{table}' if schema else table
+            post_statements.append(f"ALTER TABLE {target} SET LOGGED;\n")
+        if cycle:
+            post_statements.append(
+                f"-- WARNING: foreign keys form a cycle between {', '.join(cycle)}; SET LOGGED fails for them until "
+                f"one of those foreign keys is dropped and re-added\n"
+            )
+            for table in cycle:
+                target = f'{schema}.{table}' if schema else table
+                post_statements.append(f"ALTER TABLE {target} SET LOGGED;\n")
+    if fast_load:
+        post_statements.extend(f"RESET {name};\n" for name in ['maintenance_work_mem', *FAST_LOAD_SETTINGS])
+    
+    if post_data is not None:
+        post_data.extend(post_statements)
+    elif post_statements:
+        postgresql_sql += "\n" + "".join(post_statements)
+    
+    return postgresql_sql
+
+def find_statement_ranges(input_file, chunk_count, start=0, end=None):
+    """
+    Split a dump file (or its bytes start to end, which must be statement
+    boundaries) into byte ranges that start and end on statement boundaries.
+    mysqldump escapes newlines inside values, so a line ending in ';' always
+    closes a statement.
+    """
+    if end is None:
+        end = os.path.getsize(input_file)
+    chunk_count = max(1, min(chunk_count, end - start))
+    boundaries = [start]
+    
+    with open(input_file, 'rb') as f:
+        for i in range(1, chunk_count):
+            target = start + (end - start) * i // chunk_count
+            if target <= boundaries[-1]:
+                continue
+            f.seek(target)
+            f.readline()  # finish the partial line
+            line = b''
+            while True:
+                position = f.tell()
+                if line.rstrip().endswith(b';') or position >= end:
+                    break
+                line = f.readline()
+            if boundaries[-1] < position < end:
+                boundaries.append(position)
+    
+    boundaries.append(end)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+def index_statement_ranges(input_file, index, chunk_size):
+    """
+    Byte ranges of about chunk_size from a dump index (see dump_index.py):
+    each table's data is split on its own, so a chunk only holds the end of
+    one table and the start of the next when both are small. The DDL between
+    the data goes with the data after it, so every range holds data and the
+    chunks are numbered from 0 without gaps, as without an index.
+    """
+    from dump_index import data_ranges
+    pieces = []
+    position = 0
+    for start, end in data_ranges(index):
+        table_pieces = find_statement_ranges(input_file, -(-(end - start) // chunk_size), start, end)
+        table_pieces[0] = (position, table_pieces[0][1])
+        pieces.extend(table_pieces)
+        position = end
+    if position < index['size']:
+        if pieces:
+            pieces[-1] = (pieces[-1][0], index['size'])
+        else:
+            pieces.append((position, index['size']))
+    
+    ranges = []
+    for start, end in pieces:
+        if ranges and end - ranges[-1][0] <= chunk_size:
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((start, end))
+    return ranges
+
+def mysql_string_to_copy(value):
+    """
+    Convert the body of a MySQL quoted string to PostgreSQL COPY text format
+    """
+    if '\\' not in value and "'" not in value and '\t' not in value and '\n' not in value and '\r' not in value:
+        return value
+    def replace(match):
+        escape = match.group(0)
+        replacement = MYSQL_TO_COPY_ESCAPES.get(escape)
+        if replacement is None:
+            # Unknown escape, or a backslash before a raw tab or line break: the character itself
+            replacement = MYSQL_TO_COPY_ESCAPES.get(escape[1:], escape[1:])
+        return replacement
+    
+    return MYSQL_ESCAPE_PATTERN.sub(replace, value)
+
+def mysql_string_to_text(value):
+    """
+    Unescape the body of a MySQL quoted string to the plain value
+    """
+    if '\\' not in value and "'" not in value:
+        return value
+    return MYSQL_TEXT_ESCAPE_PATTERN.sub(
+        lambda m: MYSQL_TO_TEXT_ESCAPES.get(m.group(0), m.group(0)[1:]),
+        value
+    )
+
+def mysql_binary_to_hex(value):
+    """
+    Upper-case hex digits (bytes) of the body of a MySQL binary string
+    (bytes), as mysqldump --hex-blob writes them and verify_postgresql.py
+    hashes bytea
+    """
+    if b'\\' in value or b"'" in value:
+        value = MYSQL_BINARY_ESCAPE_PATTERN.sub(
+            lambda m: b"'" if m.group(1) is None else MYSQL_TO_BINARY_ESCAPES.get(m.group(1), m.group(1)),
+            value
+        )
+    return binascii.hexlify(value).upper()
+
+def parse_insert_rows(values_sql, raw=False):
+    """
+    Parse the VALUES list of a MySQL INSERT statement.
+    Yields each row as a list of COPY text fields, or with raw=True as plain
+    values (None for NULL) for callers that format their own literals.
+    Hex literals and _binary strings become bytea hex input.
+    """
+    row = None
+    for match in ROW_TOKEN.finditer(values_sql):
+        binary, string_value, bit_value, literal, punctuation = match.groups()
+        if punctuation:
+            if punctuation == '(':
+                row = []
+            elif punctuation == ')':
+                if row is not None:
+                    yield row
+                row = None
+            continue
+        if row is None:
+            # Trailing ';' or anything else outside a row
+            continue
+        if binary is not None:
+            digits = mysql_binary_to_hex(string_value.encode('utf-8', 'surrogateescape')).decode('ascii')
+            row.append(('\\x' if raw else '\\\\x') + digits)
+        elif string_value is not None:
+            row.append(mysql_string_to_text(string_value) if raw else mysql_string_to_copy(string_value))
+        elif bit_value is not None:
+            row.append(str(int(bit_value or '0', 2)))
+        elif literal.upper() == 'NULL':
+            row.append(None if raw else '\\N')
+        elif literal[:2] in ('0x', '0X'):
+            # Hex literal -> bytea hex input (backslash escaped for COPY)
+            row.append(('\\x' if raw else '\\\\x') + literal[2:])
+        else:
+            row.append(literal)
+
+def convert_insert_to_copy(statement):
+    """
+    Convert one MySQL INSERT statement to COPY text lines.
+    Returns (table_name, columns, lines) or None if it is not an INSERT.
+    """
+    header = INSERT_HEADER.match(statement)
+    if not header:
+        return None
+    rows = parse_insert_rows(statement[header.end():])
+    lines = ['\t'.join(row) + '\n' for row in rows]
+    return header.group(1), insert_columns(header), lines
+
+def insert_columns(header):
+    """
+    Column names of an INSERT_HEADER match (None without a column list)
+    """
+    if not header.group(2):
+        return None
+    return [col.strip().strip('`') for col in header.group(2).split(',')]
+
+def blob_insert_values(statement):
+    """
+    Start of the VALUES list of an INSERT (bytes) that stream_insert_to_copy
+    should convert, or None
+    """
+    if len(statement) < BLOB_STREAM_MIN or not BINARY_LITERAL.search(statement):
+        return None
+    positions = insert_values_start(statement)
+    return positions[1] if positions else None
+
+def stream_insert_to_copy(statement, values_start, write, checksums=True):
+    """
+    convert_insert_to_copy for an INSERT (bytes) holding large binary
+    literals: COPY lines are written as bytes to write() field by field. Hex
+    literals are copied through memoryview slices and _binary strings are
+    unescaped and hexlified BLOB_CHUNK_SIZE bytes at a time, so no literal is
+    ever decoded or copied whole. Other fields convert as in
+    parse_insert_rows, and the output is the same.
+    Returns (rows, row checksum or None, bytes written).
+    """
+    from hashlib import md5
+    view = memoryview(statement)
+    rows = 0
+    total = 0
+    written = 0
+    digest = None
+    in_row = False
+    first_field = True
+    
+    def emit(data):
+        nonlocal written
+        write(data)
+        if digest is not None:
+            digest.update(data)
+        written += len(data)
+    
+    try:
+        for match in ROW_TOKEN_BYTES.finditer(statement, values_start):
+            if match.start(5) >= 0:
+                punctuation = statement[match.start(5)]
+                if punctuation == 0x28:        # (
+                    in_row = True
+                    first_field = True
+                    digest = md5() if checksums else None
+                elif punctuation == 0x29:      # )
+                    if in_row:
+                        digest, row_digest = None, digest
+                        emit(b'\n')
+                        rows += 1
+                        if row_digest is not None:
+                            total += int.from_bytes(row_digest.digest()[:8], 'big')
+                    in_row = False
+                continue
+            if not in_row:
+                continue
+            if not first_field:
+                emit(b'\t')
+            first_field = False
+            
+            if match.start(1) >= 0:
+                emit(b'\\\\x')
+                position, end = match.span(2)
+                while position < end:
+                    # Never cut an escape or a doubled quote
+                    run_end = BINARY_STRING_RUN.match(statement, position, min(end, position + BLOB_CHUNK_SIZE)).end()
+                    emit(mysql_binary_to_hex(statement[position:run_end]))
+                    position = run_end
+            elif match.start(2) >= 0:
+                value = match.group(2).decode('utf-8', 'surrogateescape')
+                emit(mysql_string_to_copy(value).encode('utf-8', 'surrogateescape'))
+            elif match.start(3) >= 0:
+                emit(str(int(match.group(3) or b'0', 2)).encode())
+            else:
+                start, end = match.span(4)
+                if statement[start:start + 2] in (b'0x', b'0X'):
+                    emit(b'\\\\x')
+                    for position in range(start + 2, end, BLOB_CHUNK_SIZE):
+                        emit(view[position:min(end, position + BLOB_CHUNK_SIZE)])
+                elif end - start == 4 and statement[start:end].upper() == b'NULL':
+                    emit(b'\\N')
+                else:
+                    emit(view[start:end])
+    finally:
+        view.release()
+    return rows, (total & CHECKSUM_MASK) if checksums else None, written
+
+def row_checksum(lines):
+    """
+    Order-independent checksum of COPY lines: the sum of the first 8 bytes of
+    the MD5 of each line (without its newline), modulo 2**64. A sum, unlike
+    xor, does not cancel out duplicate rows. verify_postgresql.py computes
+    the same figure on the server from the loaded tables.
+    """
+    from hashlib import md5  # loads OpenSSL; only data conversion needs it
+    total = 0
+    for line in lines:
+        total += int.from_bytes(md5(line[:-1].encode('utf-8', 'surrogateescape')).digest()[:8], 'big')
+    return total & CHECKSUM_MASK
+
+def insert_values_start(buffer):
+    """
+    (end of the leading comments, start of the VALUES list) of the INSERT at
+    the start of buffer (bytes), or None if it does not start with one
+    """
+    if statement_keyword(buffer) not in ('INSERT', 'REPLACE'):
+        return None
+    head = buffer[:65536].decode('utf-8', errors='surrogateescape')
+    leading, statement = split_leading(head)
+    header = INSERT_HEADER.match(statement)
+    if not header:
+        return None
+    leading_end = len(leading.encode('utf-8', errors='surrogateescape'))
+    return leading_end, leading_end + len(statement[:header.end()].encode('utf-8', errors='surrogateescape'))
+
+def row_group_end(buffer, values_start):
+    """
+    Position after the comma that follows the last complete row of the VALUES
+    list in buffer (0 if no row is complete yet)
+    """
+    end = 0
+    position = values_start
+    while True:
+        row = VALUES_ROW.match(buffer, position)
+        if not row:
+            return end
+        position = end = row.end()
+
+def insert_row_count(buffer, values_start):
+    """
+    Rows of the INSERT in buffer (bytes) whose VALUES list starts at values_start
+    """
+    # Anchored row by row: a search would also match inside strings
+    rows = 1
+    position = values_start
+    while True:
+        row = VALUES_ROW.match(buffer, position)
+        if not row:
+            return rows
+        rows += 1
+        position = row.end()
+
+def _iter_range_statements(f, size, row_group_size=DEFAULT_ROW_GROUP_SIZE):
+    """
+    Statements in the next size bytes of f, read in DEFAULT_READ_SIZE pieces
+    (see iter_row_groups)
+    """
+    def pieces(remaining):
+        while remaining > 0:
+            data = f.read(min(DEFAULT_READ_SIZE, remaining))
+            if not data:
+                return
+            remaining -= len(data)
+            yield data
+    
+    return iter_row_groups(pieces(size), row_group_size)
+
+def iter_row_groups(chunks, row_group_size=DEFAULT_ROW_GROUP_SIZE):
+    """
+    Statements of a MySQL dump read as byte chunks. An INSERT still open
+    after row_group_size bytes is not held whole: its complete rows are
+    yielded as an INSERT of their own and the splitter keeps only the rest,
+    which is yielded with the same INSERT header.
+    """
+    splitter = StatementSplitter()
+    header = None        # INSERT ... VALUES of the statement being cut
+    next_cut = row_group_size
+    
+    def with_header(statements):
+        nonlocal header
+        for statement in statements:
+            if header is not None:
+                # The last rows of a statement that was cut
+                statement = Statement(header + statement.text, statement.start, statement.end)
+                header = None
+            yield statement
+    
+    for data in chunks:
+        yield from with_header(splitter.feed(data))
+        
+        buffer = splitter.buffer
+        if not buffer or len(buffer) < row_group_size:
+            next_cut = row_group_size
+            continue
+        if len(buffer) < next_cut:
+            continue
+        if header is None:
+            positions = insert_values_start(buffer)
+            end = row_group_end(buffer, positions[1]) if positions else 0
+        else:
+            end = row_group_end(buffer, 0)
+        if not end:
+            # Not an INSERT, or no complete row yet: look again when the buffer has doubled
+            next_cut = 2 * len(buffer)
+            continue
+        # Offsets cover the rows and their separating comma
+        yield Statement((header or b'') + buffer[:end - 1] + b';', splitter.offset, splitter.offset + end)
+        if header is None:
+            header = buffer[positions[0]:positions[1]]
+        splitter.discard(end)
+        next_cut = row_group_size
+    yield from with_header(splitter.close())
+
+def count_table_rows(input_file, stats):
+    """
+    Per-table INSERT statements, rows and bytes of a dump converted without
+    --copy-dir, for the run report. There the data is rewritten together
+    with the schema, so no time is counted per table.
+    """
+    with open(input_file, 'rb') as f:
+        for statement in _iter_range_statements(f, os.fstat(f.fileno()).st_size):
+            positions = insert_values_start(statement.text)
+            if positions is None:
+                continue
+            head = statement.text[positions[0]:positions[1]].decode('utf-8', errors='surrogateescape')
+            header = INSERT_HEADER.match(head)
+            stats.add_table(header.group(1), statements=1, rows=insert_row_count(statement.text, positions[1]),
+                            bytes_in=statement.end - statement.start)
+
+def convert_data_range(task):
+    """
+    Worker: convert the INSERT statements in one byte range of the dump to
+    numbered COPY chunk files. Everything that is not an INSERT is returned
+    so the schema can be converted in the main process.
+    """
+    input_file, start, end, chunk_index, copy_dir, compression, checksums, partitions, row_group_size = task
+    schema_parts = []
+    chunks = {}
+    handles = {}
+    table_stats = {}
+    
+    def chunk_file(target, columns):
+        if target not in handles:
+            file_name = with_suffix(f'{target}.{chunk_index:04d}.copy', compression)
+            handles[target] = OutputWriter(
+                os.path.join(copy_dir, file_name), compression,
+                buffer_size=COPY_BUFFER_SIZE, errors='surrogateescape'
+            )
+            chunks[target] = {'file': file_name, 'columns': columns, 'rows': 0,
+                              'checksum': 0 if checksums else None}
+        return handles[target]
+    
+    try:
+        with open(input_file, 'rb') as f:
+            f.seek(start)
+            after_insert = False
+            for raw_statement in _iter_range_statements(f, end - start, row_group_size):
+                byte_count = raw_statement.end - raw_statement.start
+                # Large INSERTs of binary data: only the header is decoded
+                values_start = blob_insert_values(raw_statement.text)
+                statement_sql = raw_statement.text[:values_start].decode('utf-8', errors='surrogateescape')
+                leading, statement_sql = split_leading(statement_sql)
+                if after_insert and leading.startswith('\n'):
+                    # Drop the line break that ended the INSERT line too
+                    leading = leading[1:]
+                after_insert = False
+                if not re.match(r'(?:INSERT|REPLACE)\s', statement_sql, re.IGNORECASE):
+                    schema_parts.append(leading + statement_sql)
+                    if _progress is not None:
+                        _progress.advance(byte_count)
+                    continue
+                schema_parts.append(leading)
+                after_insert = True
+                
+                started = time.perf_counter()
+                header = INSERT_HEADER.match(statement_sql) if values_start is not None else None
+                if header and header.group(1) not in partitions:
+                    table_name = header.group(1)
+                    columns = insert_columns(header)
+                    chunk_file(table_name, columns)
+                    row_count, checksum, bytes_out = stream_insert_to_copy(
+                        raw_statement.text, values_start, handles[table_name].write_bytes, checksums
+                    )
+                    chunks[table_name]['rows'] += row_count
+                    if checksums:
+                        chunks[table_name]['checksum'] = (chunks[table_name]['checksum'] + checksum) & CHECKSUM_MASK
+                else:
+                    if values_start is not None:
+                        # Partitioned tables route whole rows: decode it all
+                        statement_sql = split_leading(raw_statement.text.decode('utf-8', errors='surrogateescape'))[1]
+                    converted = convert_insert_to_copy(statement_sql)
+                    if converted is None:
+                        continue
+                    table_name, columns, lines = converted
+                    
+                    # Partitioned tables: rows go straight to their partition's files
+                    if table_name in partitions:
+                        routes = route_partition_rows(table_name, columns, lines, *partitions[table_name])
+                    else:
+                        routes = {table_name: (None, lines)}
+                    for target, (partition_key_value, target_lines) in routes.items():
+                        if target not in handles:
+                            chunk_file(target, columns)
+                            if target != table_name:
+                                chunks[target]['partition_of'] = table_name
+                                chunks[target]['partition_key'] = partition_key_value
+                        handles[target].writelines(target_lines)
+                        chunks[target]['rows'] += len(target_lines)
+                        if checksums:
+                            chunks[target]['checksum'] = (chunks[target]['checksum'] + row_checksum(target_lines)) & CHECKSUM_MASK
+                    row_count = len(lines)
+                    bytes_out = sum(map(len, lines))
+                
+                entry = table_stats.setdefault(table_name, new_table_stats())
+                entry['statements'] += 1
+                entry['rows'] += row_count
+                entry['bytes_in'] += byte_count
+                entry['bytes_out'] += bytes_out
+                entry['seconds'] += time.perf_counter() - started
+                
+                if _progress is not None:
+                    _progress.advance(byte_count, row_count, table_name)
+    finally:
+        for handle in handles.values():
+            handle.close()
+        if _progress is not None:
+            _progress.flush()
+    
+    for table_name, chunk in chunks.items():
+        chunk['bytes'] = handles[table_name].bytes_written
+    
+    return chunk_index, ''.join(schema_parts), chunks, table_stats
+
+def partition_key(value, interval):
+    """
+    Partition key ('2021-03' for monthly) of a COPY date or datetime value,
+    or None (the default partition) for NULL, zero and unparsable dates
+    """
+    match = PARTITION_DATE.match(value)
+    if not match or match.group(1) == '0000' or '00' in match.group(2, 3):
+        return None
+    return match.group(0)[:PARTITION_INTERVALS[interval]]
+
+def partition_name(table_name, key):
+    return f"{table_name}_p{key.replace('-', '_')}" if key else f'{table_name}_default'
+
+def route_partition_rows(table_name, columns, lines, column, interval, position):
+    """
+    Split the COPY lines of a partitioned table by partition.
+    The partition column is found in the INSERT's column list, else at
+    position (its place in the CREATE TABLE). A NULL key is an error: the
+    partition column is part of the primary key, so the row could not load.
+    Returns {partition table: (key, lines)}.
+    """
+    if columns is not None:
+        if column not in columns:
+            raise ValueError(f"INSERT into {table_name} has no column {column} to partition by")
+        position = columns.index(column)
+    elif position is None:
+        raise ValueError(f"No CREATE TABLE found for {table_name} and its INSERTs have no column list")
+    routes = {}
+    for line in lines:
+        value = line.split('\t', position + 1)[position]
+        if value.rstrip('\n') == '\\N':
+            raise ValueError(f"{table_name} has rows with a NULL {column}; a partitioned table has its partition "
+                             f"column in the primary key, so partition by a column without NULLs")
+        key = partition_key(value, interval)
+        routes.setdefault(partition_name(table_name, key), (key, []))[1].append(line)
+    return routes
+
+def find_table_columns(input_file, table_names, index=None):
+    """
+    Column names, in order, of the given tables from their CREATE TABLE in
+    the dump. A quick line scan: mysqldump starts every statement on a new
+    line and escapes line breaks in values. Stops once all tables are found.
+    With a dump index only the DDL of those tables is read.
+    """
+    found = {}
+    wanted = set(table_names)
+    current = None
+    with open(input_file, 'r', encoding='utf-8', errors='surrogateescape') as f:
+        lines = f
+        if index is not None:
+            from dump_index import read_ranges, schema_ranges
+            known = [name for name in table_names if name in index['tables']]
+            lines = b''.join(read_ranges(input_file, schema_ranges(index, known))).decode(
+                'utf-8', errors='surrogateescape').splitlines(keepends=True)
+        for line in lines:
+            if current is not None:
+                if line.startswith(')'):
+                    wanted.discard(current)
+                    current = None
+                    if not wanted:
+                        break
+                    continue
+                column = COLUMN_LINE.match(line)
+                if column and column.group(1).upper() not in NON_COLUMN_KEYWORDS:
+                    found[current].append(column.group(1).strip('`'))
+                continue
+            match = re.match(r'CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?`?(\w+)`?', line, re.IGNORECASE)
+            if match and match.group(1) in wanted:
+                current = match.group(1)
+                found[current] = []
+    return found
+
+def _init_worker(progress):
+    global _progress
+    _progress = progress
+
+def copy_tasks(input_file, copy_dir, chunk_size=DEFAULT_CHUNK_SIZE, compression=None, checksums=True,
+               partitions=None, row_group_size=DEFAULT_ROW_GROUP_SIZE, index=None):
+    """
+    Worker tasks for convert_data_range: the dump split into byte ranges of
+    about chunk_size at statement boundaries, each written to its own
+    numbered COPY chunk files in copy_dir. With a dump index (see
+    dump_index.py) the ranges follow the tables.
+    """
+    routing = {}
+    if partitions:
+        table_columns = find_table_columns(input_file, partitions, index)
+        for table_name, (column, interval) in partitions.items():
+            columns = table_columns.get(table_name)
+            if columns is not None and column not in columns:
+                raise ValueError(f"Table {table_name} has no column {column} to partition by")
+            routing[table_name] = (column, interval, columns.index(column) if columns else None)
+    
+    os.makedirs(copy_dir, exist_ok=True)
+    # The chunk layout depends only on the dump (and its index) and chunk_size,
+    # never on jobs, so every --jobs value writes the same files
+    if index is not None:
+        ranges = index_statement_ranges(input_file, index, chunk_size)
+    else:
+        ranges = find_statement_ranges(input_file, -(-os.path.getsize(input_file) // chunk_size))
+    return [(input_file, start, end, i, copy_dir, compression, checksums, routing, row_group_size)
+            for i, (start, end) in enumerate(ranges)]
+
+class CopyManifest:
+    """
+    Merges worker results, added in chunk order, into the --copy-dir manifest
+    (per table: columns, rows, checksum and chunk files) and the schema
+    statements found between the INSERTs
+    """
+
+    def __init__(self, input_file, partitions=None, stats=None):
+        self.input_file = input_file
+        self.partitions = dict(partitions or {})
+        self.stats = stats
+        self.schema_parts = []
+        self.tables = {}
+
+    def add(self, result):
+        chunk_index, schema_text, chunks, table_stats = result
+        self.schema_parts.append(schema_text)
+        if self.stats is not None:
+            self.stats.merge(table_stats)
+        for table_name, chunk in chunks.items():
+            table = self.tables.setdefault(table_name, {'columns': chunk['columns'], 'rows': 0,
+                                                        'checksum': None if chunk['checksum'] is None else 0,
+                                                        'chunks': []})
+            if table['columns'] is None:
+                table['columns'] = chunk['columns']
+            if 'partition_of' in chunk:
+                table['partition_of'] = chunk['partition_of']
+                table['partition_key'] = chunk['partition_key']
+            table['rows'] += chunk['rows']
+            if table['checksum'] is not None:
+                table['checksum'] = (table['checksum'] + chunk['checksum']) & CHECKSUM_MASK
+            table['chunks'].append({'file': chunk['file'], 'rows': chunk['rows'], 'bytes': chunk['bytes']})
+
+    def finish(self):
+        """
+        Returns (schema_sql, manifest)
+        """
+        tables = self.tables
+        for table in tables.values():
+            if table['checksum'] is not None:
+                # Hex string: JSON readers are not all safe with 64-bit integers
+                table['checksum'] = f"{table['checksum']:016x}"
+        manifest = {'source': os.path.abspath(self.input_file), 'tables': tables}
+        if self.partitions:
+            manifest['partitions'] = {}
+            for table_name, (column, interval) in self.partitions.items():
+                parts = [table for table in tables.values() if table.get('partition_of') == table_name]
+                keys = sorted(table['partition_key'] for table in parts if table['partition_key'])
+                manifest['partitions'][table_name] = {
+                    'column': column,
+                    'interval': interval,
+                    'first': keys[0] if keys else None,
+                    'last': keys[-1] if keys else None,
+                    'default_rows': sum(table['rows'] for table in parts if not table['partition_key']),
+                }
+        return ''.join(self.schema_parts), manifest
+
+def memory_shares(max_memory, workers):
+    """
+    (reorder buffer size, row group size) for a --max-memory budget: an equal
+    share each for the main process and the workers; a worker holds about
+    four copies of a row group (bytes, text, COPY lines, buffers)
+    """
+    if not max_memory:
+        return DEFAULT_MAX_MEMORY, DEFAULT_ROW_GROUP_SIZE
+    share = max_memory // (workers + 1)
+    return share, max(1024 * 1024, share // 4)
+
+def convert_dump_to_copy(input_file, copy_dir, jobs=1, chunk_size=DEFAULT_CHUNK_SIZE, verbose=False, stats=None,
+                         progress=False, compression=None, checksums=True, partitions=None, max_memory=None,
+                         index=None):
+    """
+    Convert the data in a MySQL dump to PostgreSQL COPY chunk files.
+    The dump is split into byte ranges at statement boundaries and each range
+    is converted by a worker process, so one huge table is spread over many
+    numbered chunks that can be loaded concurrently. The manifest records
+    each table's row count and, with checksums, its checksum (see row_checksum).
+    partitions ({table: (column, interval)}) routes the rows of those tables
+    to one manifest table per partition (with 'partition_of'); the manifest's
+    'partitions' entry gives the key range seen for build_postgresql_schema.
+    max_memory (bytes) is shared by the main process and the workers; it sets
+    the reorder buffer and the row groups of oversized INSERTs. index (see
+    dump_index.py) cuts the chunks at table boundaries.
+    Returns (schema_sql, manifest).
+    """
+    reorder_memory, row_group_size = memory_shares(max_memory, jobs)
+    tasks = copy_tasks(input_file, copy_dir, chunk_size, compression, checksums, partitions, row_group_size, index)
+    workers = min(jobs, len(tasks))
+    
+    if verbose:
+        print(f"Converting data in {len(tasks)} chunks with {workers} worker(s)...")
+    
+    merged = CopyManifest(input_file, partitions, stats)
+    reporter = ProgressReporter(os.path.getsize(input_file), 'Converting data', enabled=progress)
+    if jobs > 1 and len(tasks) > 1:
+        # Imported here: multiprocessing costs more at startup than the rest of the script
+        from multiprocessing import Pool, TimeoutError
+        shared = SharedProgress() if progress else None
+        # Results are merged in input order whatever order the workers finish in
+        with Pool(workers, initializer=_init_worker, initargs=(shared,)) as pool, \
+                ReorderBuffer(merged.add, reorder_memory, size_of=lambda result: len(result[1])) as reorder:
+            # Largest chunks first, so a big one is not the last to start
+            results = pool.imap_unordered(convert_data_range, sorted(tasks, key=lambda task: task[1] - task[2]))
+            for _ in tasks:
+                while True:
+                    try:
+                        result = results.next(reporter.interval)
+                        break
+                    except TimeoutError:
+                        if shared is not None:
+                            reporter.set(*shared.snapshot(), table=f'{len(tasks)} chunks')
+                reorder.add(result[0], result)
+    else:
+        _init_worker(reporter if progress else None)
+        try:
+            for task in tasks:
+                merged.add(convert_data_range(task))
+        finally:
+            _init_worker(None)
+    reporter.finish()
+    return merged.finish()
+
+def write_copy_manifest(copy_dir, manifest, schema, layouts=None, post_data=None, maintenance_stream_count=4,
+                        references=None):
+    """
+    Finish a --copy-dir: record the schema, the dump column order of
+    reordered tables and the tables each table references (references,
+    from table_references) in the manifest, write post_load.sql (post_data),
+    the maintenance.N.sql streams and maintenance.final.sql, then
+    manifest.json
+    """
+    import json
+    manifest['schema'] = schema
+    for name, entry in manifest['tables'].items():
+        table_name = entry.get('partition_of', name)
+        # Reordered tables: COPY must name the columns in dump order
+        columns = (layouts or {}).get(table_name)
+        if columns is not None and entry['columns'] is None:
+            entry['columns'] = columns
+        # load_postgresql.py loads referenced tables first, so foreign keys hold during COPY
+        referenced = [table for table in dict.fromkeys((references or {}).get(table_name, [])) if table != table_name]
+        if referenced:
+            entry['references'] = referenced
+        # Its rows can reference rows in its other chunks, so those load one at a time
+        if table_name in (references or {}).get(table_name, []):
+            entry['self_reference'] = True
+    if post_data is not None:
+        # Indexes and SET LOGGED run after the data is in (load_postgresql.py does it)
+        with open(os.path.join(copy_dir, 'post_load.sql'), 'w', encoding='utf-8') as f:
+            f.write(f"SET search_path TO {schema}, public;\n" if schema else '')
+            f.write(''.join(post_data))
+        manifest['session'] = dict(FAST_LOAD_SETTINGS)
+        manifest['post_load'] = ['post_load.sql']
+    if maintenance_stream_count > 0 and manifest['tables']:
+        # Fresh tables have no planner statistics until analyzed
+        streams, final = maintenance_streams(manifest, maintenance_stream_count, schema)
+        manifest['maintenance'] = []
+        for number, statements in enumerate(streams, 1):
+            script = f'maintenance.{number}.sql'
+            with open(os.path.join(copy_dir, script), 'w', encoding='utf-8') as f:
+                f.write(f"-- Post-load maintenance, stream {number} of {len(streams)}: run in parallel with "
+                        f"the other maintenance.*.sql scripts after the load\n")
+                f.writelines(statements)
+            manifest['maintenance'].append(script)
+        if final:
+            with open(os.path.join(copy_dir, 'maintenance.final.sql'), 'w', encoding='utf-8') as f:
+                f.write("-- Post-load maintenance: run after all the maintenance.N.sql streams have finished\n")
+                f.writelines(final)
+            manifest['maintenance_final'] = 'maintenance.final.sql'
+    with open(os.path.join(copy_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+def maintenance_streams(manifest, stream_count, schema=None):
+    """
+    Post-load VACUUM (ANALYZE) statements for every loaded table, split into
+    stream_count streams to run in parallel. Tables are taken largest first
+    (by the row counts in the manifest) and each goes to the stream with the
+    fewest rows so far, so the streams finish at about the same time and
+    the big tables start at once. Partitioned tables get an ANALYZE of the
+    parent for its own statistics, which samples the partitions, so those
+    go in a final step for after all the streams.
+    Returns (streams, final statements).
+    """
+    tables = sorted(manifest['tables'].items(), key=lambda item: (-item[1]['rows'], item[0]))
+    streams = [[] for _ in range(max(1, min(stream_count, len(tables))))]
+    loads = [0] * len(streams)
+    for table, entry in tables:
+        stream = loads.index(min(loads))
+        target = f'{schema}.{quote_identifier(table)}' if schema else quote_identifier(table)
+        streams[stream].append(f'VACUUM (ANALYZE) {target};\n')
+        loads[stream] += entry['rows']
+    final = []
+    for table in manifest.get('partitions', {}):
+        target = f'{schema}.{quote_identifier(table)}' if schema else quote_identifier(table)
+        final.append(f'ANALYZE {target};\n')
+    return [stream for stream in streams if stream], final
+
+def parse_mysql_tables(mysql_sql):
+    """
+    Parse the CREATE TABLE statements of a MySQL dump.
+    Returns {table: {'columns': [(name, definition), ...], 'primary_key': [...]}}
+    """
+    tables = {}
+    for match in CREATE_TABLE_BLOCK.finditer(mysql_sql):
+        columns = []
+        primary_key = []
+        for line in match.group(2).split('\n'):
+            line = line.strip().rstrip(',')
+            if not line:
+                continue
+            pk_match = re.match(r'PRIMARY\s+KEY\s*\((.*)\)', line, re.IGNORECASE)
+            if pk_match:
+                primary_key = [re.sub(r'\(\d+\)$', '', col.strip()).strip('`') for col in pk_match.group(1).split(',')]
+                continue
+            column_match = re.match(r'`([^`]+)`\s+(.*)$', line)
+            if column_match:
+                columns.append((column_match.group(1), column_match.group(2)))
+        tables[match.group(1)] = {'columns': columns, 'primary_key': primary_key}
+    return tables
+
+def quote_identifier(name):
+    """
+    Leave plain identifiers unquoted (so they fold like the converted DDL), quote the rest
+    """
+    return name if re.match(r'^\w+$', name) else '"' + name.replace('"', '""') + '"'
+
+def sql_literal(value):
+    """
+    Format a plain value as a PostgreSQL literal. Quoted literals are coerced
+    to the target column type by INSERT, so numbers can be quoted too.
+    """
+    if value is None:
+        return 'NULL'
+    return "'" + value.replace("'", "''") + "'"
+
+def copy_field(value):
+    """
+    Format a plain value as a COPY text field
+    """
+    if value is None:
+        return '\\N'
+    return value.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+def parse_binlog_value(text):
+    """
+    Parse one @N= value from mysqlbinlog -v output. Strings are printed with
+    control characters as \\xNN and quotes left unescaped, one value per line.
+    """
+    if text == 'NULL':
+        return None
+    bit_match = re.match(r"^b'([01]*)'$", text)
+    if bit_match:
+        return str(int(bit_match.group(1) or '0', 2))
+    if len(text) >= 2 and text[0] == "'" and text[-1] == "'":
+        return re.sub(r'\\x([0-9a-fA-F]{2})', lambda m: chr(int(m.group(1), 16)), text[1:-1])
+    return text
+
+def iter_dump_changes(lines, tables):
+    """
+    Yield ('upsert', table, columns, rows) for every INSERT in a (delta) dump.
+    CREATE TABLE statements found along the way are added to tables; an
+    INSERT into a table defined by neither raises ValueError, as its
+    columns and primary key are unknown.
+    """
+    for statement in split_statements(lines):
+        _, statement_sql = split_leading(statement.text)
+        statement_sql = statement_sql.strip()
+        if re.match(r'CREATE\s+TABLE', statement_sql, re.IGNORECASE):
+            tables.update(parse_mysql_tables(statement_sql + '\n'))
+            continue
+        
+        header = INSERT_HEADER.match(statement_sql)
+        if not header:
+            continue
+        table_name = header.group(1)
+        if table_name not in tables:
+            raise ValueError(f"Table '{table_name}' in the dump has no CREATE TABLE, so its columns and "
+                             f"primary key are unknown (dump with the schema or use --schema-file)")
+        columns = insert_columns(header) or [name for name, _ in tables[table_name]['columns']]
+        yield 'upsert', table_name, columns, list(parse_insert_rows(statement_sql[header.end():], raw=True))
+
+def iter_binlog_changes(lines, tables):
+    """
+    Yield ('upsert' | 'delete', table, columns, rows) for the row events in
+    mysqlbinlog --base64-output=DECODE-ROWS -v output. Binlog rows are
+    positional (@1, @2, ...), so column names come from the parsed schema.
+    """
+    def flush(event):
+        kind, table_name, where, values = event
+        if table_name not in tables:
+            raise ValueError(f"Table '{table_name}' in binlog is not in the schema (use --schema-file)")
+        columns = [name for name, _ in tables[table_name]['columns']]
+        primary_key = tables[table_name]['primary_key']
+        
+        def as_row(image):
+            if image and max(image) > len(columns):
+                raise ValueError(f"Binlog row for '{table_name}' has more columns than its schema definition")
+            return {columns[index - 1]: value for index, value in image.items()}
+        
+        if kind == 'DELETE FROM':
+            row = as_row(where)
+            yield 'delete', table_name, primary_key, [[row.get(col) for col in primary_key]]
+            return
+        if kind == 'UPDATE':
+            old_row = as_row(where)
+            new_row = as_row(values)
+            old_key = [old_row.get(col) for col in primary_key]
+            if primary_key and old_key != [new_row.get(col) for col in primary_key]:
+                yield 'delete', table_name, primary_key, [old_key]
+        row = as_row(values)
+        row_columns = [col for col in columns if col in row]
+        yield 'upsert', table_name, row_columns, [[row[col] for col in row_columns]]
+    
+    event = None
+    section = None
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if not line.startswith('###'):
+            continue
+        event_match = BINLOG_EVENT.match(line)
+        if event_match:
+            if event:
+                yield from flush(event)
+            event = (event_match.group(1), event_match.group(2), {}, {})
+            section = None
+            continue
+        keyword = line[3:].strip()
+        if keyword in ('WHERE', 'SET'):
+            section = keyword
+            continue
+        value_match = BINLOG_VALUE.match(line)
+        if event and value_match:
+            target = event[2] if section == 'WHERE' else event[3]
+            target[int(value_match.group(1))] = parse_binlog_value(value_match.group(2))
+    if event:
+        yield from flush(event)
+
+class SyncWriter:
+    """
+    Writes idempotent PostgreSQL statements for a stream of row changes.
+    Consecutive upserts for one table are batched; a batch never holds the
+    same primary key twice, so ON CONFLICT DO UPDATE never hits a row twice.
+    method 'upsert' writes INSERT ... ON CONFLICT batches, 'staging' COPYs
+    each batch into a temp table and merges it from there.
+    """
+    
+    def __init__(self, out, schema, tables, method='upsert', batch_size=DEFAULT_SYNC_BATCH_SIZE):
+        self.out = out
+        self.schema = schema
+        self.tables = tables
+        self.method = method
+        self.batch_size = batch_size
+        self.batch = None
+        self.batch_keys = set()
+        self.counts = {}
+    
+    def qualified(self, table_name):
+        return f'{self.schema}.{quote_identifier(table_name)}' if self.schema else quote_identifier(table_name)
+    
+    def upsert(self, table_name, columns, rows):
+        primary_key = self.tables.get(table_name, {}).get('primary_key', [])
+        key_positions = [columns.index(col) for col in primary_key if col in columns]
+        for row in rows:
+            key = tuple(row[i] for i in key_positions) if key_positions else None
+            if self.batch and (self.batch[0] != table_name or self.batch[1] != columns
+                               or len(self.batch[2]) >= self.batch_size or (key is not None and key in self.batch_keys)):
+                self.flush()
+            if not self.batch:
+                self.batch = (table_name, columns, [])
+            self.batch[2].append(row)
+            if key is not None:
+                self.batch_keys.add(key)
+    
+    def delete(self, table_name, key_columns, key_rows):
+        self.flush()
+        if not key_columns:
+            self.out.write(f'-- WARNING: {table_name} has no primary key; delete skipped\n')
+            return
+        target = ', '.join(quote_identifier(col) for col in key_columns)
+        keys = ', '.join('(' + ', '.join(sql_literal(v) for v in row) + ')' for row in key_rows)
+        self.out.write(f'DELETE FROM {self.qualified(table_name)} WHERE ({target}) IN ({keys});\n')
+        self.counts.setdefault(table_name, {'upserted': 0, 'deleted': 0})['deleted'] += len(key_rows)
+    
+    def conflict_clause(self, table_name, columns):
+        primary_key = self.tables.get(table_name, {}).get('primary_key', [])
+        if not primary_key:
+            return 'ON CONFLICT DO NOTHING'
+        updates = [f'{quote_identifier(col)} = EXCLUDED.{quote_identifier(col)}' for col in columns if col not in primary_key]
+        target = ', '.join(quote_identifier(col) for col in primary_key)
+        if not updates:
+            return f'ON CONFLICT ({target}) DO NOTHING'
+        return f'ON CONFLICT ({target}) DO UPDATE SET ' + ', '.join(updates)
+    
+    def flush(self):
+        if not self.batch:
+            return
+        table_name, columns, rows = self.batch
+        self.batch = None
+        self.batch_keys = set()
+        
+        if not self.tables.get(table_name, {}).get('primary_key'):
+            self.out.write(f'-- WARNING: {table_name} has no primary key; rows are inserted without upsert\n')
+        column_list = ', '.join(quote_identifier(col) for col in columns)
+        conflict = self.conflict_clause(table_name, columns)
+        
+        if self.method == 'staging':
+            stage = quote_identifier(f'sync_stage_{table_name}')
+            self.out.write(
+                f'CREATE TEMP TABLE IF NOT EXISTS {stage} (LIKE {self.qualified(table_name)} INCLUDING DEFAULTS) ON COMMIT DROP;\n'
+                f'TRUNCATE {stage};\n'
+                f'COPY {stage} ({column_list}) FROM stdin;\n'
+            )
+            self.out.writelines('\t'.join(copy_field(v) for v in row) + '\n' for row in rows)
+            self.out.write('\\.\n')
+            self.out.write(
+                f'INSERT INTO {self.qualified(table_name)} ({column_list})\n'
+                f'SELECT {column_list} FROM {stage}\n{conflict};\n'
+            )
+        else:
+            self.out.write(f'INSERT INTO {self.qualified(table_name)} ({column_list}) VALUES\n')
+            self.out.write(',\n'.join('(' + ', '.join(sql_literal(v) for v in row) + ')' for row in rows))
+            self.out.write(f'\n{conflict};\n')
+        self.counts.setdefault(table_name, {'upserted': 0, 'deleted': 0})['upserted'] += len(rows)
+
+def convert_changes_to_sync(input_file, output_file, schema='mifos', tables=None, method='upsert',
+                            binlog=False, batch_size=DEFAULT_SYNC_BATCH_SIZE, compression=None):
+    """
+    Convert a delta dump (mysqldump --where="updatedon_date >= ...") or a
+    decoded binlog to an idempotent sync script that can be replayed safely.
+    Primary keys come from the parsed MySQL schema.
+    Returns per-table counts of upserted and deleted rows. On an error no
+    script is left behind, as a partial one would apply part of the delta.
+    """
+    tables = dict(tables or {})
+    try:
+        with open(input_file, 'r', encoding='utf-8', errors='surrogateescape') as src, \
+                OutputWriter(output_file, compression, errors='surrogateescape') as out:
+            out.write('-- PostgreSQL incremental sync (idempotent, safe to re-run)\n')
+            out.write('BEGIN;\n')
+            if schema:
+                out.write(f'SET search_path TO {schema}, public;\n')
+            out.write('\n')
+            
+            writer = SyncWriter(out, schema, tables, method, batch_size)
+            changes = iter_binlog_changes(src, tables) if binlog else iter_dump_changes(src, tables)
+            for kind, table_name, columns, rows in changes:
+                if kind == 'delete':
+                    writer.delete(table_name, columns, rows)
+                else:
+                    writer.upsert(table_name, columns, rows)
+            writer.flush()
+            out.write('\nCOMMIT;\n')
+    except Exception:
+        if os.path.exists(output_file):
+            os.remove(output_file)
+        raise
+    return writer.counts
+
+def run_sync(args):
+    """
+    --sync entry point: write the idempotent sync script for a delta dump or binlog
+    """
+    tables = {}
+    try:
+        if args.schema_file:
+            with open(args.schema_file, 'r', encoding='utf-8', errors='surrogateescape') as f:
+                tables = parse_mysql_tables(f.read())
+        output_file = with_suffix(args.output or args.input_file.replace('.sql', '_sync.sql'), args.compress)
+        counts = convert_changes_to_sync(
+            args.input_file, output_file, args.schema, tables, args.sync,
+            args.binlog, max(1, args.batch_size), args.compress
+        )
+    except FileNotFoundError as e:
+        print(f"Error: File '{e.filename}' not found")
+        sys.exit(1)
+    except (ValueError, RuntimeError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    
+    print(f"✓ Sync script written!")
+    print(f"  Input:  {args.input_file}")
+    print(f"  Output: {output_file}")
+    for table_name, count in sorted(counts.items()):
+        print(f"  {table_name}: {count['upserted']:,} upserted, {count['deleted']:,} deleted")
+
+def run_stream(args):
+    """
+    Input '-': convert a dump piped on stdin a statement at a time (see
+    migration_api.convert) into one psql script of DDL and COPY data, on
+    stdout unless -o is given
+    """
+    from migration_api import convert, iter_statements
+    whole_dump = [flag for flag, used in [('--copy-dir', args.copy_dir), ('--partition', args.partition),
+                                          ('--optimize-layout', args.optimize_layout), ('--fast-load', args.fast_load),
+                                          ('--validate', args.validate)] if used]
+    if whole_dump:
+        print(f"Error: {', '.join(whole_dump)} cannot be used when reading the dump from stdin", file=sys.stderr)
+        sys.exit(1)
+    
+    # A row group is held about six times over (input, text, COPY lines, output)
+    row_group_size = max(1024 * 1024, args.max_memory * 1024 * 1024 // 8) if args.max_memory else DEFAULT_ROW_GROUP_SIZE
+    stats = ConversionStats('-')
+    pieces = convert(iter_statements(sys.stdin.buffer, row_group_size=row_group_size), args.schema, stats=stats)
+    try:
+        if args.output:
+            output_file = with_suffix(args.output, args.compress)
+            with OutputWriter(output_file, args.compress, errors='surrogateescape') as f:
+                for piece in pieces:
+                    f.write(piece)
+        else:
+            output_file = '-'
+            sys.stdout.reconfigure(errors='surrogateescape')
+            sys.stdout.writelines(pieces)
+            sys.stdout.flush()
+    except BrokenPipeError:
+        sys.exit(1)
+    except Exception as e:
+        print(f"Error converting stdin: {e}", file=sys.stderr)
+        sys.exit(1)
+    
+    stats.finish(output_bytes=os.path.getsize(output_file) if output_file != '-' else None)
+    if args.stats_json:
+        stats.write_json(args.stats_json)
+    if args.verbose:
+        print(stats.format_report(limit=25), file=sys.stderr)
+
+def run(args):
+    """
+    Convert as the command line asks (args from convert_mysql_to_postgresql.py)
+    """
+    if args.sync:
+        run_sync(args)
+        return
+    if args.input_file == '-':
+        run_stream(args)
+        return
+    
+    partitions = {}
+    for spec in args.partition:
+        table_name, _, rest = spec.partition(':')
+        column, _, interval = rest.partition(':')
+        interval = interval or 'monthly'
+        if not table_name or not column or interval not in PARTITION_INTERVALS:
+            print(f"Error: --partition '{spec}' is not TABLE:COLUMN[:{'|'.join(PARTITION_INTERVALS)}]")
+            sys.exit(1)
+        partitions[table_name] = (column, interval)
+    if partitions and not args.copy_dir:
+        print("Error: --partition needs --copy-dir (the partitions are made for the date range of the data)")
+        sys.exit(1)
+    if args.max_memory and not args.copy_dir:
+        print("Error: --max-memory needs --copy-dir (without it the whole dump is converted in memory)")
+        sys.exit(1)
+    
+    stats = ConversionStats(args.input_file)
+    if args.progress is None:
+        args.progress = sys.stderr.isatty()
+    
+    # Read input file
+    manifest = None
+    try:
+        if args.copy_dir:
+            from dump_index import load_index
+            mysql_sql, manifest = convert_dump_to_copy(
+                args.input_file, args.copy_dir, max(1, args.jobs),
+                max(1, args.chunk_size) * 1024 * 1024, args.verbose, stats, args.progress, args.compress,
+                args.checksums, partitions, args.max_memory and max(1, args.max_memory) * 1024 * 1024,
+                load_index(args.input_file, args.verbose) if args.index else None
+            )
+        else:
+            with open(args.input_file, 'r', encoding='utf-8') as f:
+                mysql_sql = f.read()
+            count_table_rows(args.input_file, stats)
+    except FileNotFoundError:
+        print(f"Error: File '{args.input_file}' not found")
+        sys.exit(1)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    except Exception as e:
+        print(f"Error reading file: {e}")
+        sys.exit(1)
+    
+    layouts = {} if args.optimize_layout else None
+    post_data = [] if args.fast_load and manifest is not None else None
+    postgresql_sql = build_postgresql_schema(
+        mysql_sql, args.schema, args.verbose, stats, layouts, manifest.get('partitions') if manifest else None,
+        args.fast_load, args.maintenance_work_mem, post_data
+    )
+    
+    # Determine output file
+    output_file = with_suffix(args.output or args.input_file.replace('.sql', '_postgresql.sql'), args.compress)
+    
+    # Write output
+    try:
+        with OutputWriter(output_file, args.compress) as f:
+            f.write(postgresql_sql)
+        
+        if manifest is not None:
+            write_copy_manifest(args.copy_dir, manifest, args.schema, layouts, post_data, args.maintenance_streams,
+                                table_references(mysql_sql))
+        
+        print(f"✓ Conversion complete!")
+        print(f"  Input:  {args.input_file}")
+        print(f"  Output: {output_file}")
+        if manifest is not None:
+            chunk_total = sum(len(t['chunks']) for t in manifest['tables'].values())
+            print(f"  Data:   {args.copy_dir} ({len(manifest['tables'])} tables, {chunk_total} COPY chunks)")
+            if manifest.get('maintenance'):
+                print(f"  Maintenance: {len(manifest['maintenance'])} VACUUM (ANALYZE) stream(s) "
+                      f"({', '.join(manifest['maintenance'])})"
+                      + (f", then {manifest['maintenance_final']}" if manifest.get('maintenance_final') else ''))
+            for table_name, spec in manifest.get('partitions', {}).items():
+                span = f"{spec['first']} to {spec['last']}" if spec['first'] else 'no dated rows'
+                print(f"  Partitioned: {table_name} by {spec['column']} ({spec['interval']}, {span})")
+                if spec['default_rows']:
+                    print(f"    Warning: {spec['default_rows']:,} rows with an invalid {spec['column']} "
+                          f"go to the default partition")
+            if stats.rules.get('partition_foreign_key_dropped'):
+                print(f"  Warning: {stats.rules['partition_foreign_key_dropped']} foreign key(s) referencing a "
+                      f"partitioned table not created (listed after the indexes)")
+        
+        output_bytes = os.path.getsize(output_file)
+        if manifest is not None:
+            output_bytes += sum(c['bytes'] for t in manifest['tables'].values() for c in t['chunks'])
+        stats.finish(os.path.getsize(args.input_file), output_bytes)
+        print(f"\n  Run report:")
+        print(stats.format_report(limit=25))
+        if args.stats_json:
+            stats.write_json(args.stats_json)
+            print(f"  Stats:  {args.stats_json}")
+        if args.fast_load:
+            print(f"\n⚠️  FAST LOAD: tables are UNLOGGED until the load finishes. Use only for the initial load")
+            print(f"   into an empty database; a crash before SET LOGGED leaves the tables empty.")
+        print(f"\n⚠️  IMPORTANT: Review the converted SQL manually before importing!")
+        print(f"   Some conversions may need manual adjustment, especially:")
+        print(f"   - Complex data types")
+        print(f"   - Foreign key constraints")
+        
+    except Exception as e:
+        print(f"Error writing output file: {e}")
+        sys.exit(1)
+    
+    if args.validate:
+        # Imported here: only --validate needs it
+        from validate_schema import print_report, validate_sql
+        started = time.perf_counter()
+        try:
+            backend, statement_count, failures = validate_sql(
+                postgresql_sql, args.validate, max(1, args.jobs), args.validate_dsn
+            )
+        except (RuntimeError, ValueError) as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        print_report(backend, statement_count, failures, time.perf_counter() - started, output_file)
+        if failures:
+            sys.exit(1)
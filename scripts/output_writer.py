@@ -0,0 +1,155 @@
+"""
+Buffered Output Writer
+Gathers converted text into a large bytearray and writes it out in few big
+writes instead of one per statement. With compression (gzip, or zstd if the
+zstandard package is installed) the buffers are compressed and written on a
+background thread, so conversion and compression overlap; zlib and zstd
+release the GIL while they work.
+"""
+
+import os
+
+DEFAULT_BUFFER_SIZE = 4 * 1024 * 1024
+
+COMPRESSION_SUFFIXES = {'gzip': '.gz', 'zstd': '.zst'}
+
+def with_suffix(path, compression):
+    """
+    path with the file suffix of the compression added (if not already there)
+    """
+    suffix = COMPRESSION_SUFFIXES.get(compression, '')
+    return path if path.endswith(suffix) else path + suffix
+
+def _compressor(compression, level):
+    """
+    Object with compress(data) and flush(), or None for plain output
+    """
+    if compression is None:
+        return None
+    if compression == 'gzip':
+        import zlib
+        return zlib.compressobj(6 if level is None else level, zlib.DEFLATED, 31)  # 31: gzip header
+    if compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError('zstd compression needs the zstandard package (pip install zstandard)')
+        return zstandard.ZstdCompressor(level=3 if level is None else level, threads=-1).compressobj()
+    raise ValueError(f"Unknown compression '{compression}' (use {', '.join(COMPRESSION_SUFFIXES)})")
+
+class OutputWriter:
+    """
+    Write-only text file with large buffers and optional background compression.
+    Use like a file opened with open(path, 'w'): write(), writelines(), close(),
+    or as a context manager. bytes_written counts bytes on disk.
+    """
+
+    def __init__(self, path, compression=None, level=None, buffer_size=DEFAULT_BUFFER_SIZE,
+                 encoding='utf-8', errors='strict'):
+        self.path = path
+        self.encoding = encoding
+        self.errors = errors
+        self.buffer_size = buffer_size
+        self.buffer = bytearray()
+        self.bytes_written = 0
+        self.compressor = _compressor(compression, level)
+        self.file = open(path, 'wb', buffering=0)
+        self.closed = False
+        self.error = None
+        self.thread = None
+        if self.compressor is not None:
+            import queue
+            import threading
+            # Two buffers queued at most: memory stays bounded if the disk is slow
+            self.queue = queue.Queue(maxsize=2)
+            self.thread = threading.Thread(target=self._compress_loop, name=f'compress {os.path.basename(path)}',
+                                           daemon=True)
+            self.thread.start()
+
+    def write(self, text):
+        self.buffer += text.encode(self.encoding, self.errors)
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def write_bytes(self, data):
+        """
+        Write bytes (or a memoryview) that are already encoded
+        """
+        self.buffer += data
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def writelines(self, lines):
+        # One join and encode is much cheaper than encoding line by line
+        self.write(''.join(lines))
+
+    def flush(self):
+        """
+        Hand the buffer to the disk (or the compression thread)
+        """
+        if not self.buffer:
+            return
+        data, self.buffer = self.buffer, bytearray()
+        if self.thread is None:
+            self._write(data)
+        else:
+            self._check_error()
+            self.queue.put(data)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.flush()
+            if self.thread is not None:
+                self.queue.put(None)
+                self.thread.join()
+                self._check_error()
+        finally:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _write(self, data):
+        view = memoryview(data)
+        while view:
+            written = self.file.write(view)
+            self.bytes_written += written
+            view = view[written:]
+
+    def _compress_loop(self):
+        data = b''
+        try:
+            while True:
+                data = self.queue.get()
+                if data is None:
+                    self._write(self.compressor.flush())
+                    return
+                self._write(self.compressor.compress(data))
+        except BaseException as e:
+            self.error = e
+            # Keep draining so the producer never blocks on a full queue
+            while data is not None:
+                data = self.queue.get()
+
+    def _check_error(self):
+        if self.error is not None:
+            raise self.error
+
+def open_compressed(path):
+    """
+    Open a file written by OutputWriter for binary reading, decompressing
+    by file suffix (.gz, .zst)
+    """
+    if path.endswith(COMPRESSION_SUFFIXES['gzip']):
+        import gzip
+        return gzip.open(path, 'rb')
+    if path.endswith(COMPRESSION_SUFFIXES['zstd']):
+        import zstandard
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    return open(path, 'rb')
@@ -0,0 +1,130 @@
+"""
+Progress Reporting
+Streams byte offset against total size, current table, rows/s and an ETA
+to stderr. Updates are throttled by time so reporting stays well under 1%
+of conversion throughput.
+"""
+
+import sys
+import time
+
+# Workers publish their counters at most once per this many bytes
+SHARED_FLUSH_BYTES = 4 * 1024 * 1024
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    return f'{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}'
+
+class ProgressReporter:
+    """
+    Throttled progress line for a job of known total size in bytes
+    """
+
+    def __init__(self, total_bytes, label='Progress', stream=None, interval=1.0, enabled=True):
+        self.total_bytes = max(total_bytes, 1)
+        self.label = label
+        self.stream = stream or sys.stderr
+        self.enabled = enabled
+        self.is_tty = hasattr(self.stream, 'isatty') and self.stream.isatty()
+        # Plain log files (cron, CI) get a full line every 10 intervals instead of '\r' updates
+        self.interval = interval if self.is_tty else interval * 10
+        self.done_bytes = 0
+        self.rows = 0
+        self.table = None
+        self.started = time.monotonic()
+        self._last_render = self.started
+
+    def advance(self, byte_count, rows=0, table=None):
+        """
+        Add to the counters and redraw if the interval has passed
+        """
+        self.done_bytes += byte_count
+        self.rows += rows
+        if table is not None:
+            self.table = table
+        self._maybe_render()
+
+    def set(self, done_bytes, rows=None, table=None):
+        """
+        Set absolute counters, e.g. from a reader offset or polled shared counters
+        """
+        self.done_bytes = done_bytes
+        if rows is not None:
+            self.rows = rows
+        if table is not None:
+            self.table = table
+        self._maybe_render()
+
+    def flush(self):
+        """
+        Counters are local to this process; nothing to publish
+        """
+
+    def _maybe_render(self):
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        if now - self._last_render < self.interval:
+            return
+        self._last_render = now
+        self.render(now)
+
+    def render(self, now=None):
+        now = now or time.monotonic()
+        elapsed = max(now - self.started, 1e-6)
+        fraction = min(self.done_bytes / self.total_bytes, 1.0)
+        rate = self.done_bytes / elapsed
+        eta = (self.total_bytes - self.done_bytes) / rate if rate > 0 else 0
+        parts = [
+            f'{self.label}: {self.done_bytes / 1048576:,.1f}/{self.total_bytes / 1048576:,.1f} MB ({fraction:.1%})',
+            f'{rate / 1048576:.1f} MB/s',
+            f'{self.rows / elapsed:,.0f} rows/s',
+        ]
+        if self.table:
+            parts.insert(1, self.table)
+        parts.append(f'ETA {format_duration(eta)}')
+        line = ' | '.join(parts)
+        if self.is_tty:
+            self.stream.write('\r' + line.ljust(110)[:160])
+        else:
+            self.stream.write(line + '\n')
+        self.stream.flush()
+
+    def finish(self):
+        if not self.enabled:
+            return
+        self.done_bytes = max(self.done_bytes, self.total_bytes)
+        self.render()
+        if self.is_tty:
+            self.stream.write('\n')
+        self.stream.flush()
+
+class SharedProgress:
+    """
+    Byte and row counters shared with worker processes. Workers call
+    advance(); the parent polls snapshot() and feeds a ProgressReporter.
+    """
+
+    def __init__(self):
+        from multiprocessing import Value  # only needed with --jobs, keeps startup fast
+        self.bytes = Value('q', 0)
+        self.rows = Value('q', 0)
+        self._pending_bytes = 0
+        self._pending_rows = 0
+
+    def advance(self, byte_count, rows=0, table=None):
+        self._pending_bytes += byte_count
+        self._pending_rows += rows
+        if self._pending_bytes >= SHARED_FLUSH_BYTES:
+            self.flush()
+
+    def flush(self):
+        with self.bytes.get_lock():
+            self.bytes.value += self._pending_bytes
+        with self.rows.get_lock():
+            self.rows.value += self._pending_rows
+        self._pending_bytes = 0
+        self._pending_rows = 0
+
+    def snapshot(self):
+        return self.bytes.value, self.rows.value
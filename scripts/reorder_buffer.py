@@ -0,0 +1,93 @@
+"""
+Reorder Buffer
+Worker results can finish in any order; the buffer hands them on strictly
+in input sequence so parallel runs produce byte-identical output. Results
+waiting for an earlier one are held in memory up to a limit and pickled to
+a temporary file beyond it.
+"""
+
+DEFAULT_MAX_MEMORY = 64 * 1024 * 1024
+
+class ReorderBuffer:
+    """
+    add(index, item) in any order; emit(item) is called for index 0, 1, 2, ...
+    in sequence as soon as each is available. size_of(item) estimates the
+    memory an item holds; once waiting items exceed max_memory, further
+    ones are spilled to disk until emitted.
+    """
+
+    def __init__(self, emit, max_memory=DEFAULT_MAX_MEMORY, size_of=None, start=0, spill_dir=None):
+        self.emit = emit
+        self.max_memory = max_memory
+        self.size_of = size_of or (lambda item: 0)
+        self.next_index = start
+        self.spill_dir = spill_dir
+        self.waiting = {}        # index -> (item, size) held in memory
+        self.spilled = {}        # index -> (offset, length) in spill_file
+        self.memory = 0
+        self.spill_file = None
+        self.spill_count = 0
+
+    def add(self, index, item):
+        if index < self.next_index or index in self.waiting or index in self.spilled:
+            raise ValueError(f'Result {index} was already added')
+        if index != self.next_index:
+            self._hold(index, item)
+            return
+        self.emit(item)
+        self.next_index += 1
+        self._drain()
+
+    def _hold(self, index, item):
+        size = self.size_of(item)
+        if self.memory + size <= self.max_memory:
+            self.waiting[index] = (item, size)
+            self.memory += size
+            return
+        # pickle and tempfile are only imported once something spills
+        import pickle
+        if self.spill_file is None:
+            import tempfile
+            self.spill_file = tempfile.TemporaryFile(prefix='reorder-', dir=self.spill_dir)
+        self.spill_file.seek(0, 2)
+        offset = self.spill_file.tell()
+        data = pickle.dumps(item, pickle.HIGHEST_PROTOCOL)
+        self.spill_file.write(data)
+        self.spilled[index] = (offset, len(data))
+        self.spill_count += 1
+
+    def _drain(self):
+        while True:
+            index = self.next_index
+            if index in self.waiting:
+                item, size = self.waiting.pop(index)
+                self.memory -= size
+            elif index in self.spilled:
+                import pickle
+                offset, length = self.spilled.pop(index)
+                self.spill_file.seek(offset)
+                item = pickle.loads(self.spill_file.read(length))
+            else:
+                return
+            self.emit(item)
+            self.next_index += 1
+
+    def close(self):
+        """
+        Check nothing is still waiting (a missing result) and drop the spill file
+        """
+        missing = sorted(set(self.waiting) | set(self.spilled))
+        if self.spill_file is not None:
+            self.spill_file.close()
+            self.spill_file = None
+        if missing:
+            raise RuntimeError(f'Result {self.next_index} never arrived ({len(missing)} later result(s) waiting)')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        elif self.spill_file is not None:
+            self.spill_file.close()
@@ -0,0 +1,80 @@
+"""
+Spill Buffer
+Ordered list of strings (statements, output lines) collected now and written
+out later, such as the foreign keys that go after every CREATE TABLE. Items
+are held in memory up to a limit; beyond it the held items are pickled to a
+temporary file (in $TMPDIR) as one batch, so a schema of any size fits a
+fixed budget.
+"""
+
+DEFAULT_MAX_MEMORY = 64 * 1024 * 1024
+
+def megabytes(value):
+    """
+    --max-memory argument in MB as a byte count (None stays None)
+    """
+    return None if value is None else max(1, value) * 1024 * 1024
+
+class SpillBuffer:
+    """
+    append(item) and extend(items), then iterate to get the items back in
+    the same order. Memory use is about max_memory characters plus one batch
+    while reading back.
+    """
+
+    def __init__(self, max_memory=DEFAULT_MAX_MEMORY, spill_dir=None):
+        self.max_memory = max_memory or DEFAULT_MAX_MEMORY
+        self.spill_dir = spill_dir
+        self.items = []
+        self.memory = 0
+        self.count = 0
+        self.spill_file = None
+        self.spill_count = 0
+
+    def append(self, item):
+        self.items.append(item)
+        self.memory += len(item)
+        self.count += 1
+        if self.memory > self.max_memory:
+            self._spill()
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+
+    def _spill(self):
+        # pickle and tempfile are only imported once something spills
+        import pickle
+        if self.spill_file is None:
+            import tempfile
+            self.spill_file = tempfile.TemporaryFile(prefix='spill-', dir=self.spill_dir)
+        self.spill_file.seek(0, 2)
+        pickle.dump(self.items, self.spill_file, pickle.HIGHEST_PROTOCOL)
+        self.spill_count += 1
+        self.items = []
+        self.memory = 0
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        if self.spill_file is not None:
+            import pickle
+            self.spill_file.seek(0)
+            for _ in range(self.spill_count):
+                yield from pickle.load(self.spill_file)
+        yield from self.items
+
+    def close(self):
+        if self.spill_file is not None:
+            self.spill_file.close()
+            self.spill_file = None
+        self.items = []
+        self.memory = 0
+        self.count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
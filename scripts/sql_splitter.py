@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Streaming SQL Statement Splitter
+Splits SQL into statements incrementally from byte (or str) chunks, tracking
+quotes, backtick identifiers, comments and mysql client DELIMITER changes, so
+semicolons inside strings or comments never end a statement.
+
+Each statement is yielded with its byte offsets. The text runs from the end of
+the previous statement through the delimiter, so joining all statements gives
+back the input exactly.
+
+Run directly to benchmark a dump or to fuzz chunk boundaries:
+    python scripts/sql_splitter.py dump.sql --benchmark
+    python scripts/sql_splitter.py dump.sql --fuzz 20
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+from collections import namedtuple
+
+import regex_backend
+
+DEFAULT_READ_SIZE = 4 * 1024 * 1024
+
+Statement = namedtuple('Statement', 'text start end')
+
+# Possessive quantifiers (Python 3.11+) stop the engine recording backtrack
+# points on every character, which is most of the scan cost
+POSSESSIVE = '+' if sys.version_info >= (3, 11) else ''
+
+# Client command that changes the statement delimiter (mysqldump triggers and routines),
+# possibly preceded by comments
+DELIMITER_COMMAND = r'(?:[ \t\r\n]+|--(?:[ \t\r][^\n]*)?\n|#[^\n]*\n|/\*(?!!)[\s\S]*?\*/)*DELIMITER[ \t]+(\S+)[^\n]*(?:\n|\Z)'
+
+# Whitespace and comments in front of a statement ('/*!' version comments are
+# MySQL statements, not comments)
+LEADING_TRIVIA = re.compile(r'(?:\s+|--[^\n]*(?:\n|$)|#[^\n]*(?:\n|$)|/\*(?!!)[\s\S]*?\*/)*')
+KEYWORD = re.compile(r'/\*!|\w+')
+
+DIALECTS = {
+    # MySQL: backslash escapes in strings, '#' comments, '--' comments need a space, DELIMITER command
+    'mysql': {'backslash_escapes': True, 'hash_comments': True, 'dash_comment_space': True, 'dollar_quotes': False,
+              'delimiter_command': True},
+    # PostgreSQL: standard strings, "identifiers", $tag$ bodies
+    'postgresql': {'backslash_escapes': False, 'hash_comments': False, 'dash_comment_space': False, 'dollar_quotes': True,
+                   'delimiter_command': False},
+}
+
+def _body_pattern(delimiter, backslash_escapes, hash_comments, dash_comment_space, dollar_quotes, possessive=POSSESSIVE,
+                  **_):
+    """
+    Regex matching the longest run of a statement that cannot contain the end of
+    the statement: plain text, complete quoted strings, identifiers and comments.
+    Constructs that are still open at the end of the buffer run to the end (\\Z)
+    so the caller waits for more input instead of splitting inside them.
+    Without possessive quantifiers the pattern also compiles with re2.
+    """
+    stop = re.escape(delimiter[0])
+    p = possessive
+    if backslash_escapes:
+        single = rf"'[^'\\]*{p}(?:\\[\s\S][^'\\]*{p})*{p}(?:'|\\?\Z)"
+        double = rf'"[^"\\]*{p}(?:\\[\s\S][^"\\]*{p})*{p}(?:"|\\?\Z)'
+    else:
+        single = rf"'[^']*{p}(?:'|\Z)"
+        double = rf'"[^"]*{p}(?:"|\Z)'
+    parts = [
+        rf"[^'\"`#/$\-{stop}]+{p}",
+        single,
+        double,
+        rf'`[^`]*{p}(?:`|\Z)',
+        r'--(?:[ \t\r][^\n]*)?(?:\n|\Z)' if dash_comment_space else r'--[^\n]*(?:\n|\Z)',
+        r'#[^\n]*(?:\n|\Z)' if hash_comments else '#',
+        r'/\*[\s\S]*?(?:\*/|\Z)',
+    ]
+    if dollar_quotes:
+        parts.append(r'\$(\w*)\$[\s\S]*?(?:\$\1\$|\Z)')
+    # A lone '-', '/' or '$' that does not start a comment or quote, unless it
+    # starts the delimiter
+    lone = ''.join(re.escape(c) for c in '-/$' if c != delimiter[0])
+    if lone:
+        parts.append(f'[{lone}]')
+    return '(?:' + '|'.join(parts) + ')*' + p
+
+class StatementSplitter:
+    """
+    Incremental statement splitter. Call feed() with consecutive chunks and
+    close() at the end; both yield Statement(text, start, end) tuples.
+
+    dialect 'mysql' (dumps) or 'postgresql' (converted schema files), see DIALECTS.
+    Offsets count bytes for bytes input and characters for str input.
+    """
+
+    def __init__(self, dialect='mysql', delimiter=';'):
+        self.options = DIALECTS[dialect]
+        self.buffer = None
+        self.offset = 0          # input offset of buffer[0]
+        self.retry_at = 0        # buffer length needed before rescanning an open statement
+        self.patterns = {}
+        self.set_delimiter(delimiter)
+
+    def set_delimiter(self, delimiter):
+        self.delimiter = delimiter
+
+    def _compiled(self, binary):
+        key = (self.delimiter, binary)
+        if key not in self.patterns:
+            body = _body_pattern(self.delimiter, **self.options)
+            command = DELIMITER_COMMAND if self.options['delimiter_command'] else r'(?!)'
+            if binary:
+                # re2 (if installed) for the hot body scan, see regex_backend
+                plain_body = _body_pattern(self.delimiter, possessive='', **self.options)
+                self.patterns[key] = (
+                    regex_backend.compile(plain_body.encode(), fallback=body.encode()),
+                    re.compile(command.encode(), re.IGNORECASE)
+                )
+            else:
+                self.patterns[key] = (re.compile(body), re.compile(command, re.IGNORECASE))
+        return self.patterns[key]
+
+    def feed(self, data):
+        if not data:
+            return
+        if self.buffer is None:
+            self.buffer = data
+        else:
+            self.buffer += data
+        if len(self.buffer) < self.retry_at:
+            # An open statement is rescanned from its start only after the
+            # buffer has doubled, which keeps huge statements linear overall
+            return
+        yield from self._split(final=False)
+
+    def discard(self, length):
+        """
+        Drop the first length bytes (or characters) of the input held for the
+        statement that is not complete yet; the caller has handled them itself
+        """
+        self.buffer = self.buffer[length:]
+        self.offset += length
+        self.retry_at = 0
+
+    def close(self):
+        if self.buffer:
+            yield from self._split(final=True)
+            if self.buffer:
+                yield Statement(self.buffer, self.offset, self.offset + len(self.buffer))
+        self.buffer = None
+
+    def _split(self, final):
+        buffer = self.buffer
+        binary = isinstance(buffer, bytes)
+        size = len(buffer)
+        pos = 0
+        while pos < size:
+            body, command = self._compiled(binary)
+            delimiter = self.delimiter.encode() if binary else self.delimiter
+
+            command_match = command.match(buffer, pos)
+            if command_match and command_match.end() >= size and not final:
+                break  # the rest of the DELIMITER line may be in the next chunk
+            if command_match:
+                name = command_match.group(1)
+                yield Statement(buffer[pos:command_match.end()], self.offset + pos, self.offset + command_match.end())
+                self.set_delimiter(name.decode() if binary else name)
+                pos = command_match.end()
+                continue
+
+            scan = pos
+            end = None
+            while True:
+                scan = body.match(buffer, scan).end()
+                if scan >= size:
+                    break
+                if buffer.startswith(delimiter, scan):
+                    end = scan + len(delimiter)
+                    break
+                scan += 1  # first character of a longer delimiter, not the delimiter itself
+            if end is None:
+                break
+            yield Statement(buffer[pos:end], self.offset + pos, self.offset + end)
+            pos = end
+
+        if pos:
+            self.buffer = buffer[pos:]
+            self.offset += pos
+        self.retry_at = 0 if final else 2 * len(self.buffer)
+
+def iter_chunks(source, read_size=DEFAULT_READ_SIZE):
+    """
+    Yield chunks from a path (os.PathLike, or a str naming an existing file),
+    a binary or text file object, SQL as bytes/str, or an iterable of chunks
+    """
+    if isinstance(source, str) and '\n' not in source and os.path.isfile(source):
+        with open(source, 'rb') as f:
+            yield from iter_chunks(f, read_size)
+        return
+    if isinstance(source, os.PathLike):
+        with open(source, 'rb') as f:
+            yield from iter_chunks(f, read_size)
+        return
+    if isinstance(source, (bytes, bytearray, str)):
+        yield source
+        return
+    if hasattr(source, 'read'):
+        while True:
+            chunk = source.read(read_size)
+            if not chunk:
+                return
+            yield chunk
+    yield from source
+
+def split_statements(source, read_size=DEFAULT_READ_SIZE, **options):
+    """
+    Yield Statement(text, start, end) for every statement in source
+    (see iter_chunks for accepted sources and StatementSplitter for options)
+    """
+    splitter = StatementSplitter(**options)
+    for chunk in iter_chunks(source, read_size):
+        yield from splitter.feed(chunk)
+    yield from splitter.close()
+
+def split_leading(text):
+    """
+    Split a statement (str) into its leading whitespace and comments and the
+    statement itself
+    """
+    end = LEADING_TRIVIA.match(text).end()
+    return text[:end], text[end:]
+
+def statement_keyword(text):
+    """
+    First keyword of a statement after leading whitespace and comments,
+    upper-cased ('' if the statement is only comments)
+    """
+    if isinstance(text, bytes):
+        text = text[:4096].decode('utf-8', errors='replace')
+    match = KEYWORD.match(text, LEADING_TRIVIA.match(text).end())
+    return match.group(0).upper() if match else ''
+
+def benchmark(path, read_size):
+    started = time.perf_counter()
+    count = 0
+    for _ in split_statements(path, read_size):
+        count += 1
+    elapsed = time.perf_counter() - started
+    size = os.path.getsize(path)
+    print(f"  {count:,} statements, {size:,} bytes in {elapsed:.2f}s ({size / 1048576 / elapsed:.1f} MB/s, "
+          f"{regex_backend.BACKEND} backend)")
+
+def fuzz(path, rounds):
+    """
+    Split with random chunk sizes and check statements and offsets never change
+    """
+    import random
+    with open(path, 'rb') as f:
+        data = f.read()
+    expected = list(split_statements(data))
+    assert b''.join(s.text for s in expected) == data, 'statements do not reproduce the input'
+    for statement in expected:
+        assert data[statement.start:statement.end] == statement.text, f'bad offsets at {statement.start}'
+    for round_number in range(rounds):
+        cuts = sorted(random.sample(range(1, len(data)), min(len(data) - 1, random.randint(1, 200))))
+        chunks = [data[a:b] for a, b in zip([0] + cuts, cuts + [len(data)])]
+        actual = list(split_statements(chunks))
+        assert actual == expected, f'round {round_number}: chunked split differs'
+    print(f"  {rounds} rounds OK ({len(expected):,} statements)")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark or fuzz the streaming SQL statement splitter on a dump')
+    parser.add_argument('input_file', help='SQL dump file')
+    parser.add_argument('--benchmark', action='store_true', help='Measure split throughput')
+    parser.add_argument('--fuzz', type=int, metavar='ROUNDS', help='Re-split with random chunk boundaries')
+    parser.add_argument('--read-size', type=int, default=DEFAULT_READ_SIZE, help='Bytes per read')
+
+    args = parser.parse_args()
+
+    if args.fuzz:
+        fuzz(args.input_file, args.fuzz)
+    if args.benchmark or not args.fuzz:
+        benchmark(args.input_file, args.read_size)
+
+if __name__ == '__main__':
+    main()
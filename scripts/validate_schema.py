@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+Schema Validator
+Checks converted PostgreSQL DDL before the real import and reports every
+failing statement with its line and byte offset in the converted file, so
+conversion bugs show up in seconds instead of halfway through a psql run.
+
+Two backends:
+  postgres  runs the DDL in a throwaway database: a scratch cluster started
+            with initdb/pg_ctl from the local PostgreSQL install, or a fresh
+            database created through --dsn. Needs asyncpg or psycopg (3.x).
+  pglast    parses every statement with PostgreSQL's own parser (pip install
+            pglast). Syntax only, but no server needed.
+
+Statements are grouped by table and the groups run in parallel, tables that
+others reference first. A statement referencing a table the file creates
+later is reported too: the import runs in file order and would fail there.
+
+    python scripts/validate_schema.py mifos_postgresql.sql
+    python scripts/validate_schema.py mifos_postgresql.sql --backend pglast -j 8
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+from collections import namedtuple
+from importlib.util import find_spec
+
+from sql_splitter import split_leading, split_statements
+
+BACKENDS = ('postgres', 'pglast')
+
+# One statement of the converted file: 1-based line and byte offset of its first keyword
+SchemaStatement = namedtuple('SchemaStatement', 'sql offset line table')
+
+# position: 0-based character in sql where the error was found, if known
+Failure = namedtuple('Failure', 'statement message position')
+
+# Statements that belong to one table: CREATE/ALTER/DROP/LOCK ... TABLE name, and indexes on it
+TABLE_TARGET = re.compile(
+    r'(?:CREATE|ALTER|DROP|TRUNCATE|LOCK|COMMENT\s+ON)\s+(?:\w+\s+){0,2}?TABLES?\s+'
+    r'(?:IF\s+(?:NOT\s+)?EXISTS\s+)?(?:ONLY\s+)?([\w".]+)',
+    re.IGNORECASE
+)
+INDEX_TARGET = re.compile(
+    r'CREATE\s+(?:UNIQUE\s+)?INDEX\s+(?:CONCURRENTLY\s+)?(?:IF\s+NOT\s+EXISTS\s+)?(?:[\w"]+\s+)?ON\s+(?:ONLY\s+)?([\w".]+)',
+    re.IGNORECASE
+)
+# Tables a statement needs to exist: foreign key targets and partition parents
+REFERENCES = re.compile(r'\b(?:REFERENCES|PARTITION\s+OF)\s+([\w".]+)', re.IGNORECASE)
+
+# Session settings (search_path) are replayed on every connection
+SESSION_STATEMENT = re.compile(r'SET\s', re.IGNORECASE)
+
+def table_key(name):
+    """
+    Unqualified, unquoted, lower-case table name: mifos."m_Loan" -> m_loan
+    """
+    return name.split('.')[-1].strip('"').lower()
+
+def parse_statements(sql):
+    """
+    Split converted SQL into SchemaStatements, dropping empty ones
+    """
+    data = sql.encode('utf-8', errors='surrogateescape')
+    statements = []
+    line = 1
+    counted = 0          # line breaks before this byte offset are in line
+    for statement in split_statements(data, dialect='postgresql'):
+        text = statement.text.decode('utf-8', errors='surrogateescape')
+        leading, body = split_leading(text)
+        body = body.rstrip()
+        if not body.rstrip(';').strip():
+            continue
+        offset = statement.start + len(leading.encode('utf-8', errors='surrogateescape'))
+        line += data.count(b'\n', counted, offset)
+        counted = offset
+        target = TABLE_TARGET.match(body) or INDEX_TARGET.match(body)
+        statements.append(SchemaStatement(body, offset, line, table_key(target.group(1)) if target else None))
+    return statements
+
+def group_statements(statements):
+    """
+    Split statements into setup (everything not tied to a table, run first
+    in file order) and per-table groups in file order
+    """
+    setup = []
+    groups = {}
+    for statement in statements:
+        if statement.table is None:
+            setup.append(statement)
+        else:
+            groups.setdefault(statement.table, []).append(statement)
+    return setup, groups
+
+def check_order(statements):
+    """
+    Failures for statements that reference a table created later in the file
+    """
+    created = {}
+    for statement in statements:
+        if statement.table and re.match(r'CREATE\s+(?:\w+\s+){0,2}?TABLE\s', statement.sql, re.IGNORECASE):
+            created.setdefault(statement.table, statement)
+    failures = []
+    for statement in statements:
+        for match in REFERENCES.finditer(statement.sql):
+            target = created.get(table_key(match.group(1)))
+            if target is not None and target.offset > statement.offset:
+                failures.append(Failure(
+                    statement,
+                    f'references {table_key(match.group(1))}, which is created later (line {target.line}); '
+                    f'reorder with fix_foreign_keys_order.py',
+                    match.start(1)
+                ))
+    return failures
+
+def dependency_waves(groups):
+    """
+    Table groups in waves: each wave only references tables of earlier waves.
+    Tables in a reference cycle end up in the last wave.
+    """
+    references = {
+        table: {table_key(m.group(1)) for s in group for m in REFERENCES.finditer(s.sql)} & set(groups) - {table}
+        for table, group in groups.items()
+    }
+    waves = []
+    done = set()
+    remaining = list(groups)
+    while remaining:
+        wave = [table for table in remaining if references[table] <= done] or remaining
+        waves.append(wave)
+        done.update(wave)
+        remaining = [table for table in remaining if table not in done]
+    return waves
+
+def _parse_group(group):
+    """
+    pglast worker: parse each statement of one group
+    """
+    from pglast import parser
+    failures = []
+    for statement in group:
+        try:
+            parser.parse_sql(statement.sql)
+        except parser.ParseError as e:
+            # location is 1-based, 0 when unknown
+            location = getattr(e, 'location', 0)
+            failures.append(Failure(statement, str(e.args[0]) if e.args else str(e), location - 1 if location else None))
+    return failures
+
+def validate_pglast(setup, groups, jobs=1):
+    tasks = [setup] + list(groups.values())
+    if jobs > 1 and len(tasks) > 1:
+        from multiprocessing import Pool
+        with Pool(min(jobs, len(tasks))) as pool:
+            results = pool.map(_parse_group, tasks)
+    else:
+        results = map(_parse_group, tasks)
+    return [failure for result in results for failure in result]
+
+def _find_pg_binary(name):
+    """
+    initdb and pg_ctl are often not on PATH (Debian keeps them per version)
+    """
+    import glob
+    import shutil
+    found = shutil.which(name)
+    if found:
+        return found
+    candidates = sorted(glob.glob(f'/usr/lib/postgresql/*/bin/{name}'), key=lambda p: [
+        int(part) if part.isdigit() else 0 for part in p.split('/')[-3].split('.')
+    ])
+    return candidates[-1] if candidates else None
+
+class ScratchCluster:
+    """
+    Throwaway PostgreSQL cluster in a temporary directory, reachable only
+    through a Unix socket in that directory. fsync is off: nothing in it is kept.
+    """
+
+    def __init__(self):
+        self.initdb = _find_pg_binary('initdb')
+        self.pg_ctl = _find_pg_binary('pg_ctl')
+        if not self.initdb or not self.pg_ctl:
+            raise RuntimeError('initdb/pg_ctl not found (install PostgreSQL or pass --dsn)')
+        self.directory = None
+
+    def __enter__(self):
+        import shutil
+        import tempfile
+        import subprocess
+        self.directory = tempfile.mkdtemp(prefix='pgcheck-')
+        data_dir = os.path.join(self.directory, 'data')
+        log_file = os.path.join(self.directory, 'server.log')
+        try:
+            subprocess.run(
+                [self.initdb, '-D', data_dir, '-U', 'postgres', '-A', 'trust', '-E', 'UTF8', '--no-locale', '--no-sync'],
+                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True
+            )
+            subprocess.run(
+                [self.pg_ctl, '-D', data_dir, '-l', log_file, '-w', '-o',
+                 f"-k {self.directory} -c listen_addresses='' -F -p 5432", 'start'],
+                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True
+            )
+        except subprocess.CalledProcessError as e:
+            detail = e.stderr.strip()
+            if os.path.exists(log_file):
+                with open(log_file, 'r', encoding='utf-8', errors='replace') as f:
+                    detail = f.read().strip() or detail
+            shutil.rmtree(self.directory, ignore_errors=True)
+            raise RuntimeError(f'could not start a scratch PostgreSQL: {detail.splitlines()[-1] if detail else e}')
+        return f'postgresql://postgres@/postgres?host={self.directory}&port=5432'
+
+    def __exit__(self, exc_type, exc, tb):
+        import shutil
+        import subprocess
+        subprocess.run(
+            [self.pg_ctl, '-D', os.path.join(self.directory, 'data'), '-m', 'immediate', 'stop'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+def _with_database(dsn, database):
+    """
+    dsn pointing at another database (URL or key=value form)
+    """
+    if '://' in dsn:
+        from urllib.parse import urlsplit, urlunsplit
+        parts = urlsplit(dsn)
+        return urlunsplit(parts._replace(path='/' + database))
+    return f'{dsn} dbname={database}'
+
+async def _execute_autocommit(dsn, sql):
+    """
+    Run one statement outside a transaction (CREATE/DROP DATABASE)
+    """
+    if find_spec('asyncpg') is not None:
+        import asyncpg
+        conn = await asyncpg.connect(dsn)
+        try:
+            await conn.execute(sql)
+        finally:
+            await conn.close()
+    else:
+        import psycopg
+        async with await psycopg.AsyncConnection.connect(dsn, autocommit=True) as conn:
+            await conn.execute(sql)
+
+def _error_position(error):
+    """
+    0-based error position from an asyncpg or psycopg error, if the server sent one
+    """
+    position = getattr(error, 'position', None)
+    if position is None:
+        position = getattr(getattr(error, 'diag', None), 'statement_position', None)
+    try:
+        return int(position) - 1
+    except (TypeError, ValueError):
+        return None
+
+async def _run_postgres(dsn, setup, groups, jobs):
+    import asyncio
+    from load_postgresql import create_pool
+
+    session = [s for s in setup if SESSION_STATEMENT.match(s.sql)]
+    failures = []
+
+    async def run_group(conn, group, replay):
+        for statement in replay:
+            try:
+                await conn.execute(statement.sql)
+            except Exception:
+                pass  # reported once, from the setup group
+        for statement in group:
+            try:
+                await conn.execute(statement.sql)
+            except Exception as e:
+                failures.append(Failure(statement, str(e).strip(), _error_position(e)))
+
+    async def run_table(pool, group):
+        async with pool.acquire() as conn:
+            await run_group(conn, group, session)
+
+    pool = create_pool(dsn, max(1, min(jobs, len(groups))))
+    await pool.open()
+    try:
+        async with pool.acquire() as conn:
+            await run_group(conn, setup, [])
+        for wave in dependency_waves(groups):
+            await asyncio.gather(*(run_table(pool, groups[table]) for table in wave))
+    finally:
+        await pool.close()
+    return failures
+
+def validate_postgres(setup, groups, jobs=1, dsn=None):
+    """
+    Run the DDL in a throwaway database: a fresh database on dsn's server,
+    or a scratch cluster if no dsn is given
+    """
+    import asyncio
+    if dsn is None:
+        with ScratchCluster() as scratch_dsn:
+            return asyncio.run(_run_postgres(scratch_dsn, setup, groups, jobs))
+    database = f'schema_check_{os.getpid()}_{int(time.time())}'
+    asyncio.run(_execute_autocommit(dsn, f'CREATE DATABASE {database}'))
+    try:
+        return asyncio.run(_run_postgres(_with_database(dsn, database), setup, groups, jobs))
+    finally:
+        asyncio.run(_execute_autocommit(dsn, f'DROP DATABASE IF EXISTS {database}'))
+
+def choose_backend(dsn=None):
+    """
+    postgres if a server is reachable (--dsn or a local install), else pglast
+    """
+    has_driver = find_spec('asyncpg') is not None or find_spec('psycopg') is not None
+    if has_driver and (dsn or _find_pg_binary('initdb')):
+        return 'postgres'
+    if find_spec('pglast') is not None:
+        return 'pglast'
+    raise RuntimeError('validation needs pglast (pip install pglast), or asyncpg/psycopg with '
+                       'a local PostgreSQL install or --dsn')
+
+def validate_sql(sql, backend='auto', jobs=1, dsn=None):
+    """
+    Validate converted SQL. Returns (backend, statement count, failures),
+    failures sorted by position in the file.
+    """
+    if backend == 'auto':
+        backend = choose_backend(dsn)
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown validation backend '{backend}' (use {', '.join(BACKENDS)})")
+    statements = parse_statements(sql)
+    setup, groups = group_statements(statements)
+    if backend == 'pglast':
+        failures = validate_pglast(setup, groups, jobs)
+    else:
+        failures = validate_postgres(setup, groups, jobs, dsn)
+    failures += check_order(statements)
+    failures.sort(key=lambda f: (f.statement.offset, f.position or 0))
+    return backend, len(statements), failures
+
+def format_failure(failure, width=100):
+    """
+    Location, message and the statement line the error points at
+    """
+    statement = failure.statement
+    lines = [f"  line {statement.line} (byte {statement.offset:,}){' ' + statement.table if statement.table else ''}: "
+             f"{failure.message.splitlines()[0] if failure.message else 'error'}"]
+    position = failure.position if failure.position is not None and 0 <= failure.position < len(statement.sql) else 0
+    line_start = statement.sql.rfind('\n', 0, position) + 1
+    line_end = statement.sql.find('\n', position)
+    source_line = statement.sql[line_start:line_end if line_end >= 0 else None]
+    column = position - line_start
+    if len(source_line) > width:
+        shift = max(0, min(column - width // 2, len(source_line) - width))
+        source_line = source_line[shift:shift + width]
+        column -= shift
+    lines.append(f"      {source_line}")
+    if failure.position is not None:
+        lines.append(f"      {' ' * column}^")
+    return '\n'.join(lines)
+
+def print_report(backend, statement_count, failures, elapsed, source):
+    if failures:
+        print(f"\n[FAILED] {len(failures)} of {statement_count} statement(s) in {source} would fail "
+              f"({backend}, {elapsed:.1f}s)")
+        for failure in failures:
+            print(format_failure(failure))
+    else:
+        print(f"\n[OK] {statement_count} statement(s) in {source} validated ({backend}, {elapsed:.1f}s)")
+
+def main():
+    parser = argparse.ArgumentParser(description='Check converted PostgreSQL DDL before importing it')
+    parser.add_argument('input_file', help='Converted PostgreSQL SQL file (.gz/.zst accepted)')
+    parser.add_argument('--backend', choices=('auto',) + BACKENDS, default='auto',
+                        help='postgres (throwaway database) or pglast (parser only); default: postgres if available')
+    parser.add_argument('--dsn', default=os.environ.get('VALIDATE_DATABASE_URL'),
+                        help='Server to create the throwaway database on (default: $VALIDATE_DATABASE_URL, '
+                             'else a scratch cluster via initdb)')
+    parser.add_argument('-j', '--jobs', type=int, default=4, help='Tables validated in parallel (default: 4)')
+
+    args = parser.parse_args()
+
+    from output_writer import open_compressed
+    try:
+        with open_compressed(args.input_file) as f:
+            sql = f.read().decode('utf-8', errors='surrogateescape')
+    except FileNotFoundError:
+        print(f"Error: File '{args.input_file}' not found")
+        sys.exit(1)
+
+    started = time.perf_counter()
+    try:
+        backend, statement_count, failures = validate_sql(sql, args.backend, max(1, args.jobs), args.dsn)
+    except (RuntimeError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    print_report(backend, statement_count, failures, time.perf_counter() - started, args.input_file)
+    if failures:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Load Verifier
+Compares the per-table row counts and checksums that
+convert_mysql_to_postgresql.py --copy-dir records in manifest.json with the
+same figures computed by PostgreSQL from the loaded tables. The server does
+the hashing and summing, so only one row per table crosses the network.
+
+The checksum is the sum (mod 2**64) of the first 8 bytes of the MD5 of each
+row in COPY text form. The server rebuilds that form per column type:
+COPY escapes for text, 0/1 for booleans, \\x plus upper-case hex for bytea
+(as mysqldump --hex-blob writes it, and as the converter writes _binary
+strings). Values whose PostgreSQL text differs from the dump literal
+(lower-case hex literals, floats, JSON) give a checksum mismatch with
+matching row counts; the report points those out.
+
+    python scripts/verify_postgresql.py mifos_copy --dsn postgresql://localhost/mifos
+"""
+
+import os
+import sys
+import time
+import argparse
+
+# Types whose text output never needs COPY escapes
+PLAIN_TYPES = {
+    'smallint', 'integer', 'bigint', 'numeric', 'real', 'double precision', 'date',
+    'timestamp without time zone', 'timestamp with time zone', 'time without time zone', 'interval', 'uuid',
+}
+
+# COPY text escapes as SQL (search, replacement) literals; backslash first
+COPY_ESCAPES = (
+    ("'\\'", "'\\\\'"),
+    ("E'\\n'", "'\\n'"),
+    ("E'\\r'", "'\\r'"),
+    ("E'\\t'", "'\\t'"),
+    ("E'\\b'", "'\\b'"),
+)
+
+# Types that can hold the same value as the dump but print it differently
+INEXACT_TYPES = {'real', 'double precision', 'json', 'jsonb', 'bytea'}
+
+def folded(name):
+    """
+    Name as stored in the catalog: plain identifiers fold to lower case
+    """
+    from mysql_to_postgresql import quote_identifier
+    return name.lower() if quote_identifier(name) == name else name
+
+def field_expression(column, data_type):
+    """
+    SQL expression giving a column's value as the converter wrote it in COPY text
+    """
+    from mysql_to_postgresql import quote_identifier
+    c = quote_identifier(column)
+    if data_type == 'boolean':
+        return f"CASE WHEN {c} IS NULL THEN '\\N' WHEN {c} THEN '1' ELSE '0' END"
+    if data_type == 'bytea':
+        return f"COALESCE('\\\\x' || upper(encode({c}, 'hex')), '\\N')"
+    if data_type in ('bit', 'bit varying'):
+        return f"COALESCE(lpad({c}::text, 64, '0')::bit(64)::bigint::text, '\\N')"
+    if data_type in PLAIN_TYPES:
+        return f"COALESCE({c}::text, '\\N')"
+    escaped = f'{c}::text'
+    for search, replacement in COPY_ESCAPES:
+        escaped = f'replace({escaped}, {search}, {replacement})'
+    return f"COALESCE({escaped}, '\\N')"
+
+def checksum_query(target, columns):
+    """
+    One-row query: row count and summed 64-bit row hashes of a table.
+    columns: [(name, data_type), ...] in COPY column order.
+    """
+    row = " || E'\\t' || ".join(field_expression(name, data_type) for name, data_type in columns)
+    return (f"SELECT count(*), sum(('x' || left(md5({row}), 16))::bit(64)::bigint) FROM {target}")
+
+async def verify_table(pool, schema, table, entry, table_slots, log):
+    """
+    Compare one table's manifest figures with the database
+    """
+    from mysql_to_postgresql import CHECKSUM_MASK, quote_identifier, sql_literal
+    result = {
+        'expected_rows': entry.get('rows', sum(c['rows'] for c in entry['chunks'])),
+        'actual_rows': None,
+        'expected_checksum': entry.get('checksum'),
+        'actual_checksum': None,
+        'status': 'pending',
+        'note': None,
+        'seconds': 0.0,
+    }
+    target = f'{quote_identifier(schema)}.{quote_identifier(table)}' if schema else quote_identifier(table)
+    async with table_slots, pool.acquire() as conn:
+        started = time.perf_counter()
+        schema_filter = f'table_schema = {sql_literal(folded(schema))}' if schema else 'table_schema = current_schema()'
+        rows = await conn.fetch(
+            f'SELECT column_name, data_type FROM information_schema.columns '
+            f'WHERE {schema_filter} AND table_name = {sql_literal(folded(table))} ORDER BY ordinal_position'
+        )
+        types = dict(rows)
+        if not types:
+            result['status'] = 'missing'
+            result['note'] = f'table {target} not found'
+        else:
+            names = entry.get('columns') or list(types)
+            columns = [(name, types.get(folded(name), types.get(name, 'text'))) for name in names]
+            if result['expected_checksum'] is None:
+                count, total = (await conn.fetch(f'SELECT count(*), NULL FROM {target}'))[0]
+            else:
+                count, total = (await conn.fetch(checksum_query(target, columns)))[0]
+            result['actual_rows'] = count
+            if total is not None:
+                result['actual_checksum'] = f'{int(total) & CHECKSUM_MASK:016x}'
+            if count != result['expected_rows']:
+                result['status'] = 'rows differ'
+            elif result['expected_checksum'] is None:
+                result['status'] = 'ok'
+                result['note'] = 'no checksum in manifest (converted with --no-checksums); rows only'
+            elif result['actual_checksum'] != result['expected_checksum'] and count:
+                result['status'] = 'checksum differs'
+                inexact = [name for name, data_type in columns if data_type in INEXACT_TYPES]
+                if inexact:
+                    result['note'] = f"may be formatting only: {', '.join(inexact)} can print differently from the dump"
+            else:
+                result['status'] = 'ok'
+        result['seconds'] = round(time.perf_counter() - started, 3)
+
+    log(f"  {result['status']:<16} {table} ({result['actual_rows'] if result['actual_rows'] is not None else '-'} "
+        f"of {result['expected_rows']:,} rows, {result['seconds']:.2f}s)")
+    return table, result
+
+async def verify_copy_dir(copy_dir, pool, schema=None, max_tables=4, only=None, log=print):
+    """
+    Verify every table of a --copy-dir manifest through the given pool
+    (anything with acquire() yielding an object with fetch()).
+    Returns {table: result}.
+    """
+    import asyncio
+    import json
+    with open(os.path.join(copy_dir, 'manifest.json'), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    schema = schema or manifest.get('schema')
+    table_slots = asyncio.Semaphore(max(1, max_tables))
+    tasks = [
+        verify_table(pool, schema, table, entry, table_slots, log)
+        for table, entry in sorted(manifest['tables'].items())
+        if not only or table in only
+    ]
+    return dict(await asyncio.gather(*tasks))
+
+async def run(args):
+    from load_postgresql import create_pool
+    pool = create_pool(args.dsn, args.connections)
+    await pool.open()
+    try:
+        return await verify_copy_dir(
+            args.copy_dir, pool, args.schema, args.connections, set(args.tables) if args.tables else None
+        )
+    finally:
+        await pool.close()
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare row counts and checksums of loaded PostgreSQL tables with the --copy-dir manifest'
+    )
+    parser.add_argument('copy_dir', help='Directory with manifest.json from convert_mysql_to_postgresql.py --copy-dir')
+    parser.add_argument('--dsn', default=os.environ.get('DATABASE_URL'),
+                        help='PostgreSQL connection string (default: $DATABASE_URL)')
+    parser.add_argument('--schema', help='Schema of the loaded tables (default: the schema recorded in the manifest)')
+    parser.add_argument('-c', '--connections', type=int, default=4, help='Tables checked at the same time (default: 4)')
+    parser.add_argument('--tables', nargs='+', help='Only verify these tables')
+    parser.add_argument('--report-json', help='Write the per-table results to this JSON file')
+
+    args = parser.parse_args()
+
+    if not args.dsn:
+        print("Error: no connection string (use --dsn or set DATABASE_URL)")
+        sys.exit(1)
+    if not os.path.exists(os.path.join(args.copy_dir, 'manifest.json')):
+        print(f"Error: '{args.copy_dir}' has no manifest.json (run convert_mysql_to_postgresql.py --copy-dir first)")
+        sys.exit(1)
+
+    import asyncio
+    started = time.perf_counter()
+    try:
+        results = asyncio.run(run(args))
+    except Exception as e:
+        print(f"Error verifying data: {e}")
+        sys.exit(1)
+    elapsed = time.perf_counter() - started
+
+    failed = [table for table, result in results.items() if result['status'] != 'ok']
+    print(f"\n[OK] All {len(results)} table(s) match" if not failed
+          else f"\n[FAILED] {len(failed)} of {len(results)} table(s) differ")
+    print(f"  Rows: {sum(r['actual_rows'] or 0 for r in results.values()):,} in {elapsed:.1f}s")
+    for table in failed:
+        result = results[table]
+        print(f"  {table}: {result['status']} (rows {result['actual_rows']} vs {result['expected_rows']}, "
+              f"checksum {result['actual_checksum']} vs {result['expected_checksum']})")
+        if result['note']:
+            print(f"      {result['note']}")
+
+    if args.report_json:
+        import json
+        with open(args.report_json, 'w', encoding='utf-8') as f:
+            json.dump({'elapsed_seconds': round(elapsed, 3), 'tables': results}, f, indent=2)
+        print(f"  Report: {args.report_json}")
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()